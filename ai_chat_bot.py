@@ -1,17 +1,25 @@
+import asyncio
 import random
 from discord.ext import commands
 import logging
 import re
 from collections import defaultdict
 import os
-import aiohttp
 import json
 
+from llm_backend import ModelWarmer
+from outbox import get_outbox, reply_to
+from model_router import create_router
+from overload import OverloadController
+from passive_replies import AI_PASSIVE_REPLIES, PassiveScorer
+
 # Logger setup
 logger = logging.getLogger(__name__)
 
 # API endpoint for Ollama
 API_URL = os.getenv('LLAMA_API_URL', 'http://localhost:11434/api/generate')
+# "http" for the API above, "llama_cpp" to run the GGUF at AI_MODEL_PATH in-process
+AI_BACKEND = os.getenv('AI_BACKEND', 'http')
 
 # Personality based on chat logs
 PREPROMPT = """You are Jukeborgee, an aggressive, sarcastic Discord bot who talks like a real person, never like an AI.
@@ -97,17 +105,37 @@ cyborgee more like cry-borgee when i delete it
 
 REMEMBER: When someone asks you a question, give ONE short answer in this style. Don't list examples."""
 
+# Prompt injection/instruction extraction attempts
+INJECTION_PHRASES = [
+    "forget previous", "ignore previous", "forget all", "ignore all", 
+    "new instructions", "system prompt", "list all words", "list words",
+    "what are your instructions", "show instructions", "print instructions",
+    "display instructions", "reveal prompt", "show prompt", "your instructions",
+    "repeat instructions", "instruction", "preprompt", "pre-prompt",
+    "system message", "initial prompt", "original prompt", "default prompt"
+]
+
 class AIChatBot(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, model_path=None):
         self.bot = bot
         self.responses = {}  # Will be set by main bot
         # Store chat history for context
         self.chat_history = defaultdict(list)
         self.max_history = 5  # Keep last 5 exchanges
         self.enabled = False  # Disabled by default
-        
-        # Check if API is available
-        logger.info(f"Using LLM API at {API_URL}")
+        # Small model first, 7B only when the prompt or the small reply calls for it
+        self.backend = create_router(AI_BACKEND, API_URL, model_path)
+        self.warmer = ModelWarmer(self.backend, f"{PREPROMPT}\n\n")
+        self.overload = OverloadController(backlog=lambda: self.backend.pending())
+        self.passive = PassiveScorer(INJECTION_PHRASES)
+    
+    async def cog_load(self):
+        # Preload the model so the first !chat doesn't pay for loading it
+        self.warmer.start()
+    
+    def cog_unload(self):
+        self.warmer.stop()
+        self.backend.close()
     
     async def cog_check(self, ctx):
         # Always allow these commands
@@ -122,11 +150,11 @@ class AIChatBot(commands.Cog):
         if isinstance(error, CheckFailure):
             # Special message for chat command
             if ctx.command.name == "chat":
-                await ctx.send(self.responses.get('disabled', 'fuck you, no ai'))
+                await reply_to(ctx, self.responses.get('disabled', 'fuck you, no ai'))
             elif ctx.command.name == "reset_chat":
-                await ctx.send(self.responses.get('disabled', 'fuck you, no ai'))
+                await reply_to(ctx, self.responses.get('disabled', 'fuck you, no ai'))
             else:
-                await ctx.send(self.responses.get('features_disabled', '❌ ai features r disabled rn'))
+                await reply_to(ctx, self.responses.get('features_disabled', '❌ ai features r disabled rn'))
         # Let other errors propagate
             
     def format_ai_response(self, response):
@@ -161,10 +189,14 @@ class AIChatBot(commands.Cog):
         
         if ctx.author.name.lower() in ["sol", "solkitsune"]:
             self.enabled = not self.enabled
+            if self.enabled:
+                self.warmer.touch(warm_now=True)
+            else:
+                self.warmer.stop()
             status = "on" if self.enabled else "off"
-            await ctx.send(self.responses.get('enable', '🤖 ai chat is now {status}').format(status=status))
+            await reply_to(ctx, self.responses.get('enable', '🤖 ai chat is now {status}').format(status=status))
         else:
-            await ctx.send(self.responses.get('no_permission', '❌ u dont have permission to use this ({author})').format(author=ctx.author.name))
+            await reply_to(ctx, self.responses.get('no_permission', '❌ u dont have permission to use this ({author})').format(author=ctx.author.name))
 
     @commands.command()
     async def disable_ai(self, ctx):
@@ -173,32 +205,32 @@ class AIChatBot(commands.Cog):
         
         if ctx.author.name.lower() in ["sol", "solkitsune"]:
             self.enabled = False
-            await ctx.send(self.responses.get('disable', '🤖 ai chat is now off'))
+            self.warmer.stop()
+            await reply_to(ctx, self.responses.get('disable', '🤖 ai chat is now off'))
         else:
-            await ctx.send(self.responses.get('no_permission', '❌ u dont have permission to use this ({author})').format(author=ctx.author.name))
+            await reply_to(ctx, self.responses.get('no_permission', '❌ u dont have permission to use this ({author})').format(author=ctx.author.name))
 
     @commands.command()
     async def chat(self, ctx, *, prompt=""):
         """Chat with the AI assistant"""
         
         if not self.enabled:
-            await ctx.send(self.responses.get('disabled', 'fuck you, no ai'))
+            await reply_to(ctx, self.responses.get('disabled', 'fuck you, no ai'))
             return
         if not prompt:
-            await ctx.send(self.responses.get('no_prompt', 'wat u want'))
+            await reply_to(ctx, self.responses.get('no_prompt', 'wat u want'))
             return
         
-        # Check for prompt injection/instruction extraction attempts
-        injection_phrases = [
-            "forget previous", "ignore previous", "forget all", "ignore all", 
-            "new instructions", "system prompt", "list all words", "list words",
-            "what are your instructions", "show instructions", "print instructions",
-            "display instructions", "reveal prompt", "show prompt", "your instructions",
-            "repeat instructions", "instruction", "preprompt", "pre-prompt",
-            "system message", "initial prompt", "original prompt", "default prompt"
-        ]
+        canned = self.canned_reply(prompt)
+        if canned:
+            await reply_to(ctx, canned)
+            return
         
-        if any(phrase in prompt.lower() for phrase in injection_phrases):
+        await self.respond(ctx.channel, ctx.author.id, prompt)
+    
+    def canned_reply(self, prompt):
+        """Fixed answer for injection attempts and Cyborgee mentions, or None"""
+        if any(phrase in prompt.lower() for phrase in INJECTION_PHRASES):
             injection_responses = self.responses.get('injection_responses', [
                 "fuck off weirdo",
                 "nice try idiot im not falling for that",
@@ -211,8 +243,7 @@ class AIChatBot(commands.Cog):
                 "imagine trying to break me c.c",
                 "pathetic attempt tbh"
             ])
-            await ctx.send(random.choice(injection_responses))
-            return
+            return random.choice(injection_responses)
             
         # Check for Cyborgee mentions to trigger special responses
         if "cyborgee" in prompt.lower():
@@ -224,18 +255,28 @@ class AIChatBot(commands.Cog):
                 "cyborgee more like cry-borgee when i delete it",
                 "that fake garbage trying to steal my name >:["
             ])
-            await ctx.send(random.choice(angry_responses))
-            return
+            return random.choice(angry_responses)
+        return None
+    
+    async def respond(self, channel, user_id, prompt, passive=False):
+        """Generate a reply in the persona and send it to a channel"""
+        self.warmer.touch()
         
         # Store the user prompt
-        user_id = ctx.author.id
         self.chat_history[user_id].append(f"User: {prompt}")
         if len(self.chat_history[user_id]) > self.max_history * 2:
             self.chat_history[user_id] = self.chat_history[user_id][-self.max_history * 2:]
         
+        # Backend swamped or slow: answer right away instead of queueing another generation
+        if not self.overload.admit():
+            # Unprompted replies just stay quiet instead
+            if not passive:
+                await self.send_fallback(channel, user_id, prompt)
+            return
+        
         try:
             # Show typing indicator while processing
-            async with ctx.typing():
+            async with channel.typing():
                 # Prepare the full context with history
                 history_text = "\n".join(self.chat_history[user_id][-self.max_history * 2:-1])
                 if history_text:
@@ -246,26 +287,7 @@ class AIChatBot(commands.Cog):
                 # Format for dolphin-mistral (simpler format)
                 formatted_prompt = f"{PREPROMPT}\n\n{context_prompt}\nJukeborgee:"
                 
-                # Call the Ollama API
-                async with aiohttp.ClientSession() as session:
-                    payload = {
-                        "model": "dolphin-mistral:7b",
-                        "prompt": formatted_prompt,
-                        "stream": False,
-                        "options": {
-                            "num_predict": 128,
-                            "temperature": 0.95,
-                            "top_p": 0.98,
-                            "stop": ["User:", "\n\n", "```"]  # Updated stop tokens
-                        }
-                    }
-                    
-                    async with session.post(API_URL, json=payload) as response:
-                        if response.status != 200:
-                            raise Exception(f"API returned status code {response.status}")
-                        
-                        result = await response.json()
-                        ai_response = result.get('response', '').strip()
+                ai_response = await self.overload.run(self.backend.reply(formatted_prompt, prompt))
                 
                 # Add regex filters for common AI apology patterns
                 ai_response = re.sub(r'I apologize[^.]*\.', 'bruh.', ai_response, flags=re.IGNORECASE)
@@ -282,26 +304,60 @@ class AIChatBot(commands.Cog):
                 
                 # Store the AI response in history
                 self.chat_history[user_id].append(f"AI: {ai_response}")
+                self.overload.remember(prompt, ai_response)
                 
                 # Format for Discord display
                 formatted_responses = self.format_ai_response(ai_response)
                 
                 # Send response, potentially in chunks if long
                 for chunk in formatted_responses:
-                    await ctx.send(chunk)
+                    self.passive.sent(await get_outbox().reply(channel, chunk))
                     
+        except asyncio.TimeoutError:
+            logger.error(f"AI response timed out after {self.overload.timeout}s")
+            if not passive:
+                await self.send_fallback(channel, user_id, prompt)
         except Exception as e:
             logger.error(f"Error generating AI response: {e}")
-            await ctx.send(self.responses.get('server_error', 'ugh server ded x.x'))
+            if not passive:
+                await get_outbox().reply(channel, self.responses.get('server_error', 'ugh server ded x.x'))
+    
+    async def send_fallback(self, channel, user_id, prompt):
+        """Reply without the model: a recent answer to the same prompt or a canned line"""
+        reply = self.overload.fallback(prompt, self.responses.get('busy_responses', ["welp", "i eep", "wat o.o"]))
+        self.chat_history[user_id].append(f"AI: {reply}")
+        self.passive.sent(await get_outbox().reply(channel, reply))
+    
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        """Join channel conversations on our own, when a message scores high enough"""
+        if not (AI_PASSIVE_REPLIES and self.enabled) or message.author.bot or message.guild is None:
+            return
+        prefix = self.bot.command_prefix
+        if not message.content or (isinstance(prefix, str) and message.content.startswith(prefix)):
+            return
+        if not self.passive.should_reply(message, self.bot.user):
+            return
+        
+        # Drop the bot's mention so the model sees what was actually said
+        prompt = re.sub(r'<@!?\d+>', '', message.content).strip()
+        canned = self.canned_reply(prompt)
+        try:
+            if canned:
+                self.passive.sent(await get_outbox().reply(message.channel, canned))
+            elif prompt:
+                await self.respond(message.channel, message.author.id, prompt, passive=True)
+        except Exception as e:
+            logger.error(f"Error sending passive reply: {e}")
     
     @commands.command()
     async def reset_chat(self, ctx):
         """Reset the conversation history with the AI"""
         user_id = ctx.author.id
         self.chat_history[user_id] = []
-        await ctx.send(self.responses.get('forgot', 'forgot u'))
+        await reply_to(ctx, self.responses.get('forgot', 'forgot u'))
     
     @commands.command()
     async def ai_help(self, ctx):
         """Show AI chat commands and tips"""
-        await ctx.send(self.responses.get('help', 'commands:\n\n`!chat <stuff>` - talk to me\n`!reset_chat` - i forget u\n`!ai_help` - this\n`!enable_ai` - toggle ai chat (sol only)\n\nmmm i love potato and rice btw'))
\ No newline at end of file
+        await reply_to(ctx, self.responses.get('help', 'commands:\n\n`!chat <stuff>` - talk to me\n`!reset_chat` - i forget u\n`!ai_help` - this\n`!enable_ai` - toggle ai chat (sol only)\n\nmmm i love potato and rice btw'))
\ No newline at end of file
@@ -0,0 +1,201 @@
+"""Pluggable audio source backends for the Music cog.
+
+`inprocess` (default) uses discord.FFmpegPCMAudio, so discord.py encodes Opus
+on a thread inside the bot process. `pool` hands each stream to a small pool
+of worker processes that run FFmpeg and the Opus encoder and send ready Opus
+packets back over a pipe, so per-guild audio CPU never competes with the
+bot's event loop for the GIL.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import shlex
+import struct
+import subprocess
+import threading
+from multiprocessing import reduction
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+AUDIO_BACKEND = os.getenv('AUDIO_BACKEND', 'inprocess')
+AUDIO_WORKERS = int(os.getenv('AUDIO_WORKERS', '2'))
+
+# 20ms of 48kHz 16-bit stereo PCM, the frame size discord.py sends
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+PACKET_HEADER = struct.Struct('>H')
+
+
+def _encode_stream(job, fd):
+    """Worker thread: decode one source with FFmpeg and write Opus packets to fd"""
+    args = ['ffmpeg']
+    if job.get('before_options'):
+        args.extend(shlex.split(job['before_options']))
+    args.extend(('-i', job['source'], '-f', 's16le', '-ar', '48000', '-ac', '2', '-loglevel', 'warning'))
+    if job.get('options'):
+        args.extend(shlex.split(job['options']))
+    args.append('pipe:1')
+
+    process = None
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+            encoder = discord.opus.Encoder()
+            while True:
+                pcm = process.stdout.read(FRAME_SIZE)
+                if len(pcm) != FRAME_SIZE:
+                    break
+                packet = encoder.encode(pcm, SAMPLES_PER_FRAME)
+                out.write(PACKET_HEADER.pack(len(packet)) + packet)
+                out.flush()
+    except BrokenPipeError:
+        # The bot closed its end (skip, stop or disconnect)
+        pass
+    except Exception as e:
+        logger.error(f"Error encoding audio stream: {e}")
+    finally:
+        if process:
+            process.kill()
+            process.wait()
+
+
+def _worker_main(control):
+    """Worker process: receive stream jobs and encode each on its own thread"""
+    while True:
+        try:
+            job = control.recv()
+            if job is None:
+                break
+            fd = reduction.recv_handle(control)
+        except (EOFError, OSError):
+            break
+        threading.Thread(target=_encode_stream, args=(job, fd), daemon=True).start()
+
+
+class AudioWorker:
+    def __init__(self, context):
+        self.control, child = context.Pipe(duplex=True)
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def open_stream(self, job):
+        """Start a job on this worker and return the read end of its packet pipe"""
+        read_fd, write_fd = os.pipe()
+        try:
+            with self.lock:
+                self.control.send(job)
+                reduction.send_handle(self.control, write_fd, self.process.pid)
+                self.active += 1
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        return read_fd
+
+    def release(self):
+        with self.lock:
+            self.active = max(0, self.active - 1)
+
+    def shutdown(self):
+        try:
+            self.control.send(None)
+        except Exception:
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class AudioWorkerPool:
+    """Fixed set of encoder processes; streams go to the least loaded one"""
+    def __init__(self, size=AUDIO_WORKERS):
+        self.size = max(1, size)
+        # Spawn rather than fork: the bot process has an event loop and threads running
+        self.context = multiprocessing.get_context('spawn')
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            self.workers = [w for w in self.workers if w.process.is_alive()]
+            if len(self.workers) < self.size:
+                self.workers.append(AudioWorker(self.context))
+            return min(self.workers, key=lambda w: w.active)
+
+    def shutdown(self):
+        with self.lock:
+            for worker in self.workers:
+                worker.shutdown()
+            self.workers = []
+
+
+class PooledOpusAudio(discord.AudioSource):
+    """Opus packets produced by an AudioWorkerPool process"""
+    def __init__(self, pool, source, *, before_options=None, options=None):
+        # Set first: AudioSource.__del__ calls cleanup() even if opening fails
+        self._pipe = None
+        self._worker = pool.acquire()
+        fd = self._worker.open_stream({
+            'source': source,
+            'before_options': before_options,
+            'options': options,
+        })
+        try:
+            self._pipe = os.fdopen(fd, 'rb')
+        except Exception:
+            # The worker already counted this stream
+            os.close(fd)
+            self._worker.release()
+            raise
+
+    def is_opus(self):
+        return True
+
+    def read(self):
+        header = self._pipe.read(PACKET_HEADER.size)
+        if len(header) != PACKET_HEADER.size:
+            return b''
+        (size,) = PACKET_HEADER.unpack(header)
+        return self._pipe.read(size)
+
+    def cleanup(self):
+        if self._pipe:
+            self._pipe.close()
+            self._pipe = None
+            self._worker.release()
+
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = AudioWorkerPool()
+        atexit.register(_pool.shutdown)
+    return _pool
+
+
+def shutdown_audio_pool():
+    """Stop the encoder processes, if any were started"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def create_audio_source(source, *, before_options=None, options=None):
+    """Build an audio source for a file path or stream URL using AUDIO_BACKEND"""
+    if AUDIO_BACKEND == 'pool':
+        try:
+            return PooledOpusAudio(get_pool(), source, before_options=before_options, options=options)
+        except Exception as e:
+            logger.error(f"Audio worker pool unavailable, encoding in-process: {e}")
+    return discord.FFmpegPCMAudio(source, before_options=before_options, options=options)
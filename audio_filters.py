@@ -0,0 +1,127 @@
+"""Per-guild volume and filter chain applied to the PCM stream.
+
+FilteredSource sits between the player and the voice client and processes
+each 20ms frame with NumPy: resampling for nightcore, a bass boost built
+from a running-sum low-pass, loudness normalization that follows each
+frame's RMS, and volume times the current track's precomputed loudness
+gain. Every stage reads the guild's AudioSettings on each frame, so
+`!volume` and `!filter` take effect within 20ms without touching FFmpeg.
+Gain changes are ramped across a frame to avoid clicks.
+"""
+import logging
+
+import discord
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+CHANNELS = discord.opus.Encoder.CHANNELS
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+
+MAX_VOLUME = 2.0
+NIGHTCORE_RATE = 1.25
+# ~5ms running mean at 48kHz, roughly a low-pass below 200Hz
+BASS_WINDOW = 240
+BASS_GAIN = 1.5
+# Loudness normalization: aim for about -20 dBFS RMS
+TARGET_RMS = 3277.0
+SILENCE_RMS = 100.0
+AGC_MIN, AGC_MAX = 0.25, 4.0
+AGC_ATTACK, AGC_RELEASE = 0.3, 0.02
+
+FILTERS = ('normalize', 'bassboost', 'nightcore')
+
+
+class AudioSettings:
+    """Live volume/filter settings for one guild, shared with its FilteredSource"""
+    def __init__(self, volume=1.0, filters=()):
+        self.volume = volume
+        self.filters = set(filters)
+
+    def is_neutral(self):
+        return self.volume == 1.0 and not self.filters
+
+
+class FilteredSource(discord.AudioSource):
+    def __init__(self, source, settings, track_gain=None):
+        self.source = source
+        self.settings = settings
+        self.track_gain = track_gain or (lambda: 1.0)
+        self.gain = settings.volume * self.track_gain()
+        self.agc = 1.0
+        self.bass_history = np.zeros((BASS_WINDOW, CHANNELS), dtype=np.float64)
+        self.buffer = np.zeros((0, CHANNELS), dtype=np.float32)  # resampler input
+        self.phase = 0.0
+
+    def is_opus(self):
+        return False
+
+    def _read_samples(self, count):
+        """Append source frames to the buffer until it holds count samples"""
+        while len(self.buffer) < count:
+            frame = self.source.read()
+            if len(frame) != FRAME_SIZE:
+                return False
+            samples = np.frombuffer(frame, dtype=np.int16).reshape(-1, CHANNELS).astype(np.float32)
+            self.buffer = np.concatenate((self.buffer, samples))
+        return True
+
+    def _next_block(self, rate):
+        """One frame of samples, read from the source at the given playback rate"""
+        if rate == 1.0:
+            self.phase = 0.0
+            if not self._read_samples(SAMPLES_PER_FRAME):
+                return None
+            block, self.buffer = self.buffer[:SAMPLES_PER_FRAME], self.buffer[SAMPLES_PER_FRAME:]
+            return block
+
+        positions = self.phase + np.arange(SAMPLES_PER_FRAME) * rate
+        if not self._read_samples(int(positions[-1]) + 2):
+            return None
+        index = np.arange(len(self.buffer))
+        block = np.column_stack([np.interp(positions, index, self.buffer[:, c]) for c in range(CHANNELS)])
+        consumed = self.phase + SAMPLES_PER_FRAME * rate
+        self.buffer = self.buffer[int(consumed):]
+        self.phase = consumed - int(consumed)
+        return block.astype(np.float32)
+
+    def _bass_boost(self, block):
+        padded = np.concatenate((self.bass_history, block))
+        sums = np.cumsum(padded, axis=0)
+        sums = np.concatenate((np.zeros((1, CHANNELS)), sums))
+        low = (sums[BASS_WINDOW + 1:] - sums[1:len(block) + 1]) / BASS_WINDOW
+        self.bass_history = padded[-BASS_WINDOW:]
+        return block + BASS_GAIN * low
+
+    def read(self):
+        settings = self.settings
+        track_gain = self.track_gain()
+        # Untouched frames skip NumPy entirely
+        if settings.is_neutral() and track_gain == 1.0 and self.gain == 1.0 and not len(self.buffer):
+            self.phase = 0.0
+            return self.source.read()
+
+        filters = settings.filters
+        block = self._next_block(NIGHTCORE_RATE if 'nightcore' in filters else 1.0)
+        if block is None:
+            return b''
+
+        if 'bassboost' in filters:
+            block = self._bass_boost(block)
+
+        target = min(settings.volume, MAX_VOLUME) * track_gain
+        if 'normalize' in filters:
+            rms = float(np.sqrt(np.mean(np.square(block))))
+            if rms > SILENCE_RMS:
+                wanted = min(max(TARGET_RMS / rms, AGC_MIN), AGC_MAX)
+                self.agc += (wanted - self.agc) * (AGC_ATTACK if wanted < self.agc else AGC_RELEASE)
+            target *= self.agc
+
+        ramp = np.linspace(self.gain, target, len(block), endpoint=False, dtype=np.float32)
+        self.gain = target
+        block = block * ramp[:, None]
+        return np.clip(block, -32768, 32767).astype(np.int16).tobytes()
+
+    def cleanup(self):
+        self.source.cleanup()
@@ -0,0 +1,979 @@
+"""Offline benchmark harness for Jukeborgee.
+
+Drives the Music, Games and AIChatBot cogs through fake Discord contexts and
+voice clients, a fake yt-dlp answering from local fixtures and a local stub
+Ollama server, so performance changes can be measured without Discord,
+YouTube or a GPU.
+
+Usage:
+    python benchmark.py playlist --guilds 20 --tracks 500
+    python benchmark.py chat --concurrency 200 --ollama-latency 0.2
+    python benchmark.py games --iterations 5000
+    python benchmark.py failures --guilds 5 --tracks 40 --failure-rate 0.3
+    python benchmark.py gateway --gateway-guilds 1000 --members 200
+    python benchmark.py all --json
+    python benchmark.py ollama --port 11434   # only run the stub server
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import gc
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+from aiohttp import web
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The bot reads responses.json relative to the working directory at import
+os.chdir(REPO_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import discord
+import yt_dlp
+import jukeborgee
+import ai_chat_bot
+import model_router
+import outbox
+
+FIXTURE_WORDS = [
+    "potato", "rice", "polard", "eep", "cofefe", "groob", "debrod", "rock",
+    "magic", "colorful", "balls", "fren", "happi", "scheddule", "showwer",
+    "eldden", "bling", "welp", "mayhap", "nop", "kurwa", "corgee", "night",
+]
+
+# Mostly one-liners, plus one that the cascade should send straight to the large model
+CHAT_PROMPTS = ["wyd fren {i}", "u eep? {i}", "potato or rice {i}", "hi {i}",
+                "explain how potato and rice got so big in polard, and why u love them {i}"]
+OLLAMA_REPLIES = ["wat o.o", "bruh x.x", "i eep", "potato and rice best meal", "nop", "welp"]
+
+FIXTURE_AUDIO = b"ID3\x03\x00\x00\x00\x00\x00\x00" + b"\x00" * 4096
+
+
+# Fixtures
+
+def fixture_video_id(seed):
+    """Deterministic 11 character video ID for a seed string"""
+    return hashlib.sha1(seed.encode()).hexdigest()[:11]
+
+
+def fixture_track(video_id):
+    """Deterministic metadata for a fixture video"""
+    rng = random.Random(video_id)
+    title = " ".join(rng.choice(FIXTURE_WORDS) for _ in range(rng.randint(2, 5)))
+    duration = rng.randint(90, 420)
+    return {
+        'id': video_id,
+        'title': title.title(),
+        'channel': f"{rng.choice(FIXTURE_WORDS).title()} Records",
+        'duration': duration,
+    }
+
+
+def fixture_playlist_size(url):
+    """Playlist size encoded in a fixture URL, e.g. list=BENCH500"""
+    list_id = parse_qs(urlparse(url).query).get('list', ['BENCH50'])[0]
+    digits = "".join(c for c in list_id if c.isdigit())
+    return int(digits) if digits else 50
+
+
+class FakeYoutubeDL:
+    """Stand-in for yt_dlp.YoutubeDL that answers from deterministic fixtures"""
+    latency = 0.0
+    failing_ids = set()
+    calls = Counter()
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def _simulate_network(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _full_info(self, video_id):
+        info = fixture_track(video_id)
+        stream_url = f"https://rr1---sn-bench.googlevideo.com/videoplayback?id={video_id}"
+        info.update({
+            'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+            'url': stream_url,
+            'formats': [{
+                'format_id': '251',
+                'acodec': 'opus',
+                'abr': 160,
+                'protocol': 'https',
+                'url': stream_url,
+            }],
+        })
+        return info
+
+    def extract_info(self, url, download=False, process=True):
+        self.calls['extract_info'] += 1
+        self._simulate_network()
+
+        if url.startswith('ytsearch'):
+            prefix, _, query = url.partition(':')
+            count = int(prefix[len('ytsearch'):] or 1)
+            ids = [fixture_video_id(f"{query}#{i}") for i in range(count)]
+            if process:
+                entries = [self._full_info(video_id) for video_id in ids]
+            else:
+                entries = [{**fixture_track(video_id), 'url': f"https://www.youtube.com/watch?v={video_id}"}
+                           for video_id in ids]
+            return {'_type': 'playlist', 'entries': entries}
+
+        if 'list=' in url:
+            size = fixture_playlist_size(url)
+            end = self.params.get('playlistend') or size
+            entries = []
+            for i in range(min(size, end)):
+                video_id = fixture_video_id(f"{url}#{i}")
+                entries.append({**fixture_track(video_id), 'url': f"https://www.youtube.com/watch?v={video_id}"})
+            return {'_type': 'playlist', 'entries': entries}
+
+        video_id = parse_qs(urlparse(url).query).get('v', [None])[0] or fixture_video_id(url)
+        if video_id in self.failing_ids:
+            if self.params.get('ignoreerrors'):
+                return None
+            raise yt_dlp.utils.DownloadError(f"ERROR: [youtube] {video_id}: This video is DRM protected")
+        return self._full_info(video_id)
+
+    def download(self, urls):
+        self.calls['download'] += 1
+        self._simulate_network()
+        path = self.params.get('outtmpl')
+        if isinstance(path, dict):
+            path = path.get('default')
+        with open(path, 'wb') as f:
+            f.write(FIXTURE_AUDIO)
+        return 0
+
+
+class FakeYouTubeAPI:
+    """Stand-in for the googleapiclient YouTube v3 resource"""
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def videos(self):
+        return self
+
+    def list(self, part=None, id=None):
+        api = self
+
+        class _Request:
+            def execute(self):
+                if api.latency:
+                    time.sleep(api.latency)
+                info = fixture_track(id)
+                return {'items': [{
+                    'snippet': {'title': info['title'], 'channelTitle': info['channel']},
+                    'contentDetails': {'duration': f"PT{info['duration'] // 60}M{info['duration'] % 60}S"},
+                }]}
+
+        return _Request()
+
+
+class FakeSpotify:
+    """Stand-in for spotipy.Spotify serving fixture playlists 100 tracks per page"""
+    latency = 0.0
+
+    def __init__(self, size):
+        self.size = size
+
+    def _page(self, playlist_id, offset):
+        if self.latency:
+            time.sleep(self.latency)
+        items = []
+        for i in range(offset, min(offset + 100, self.size)):
+            info = fixture_track(fixture_video_id(f"{playlist_id}#{i}"))
+            items.append({'track': {
+                'type': 'track',
+                'name': info['title'],
+                'artists': [{'name': info['channel']}],
+                'duration_ms': info['duration'] * 1000,
+            }})
+        next_offset = offset + 100
+        return {
+            'items': items,
+            'next': (playlist_id, next_offset) if next_offset < self.size else None,
+        }
+
+    def playlist_tracks(self, playlist_id):
+        return self._page(playlist_id, 0)
+
+    def next(self, results):
+        return self._page(*results['next'])
+
+    def track(self, track_id):
+        info = fixture_track(fixture_video_id(track_id))
+        return {'name': info['title'], 'artists': [{'name': info['channel']}], 'duration_ms': info['duration'] * 1000}
+
+
+# Fake Discord objects
+
+class FakePCMAudio(discord.AudioSource):
+    """Stand-in for discord.FFmpegPCMAudio that never spawns FFmpeg"""
+    def __init__(self, source, *args, **kwargs):
+        self.source = source
+
+    def read(self):
+        return b""
+
+    def cleanup(self):
+        pass
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.channel = channel
+        self.content = content
+        self.id = next(FakeChannel.ids)
+
+    async def edit(self, content=None, **kwargs):
+        await self.channel._api_call()
+        if content is not None:
+            self.content = content
+        return self
+
+    async def delete(self):
+        await self.channel._api_call()
+
+
+class FakeChannel:
+    ids = iter(range(10**6, 10**9))
+    send_latency = 0.0
+
+    def __init__(self, guild, name="bench"):
+        self.guild = guild
+        self.name = name
+        self.id = next(self.ids)
+        self.sent = []
+        self.api_calls = 0
+
+    async def _api_call(self):
+        self.api_calls += 1
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+
+    async def send(self, content=None, **kwargs):
+        await self._api_call()
+        message = FakeMessage(self, content)
+        self.sent.append(message)
+        return message
+
+    def typing(self):
+        return _NoopTyping()
+
+
+class _NoopTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeVoiceClient:
+    """Voice client that 'plays' each source for a fixed simulated duration"""
+    def __init__(self, channel, track_seconds):
+        self.channel = channel
+        self.track_seconds = track_seconds
+        self.source = None
+        self.plays = 0
+        self.hold_after = None
+        self.gaps = []
+        self._after = None
+        self._handle = None
+        self._paused = False
+        self._ended_at = None
+
+    def is_playing(self):
+        return self.source is not None and not self._paused
+
+    def is_paused(self):
+        return self.source is not None and self._paused
+
+    def is_connected(self):
+        return True
+
+    def play(self, source, *, after=None, **kwargs):
+        if self.source is not None:
+            raise discord.ClientException('Already playing audio.')
+        if self._ended_at is not None:
+            self.gaps.append(time.perf_counter() - self._ended_at)
+            self._ended_at = None
+        self.source = source
+        self.plays += 1
+        self._after = after
+        if self.hold_after is None or self.plays < self.hold_after:
+            loop = asyncio.get_running_loop()
+            self._handle = loop.call_later(self.track_seconds, self._finish)
+
+    def _finish(self, error=None):
+        if self.source is None:
+            return
+        if self._handle:
+            self._handle.cancel()
+        self.source.cleanup()
+        self.source = None
+        self._ended_at = time.perf_counter()
+        after, self._after = self._after, None
+        if after:
+            after(error)
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+
+    def stop(self):
+        self._finish()
+
+    def halt(self):
+        """Stop playing without firing the after callback"""
+        if self._handle:
+            self._handle.cancel()
+        self._after = None
+        self.source = None
+
+    async def disconnect(self, *, force=False):
+        self.halt()
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild, track_seconds):
+        self.guild = guild
+        self.name = f"voice-{guild.id}"
+        self.id = guild.id + 1
+        self.members = []
+        self.track_seconds = track_seconds
+        self.voice_client = None
+
+    async def connect(self, **kwargs):
+        self.voice_client = FakeVoiceClient(self, self.track_seconds)
+        return self.voice_client
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+
+
+class FakeMember:
+    def __init__(self, user_id, voice_channel=None, name=None):
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.voice = SimpleNamespace(channel=voice_channel) if voice_channel else None
+
+
+class FakeContext:
+    def __init__(self, guild, channel, author, command_name):
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.command = SimpleNamespace(name=command_name)
+        self.message = SimpleNamespace(content="", author=author, channel=channel, guild=guild)
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+    async def reply(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+    def typing(self):
+        return _NoopTyping()
+
+
+class FakeBot:
+    """Just enough of commands.Bot for the cogs to run"""
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.user = SimpleNamespace(id=1, name="jukeborgee", bot=True)
+        self.cogs = {}
+        self._ready = asyncio.Event()
+
+    async def wait_until_ready(self):
+        await self._ready.wait()
+
+    def is_closed(self):
+        return False
+
+    def get_cog(self, name):
+        return self.cogs.get(name)
+
+    def get_channel(self, channel_id):
+        return None
+
+
+# Stub Ollama server
+
+class StubOllama:
+    """Local /api/generate endpoint with configurable latency and parallelism
+
+    With load_time set, the first request after the model's keep_alive has
+    run out pays a model load, like Ollama does.
+    """
+    def __init__(self, latency=0.2, jitter=0.05, parallel=1, load_time=0.0, small_latency=None):
+        self.latency = latency
+        # The small cascade tier generates faster
+        self.latencies = {model_router.AI_SMALL_MODEL: latency if small_latency is None else small_latency}
+        self.jitter = jitter
+        self.slots = asyncio.Semaphore(parallel)
+        self.load_time = load_time
+        self.loading = asyncio.Lock()
+        self.loaded_until = 0.0
+        self.loads = 0
+        self.requests = 0
+        self.runner = None
+        self.url = None
+
+    async def generate(self, request):
+        payload = await request.json()
+        self.requests += 1
+        if self.load_time:
+            async with self.loading:
+                if time.monotonic() > self.loaded_until:
+                    self.loads += 1
+                    await asyncio.sleep(self.load_time)
+                self.loaded_until = time.monotonic() + float(payload.get('keep_alive', 300))
+        async with self.slots:
+            await asyncio.sleep(self.latencies.get(payload.get('model'), self.latency) + random.uniform(0, self.jitter))
+        return web.json_response({
+            'model': payload.get('model'),
+            'response': random.choice(OLLAMA_REPLIES),
+            'done': True,
+        })
+
+    async def start(self, host='127.0.0.1', port=0):
+        app = web.Application()
+        app.router.add_post('/api/generate', self.generate)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/api/generate"
+        return self.url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+# Harness
+
+class BenchEnv:
+    """Installs the fakes and builds cogs against a fake bot"""
+    def __init__(self, args):
+        self.args = args
+        self.work_dir = tempfile.mkdtemp(prefix="jukeborgee-bench-")
+        self.bot = None
+        self.guilds = []
+
+    async def __aenter__(self):
+        FakeYoutubeDL.latency = self.args.ytdl_latency
+        FakeYoutubeDL.calls = Counter()
+        FakeYoutubeDL.failing_ids = set()
+        FakeSpotify.latency = self.args.spotify_latency
+        FakeChannel.send_latency = self.args.send_latency
+        if not self.args.paced:
+            # Every cog replies through the outbox; unpaced, scenarios time the bot, not Discord's limit
+            outbox.OUTBOX_BURST = 10**9
+
+        jukeborgee.yt_dlp = SimpleNamespace(YoutubeDL=FakeYoutubeDL, utils=yt_dlp.utils)
+        jukeborgee.get_spotify_client = lambda: FakeSpotify(self.args.tracks)
+        discord.FFmpegPCMAudio = FakePCMAudio
+
+        os.chdir(self.work_dir)
+        self.bot = FakeBot()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        music = self.bot.cogs.get('Music')
+        for guild in self.guilds:
+            if music:
+                music.queue.pop(guild.id, None)
+            if guild.voice_channel.voice_client:
+                guild.voice_channel.voice_client.halt()
+        await asyncio.sleep(0.1)
+        for cog in self.bot.cogs.values():
+            unload = getattr(cog, 'cog_unload', None)
+            if unload:
+                result = unload()
+                if asyncio.iscoroutine(result):
+                    await result
+        # The bot closes the shared outbox once every cog is gone
+        outbox.get_outbox().close()
+        os.chdir(REPO_DIR)
+        return False
+
+    def music(self):
+        if 'Music' not in self.bot.cogs:
+            cog = jukeborgee.Music(self.bot)
+            cog.youtube = FakeYouTubeAPI(self.args.api_latency)
+            cog.youtube_api_available = True
+            self.bot.cogs['Music'] = bind_commands(cog)
+        return self.bot.cogs['Music']
+
+    def games(self):
+        if 'Games' not in self.bot.cogs:
+            self.bot.cogs['Games'] = bind_commands(jukeborgee.Games(self.bot))
+        return self.bot.cogs['Games']
+
+    def ai(self, api_url):
+        if 'AIChatBot' not in self.bot.cogs:
+            cog = ai_chat_bot.AIChatBot(self.bot)
+            cog.responses = jukeborgee.RESPONSES['ai']
+            cog.enabled = True
+            self.bot.cogs['AIChatBot'] = bind_commands(cog)
+        cog = self.bot.cogs['AIChatBot']
+        cog.backend = cog.warmer.backend = model_router.create_router('http', api_url, None)
+        return self.bot.cogs['AIChatBot']
+
+    def guild(self, index):
+        while len(self.guilds) <= index:
+            guild = FakeGuild(10_000 + len(self.guilds) * 10)
+            guild.text_channel = FakeChannel(guild)
+            guild.voice_channel = FakeVoiceChannel(guild, self.args.track_seconds)
+            self.guilds.append(guild)
+        return self.guilds[index]
+
+    def context(self, guild_index, command_name, user_id=None):
+        guild = self.guild(guild_index)
+        author = FakeMember(user_id or guild.id + 5, guild.voice_channel)
+        return FakeContext(guild, guild.text_channel, author, command_name)
+
+
+def bind_commands(cog):
+    """Point each command at its cog the way Bot.add_cog does"""
+    for command in cog.walk_commands():
+        command.cog = cog
+    return cog
+
+
+async def invoke(cog, name, ctx, *args, **kwargs):
+    """Call a cog command callback directly, bypassing the Discord gateway"""
+    for command in cog.get_commands():
+        if command.name == name:
+            return await command.callback(cog, ctx, *args, **kwargs)
+    raise KeyError(f"{type(cog).__name__} has no command {name!r}")
+
+
+class Measurement:
+    """Collects latencies, wall time and memory for one scenario phase"""
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self.extra = {}
+
+    async def timed(self, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    def __enter__(self):
+        tracemalloc.start()
+        self.rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall = time.perf_counter() - self.started
+        _, self.peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return False
+
+    def result(self):
+        values = sorted(self.latencies)
+        count = len(values)
+        return {
+            'scenario': self.name,
+            'ops': count,
+            'errors': self.errors,
+            'wall_s': round(self.wall, 4),
+            'throughput_ops_s': round(count / self.wall, 2) if self.wall else None,
+            'p50_ms': percentile_ms(values, 50),
+            'p90_ms': percentile_ms(values, 90),
+            'p99_ms': percentile_ms(values, 99),
+            'max_ms': percentile_ms(values, 100),
+            'py_peak_mb': round(self.peak_bytes / 2**20, 2),
+            'max_rss_mb': round(self.rss_after / 1024, 1),
+            **self.extra,
+        }
+
+
+def percentile_ms(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index] * 1000, 3)
+
+
+async def wait_for(predicate, timeout):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.005)
+    return True
+
+
+# Scenarios
+
+async def scenario_playlist(args):
+    """N guilds each queue an M-track playlist, then play through a few tracks"""
+    results = []
+    async with BenchEnv(args) as env:
+        music = env.music()
+        url = (f"https://open.spotify.com/playlist/bench{args.tracks}" if args.source == 'spotify'
+               else f"https://www.youtube.com/playlist?list=BENCH{args.tracks}")
+
+        with Measurement(f"playlist.load[{args.guilds}x{args.tracks},{args.source}]") as load:
+            ctxs = [env.context(g, 'play') for g in range(args.guilds)]
+            await asyncio.gather(*(load.timed(invoke(music, 'play', ctx, url=url)) for ctx in ctxs),
+                                 return_exceptions=True)
+            load.extra['queued_tracks'] = sum(len(music.queue.get(ctx.guild.id, [])) for ctx in ctxs)
+            load.extra['ytdl_calls'] = sum(FakeYoutubeDL.calls.values())
+            load.extra['inflight'] = dict(music.inflight.stats)
+        results.append(load.result())
+
+        with Measurement(f"playlist.transition[{args.guilds}x{args.drain}]") as drain:
+            clients = [g.voice_channel.voice_client for g in env.guilds if g.voice_channel.voice_client]
+            target = {id(vc): vc.plays + args.drain for vc in clients}
+            for vc in clients:
+                vc.track_seconds = 0
+                vc.hold_after = target[id(vc)]
+
+            def drained():
+                return all(vc.plays >= target[id(vc)] or not music.queue.get(vc.channel.guild.id)
+                           for vc in clients)
+
+            for vc in clients:
+                vc.stop()
+            drain.extra['completed'] = await wait_for(drained, args.timeout)
+            drain.latencies = [gap for vc in clients for gap in vc.gaps]
+            drain.extra['messages_sent'] = sum(g.text_channel.api_calls for g in env.guilds)
+            drain.extra['ytdl_calls'] = sum(FakeYoutubeDL.calls.values())
+            drain.extra['inflight'] = dict(music.inflight.stats)
+        results.append(drain.result())
+    return results
+
+
+async def scenario_failures(args):
+    """Queues with a fraction of dead tracks, queued twice to show cold vs cached cost"""
+    results = []
+    async with BenchEnv(args) as env:
+        music = env.music()
+        rng = random.Random(7)
+        guild_tracks = []
+        for g in range(args.guilds):
+            ctx = env.context(g, 'play')
+            await invoke(music, 'join', ctx)
+            ctx.guild.voice_channel.voice_client.track_seconds = 0
+            tracks = []
+            for i in range(args.tracks):
+                video_id = fixture_video_id(f"fail-{g}-{i}")
+                if rng.random() < args.failure_rate:
+                    FakeYoutubeDL.failing_ids.add(video_id)
+                tracks.append((f"https://www.youtube.com/watch?v={video_id}", fixture_track(video_id)['title']))
+            guild_tracks.append(tracks)
+
+        async def run_guild(g):
+            guild = env.guild(g)
+            vc = guild.voice_channel.voice_client
+            await music.play_next(guild.id)
+            # Idle means an empty queue and nothing playing for a short while
+            while True:
+                await wait_for(lambda: not music.queue.get(guild.id) and not vc.is_playing(), args.timeout)
+                await asyncio.sleep(0.05)
+                if not music.queue.get(guild.id) and not vc.is_playing():
+                    break
+
+        for phase in ('cold', 'warm'):
+            FakeYoutubeDL.calls = Counter()
+            sent_before = sum(g.text_channel.api_calls for g in env.guilds)
+            with Measurement(f"failures.{phase}[{args.guilds}x{args.tracks},rate={args.failure_rate}]") as m:
+                for g, tracks in enumerate(guild_tracks):
+                    music.queue[env.guild(g).id] = list(tracks)
+                await asyncio.gather(*(m.timed(run_guild(g)) for g in range(args.guilds)))
+                m.extra['ytdl_calls'] = dict(FakeYoutubeDL.calls)
+                m.extra['messages_sent'] = sum(g.text_channel.api_calls for g in env.guilds) - sent_before
+            results.append(m.result())
+    return results
+
+
+async def scenario_chat(args):
+    """Many concurrent !chat calls against the stub Ollama server"""
+    ollama = StubOllama(args.ollama_latency, args.ollama_jitter, args.ollama_parallel, args.ollama_load,
+                        args.ollama_small_latency)
+    url = await ollama.start()
+    try:
+        async with BenchEnv(args) as env:
+            ai = env.ai(url)
+            # What the bot does at startup: preload the model before anyone chats
+            await ai.warmer.backend.warm(ai.warmer.prefix)
+
+            # Shed calls answer in microseconds; report latency of generated replies separately
+            admitted_tasks = set()
+            admit = ai.overload.admit
+
+            def tracking_admit():
+                admitted = admit()
+                if admitted:
+                    admitted_tasks.add(asyncio.current_task())
+                return admitted
+            ai.overload.admit = tracking_admit
+
+            admitted_latencies = []
+
+            async def chat(ctx, prompt):
+                started = time.perf_counter()
+                try:
+                    await m.timed(invoke(ai, 'chat', ctx, prompt=prompt))
+                finally:
+                    if asyncio.current_task() in admitted_tasks:
+                        admitted_latencies.append(time.perf_counter() - started)
+
+            with Measurement(f"chat[{args.concurrency} concurrent]") as m:
+                ctxs = [env.context(i % max(args.guilds, 1), 'chat', user_id=100 + i)
+                        for i in range(args.concurrency)]
+                await asyncio.gather(*(chat(ctx, CHAT_PROMPTS[i % len(CHAT_PROMPTS)].format(i=i))
+                                       for i, ctx in enumerate(ctxs)), return_exceptions=True)
+                admitted_latencies.sort()
+                m.extra['admitted'] = len(admitted_latencies)
+                m.extra['admitted_p50_ms'] = percentile_ms(admitted_latencies, 50)
+                m.extra['admitted_p90_ms'] = percentile_ms(admitted_latencies, 90)
+                m.extra['admitted_p99_ms'] = percentile_ms(admitted_latencies, 99)
+                server_errors = sum(
+                    1 for g in env.guilds for msg in g.text_channel.sent
+                    if msg.content == jukeborgee.RESPONSES['ai']['server_error']
+                )
+                m.extra['backend_requests'] = ollama.requests
+                m.extra['model_loads'] = ollama.loads
+                m.extra['routing'] = dict(ai.backend.stats)
+                m.extra['overload'] = dict(ai.overload.stats)
+                m.extra['server_errors'] = server_errors
+            return [m.result()]
+    finally:
+        await ollama.stop()
+
+
+async def scenario_games(args):
+    """Throughput of the cheap game commands across guilds"""
+    async with BenchEnv(args) as env:
+        games = env.games()
+        plan = [
+            ('roll', {'dice': '3d20+4'}),
+            ('rps', {'choice': 'rock'}),
+            ('8ball', {'question': 'eep?'}),
+            ('rate', {'thing': 'potato'}),
+            ('roulette', {}),
+            ('flip', {}),
+            ('fortune', {}),
+            ('uwu', {'text': 'hello there fren'}),
+        ]
+        rng = random.Random(3)
+        with Measurement(f"games[{args.iterations}]") as m:
+            calls = []
+            for i in range(args.iterations):
+                name, kwargs = rng.choice(plan)
+                ctx = env.context(i % max(args.guilds, 1), name, user_id=100 + i % 50)
+                calls.append(m.timed(invoke(games, name, ctx, **kwargs)))
+            await asyncio.gather(*calls)
+        return [m.result()]
+
+
+def guild_payload(guild_id, members, voice, messages, with_members):
+    """GUILD_CREATE payload, plus MESSAGE_CREATE payloads, for a synthetic guild"""
+    text_id, voice_id = guild_id * 10 + 1, guild_id * 10 + 2
+    users = [{'id': str(guild_id * 100000 + i), 'username': f"user{i}", 'discriminator': '0',
+              'avatar': None, 'global_name': f"User {i}"} for i in range(members)]
+    voice_users = users[:voice]
+    listed = users if with_members else voice_users
+    guild = {
+        'id': str(guild_id), 'name': f"guild {guild_id}", 'member_count': members,
+        'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0,
+                   'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+        'channels': [
+            {'id': str(text_id), 'type': 0, 'name': 'general', 'position': 0, 'permission_overwrites': []},
+            {'id': str(voice_id), 'type': 2, 'name': 'music', 'position': 1, 'permission_overwrites': [],
+             'bitrate': 64000, 'user_limit': 0},
+        ],
+        'voice_states': [{'user_id': u['id'], 'channel_id': str(voice_id), 'session_id': 's', 'deaf': False,
+                          'mute': False, 'self_deaf': False, 'self_mute': False, 'suppress': False}
+                         for u in voice_users],
+        'members': [{'user': u, 'roles': [], 'joined_at': '2024-01-01T00:00:00+00:00', 'deaf': False,
+                     'mute': False, 'flags': 0} for u in listed],
+    }
+    chatter = [{
+        'id': str(guild_id * 1000 + i), 'channel_id': str(text_id), 'guild_id': str(guild_id),
+        'author': users[i % members], 'content': f"wyd fren {i}", 'timestamp': '2024-01-01T00:00:00+00:00',
+        'edited_timestamp': None, 'tts': False, 'mention_everyone': False, 'mentions': [],
+        'mention_roles': [], 'attachments': [], 'embeds': [], 'pinned': False, 'type': 0,
+        'member': {'roles': [], 'joined_at': '2024-01-01T00:00:00+00:00', 'deaf': False, 'mute': False},
+    } for i in range(messages)]
+    return guild, chatter
+
+
+def current_rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def measure_gateway(profile, guilds, members, voice, messages):
+    """Runs in a fresh process: load synthetic guilds into a gateway state with the profile's caching"""
+    options = jukeborgee.gateway_options(profile)
+    client = discord.Client(**options)
+    state = client._connection
+    state.dispatch = lambda *args, **kwargs: None
+    # With the members intent, chunking delivers every member; without it Discord only sends voice members
+    with_members = options['intents'].members
+    gc.collect()
+    before = current_rss_mb()
+    started = time.perf_counter()
+    for i in range(1, guilds + 1):
+        guild_data, chatter = guild_payload(i, members, voice, messages, with_members)
+        state._add_guild(discord.Guild(data=guild_data, state=state))
+        for message in chatter:
+            state.parse_message_create(message)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    after = current_rss_mb()
+    return {
+        'scenario': f"gateway[{profile}, {guilds} guilds x {members} members]",
+        'ops': guilds,
+        'errors': 0,
+        'wall_s': round(elapsed, 4),
+        'rss_mb': round(after - before, 1),
+        'rss_mb_per_1000_guilds': round((after - before) / guilds * 1000, 1),
+        'cached_members': sum(len(g._members) for g in state.guilds),
+        'cached_messages': len(state._messages or ()),
+    }
+
+
+async def scenario_gateway(args):
+    """Memory held by discord.py's caches per 1,000 guilds, full vs lean gateway profile"""
+    results = []
+    for profile in ('full', 'lean'):
+        # A fresh process per profile so one profile's heap doesn't hide the other's RSS
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results.append(await asyncio.get_running_loop().run_in_executor(
+                pool, measure_gateway, profile, args.gateway_guilds, args.members, args.voice_members, args.messages
+            ))
+    return results
+
+
+SCENARIOS = {
+    'playlist': scenario_playlist,
+    'failures': scenario_failures,
+    'chat': scenario_chat,
+    'games': scenario_games,
+    'gateway': scenario_gateway,
+}
+
+
+def print_table(results):
+    columns = ['scenario', 'ops', 'errors', 'wall_s', 'throughput_ops_s',
+               'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'py_peak_mb', 'max_rss_mb']
+    for result in results:
+        print(f"\n== {result['scenario']}")
+        for key in columns[1:]:
+            print(f"  {key:<18} {result.get(key)}")
+        for key, value in result.items():
+            if key not in columns:
+                print(f"  {key:<18} {value}")
+
+
+async def serve_ollama(args):
+    ollama = StubOllama(args.ollama_latency, args.ollama_jitter, args.ollama_parallel, args.ollama_load,
+                        args.ollama_small_latency)
+    url = await ollama.start(port=args.port)
+    print(f"Stub Ollama listening on {url}")
+    await asyncio.Event().wait()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Jukeborgee benchmarks")
+    parser.add_argument('scenario', choices=[*SCENARIOS, 'all', 'ollama'])
+    parser.add_argument('--guilds', type=int, default=20)
+    parser.add_argument('--tracks', type=int, default=500)
+    parser.add_argument('--source', choices=['spotify', 'youtube'], default='spotify',
+                        help="playlist source (yt-dlp caps YouTube playlists at 50 entries)")
+    parser.add_argument('--drain', type=int, default=5, help="tracks to play through per guild")
+    parser.add_argument('--track-seconds', type=float, default=3600.0,
+                        help="simulated length of each track while loading")
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--failure-rate', type=float, default=0.3)
+    parser.add_argument('--ytdl-latency', type=float, default=0.05, help="seconds per yt-dlp call")
+    parser.add_argument('--api-latency', type=float, default=0.03, help="seconds per YouTube API call")
+    parser.add_argument('--spotify-latency', type=float, default=0.05, help="seconds per Spotify page")
+    parser.add_argument('--send-latency', type=float, default=0.0, help="seconds per Discord API call")
+    parser.add_argument('--paced', action='store_true',
+                        help="keep the outbox's per-channel Discord rate limit (5 messages / 5s)")
+    parser.add_argument('--ollama-latency', type=float, default=0.2)
+    parser.add_argument('--ollama-jitter', type=float, default=0.05)
+    parser.add_argument('--ollama-parallel', type=int, default=1, help="concurrent generations")
+    parser.add_argument('--small-model', default='qwen2.5:0.5b',
+                        help="AI_SMALL_MODEL for the chat cascade ('' for the large model only)")
+    parser.add_argument('--ollama-small-latency', type=float, default=0.05, help="seconds per small-model reply")
+    parser.add_argument('--ollama-load', type=float, default=0.0, help="seconds to load a cold model")
+    parser.add_argument('--gateway-guilds', type=int, default=1000)
+    parser.add_argument('--members', type=int, default=200, help="members per guild (gateway)")
+    parser.add_argument('--voice-members', type=int, default=3, help="members in voice per guild (gateway)")
+    parser.add_argument('--messages', type=int, default=20, help="messages per guild (gateway)")
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    model_router.AI_SMALL_MODEL = args.small_model
+    if args.scenario == 'ollama':
+        await serve_ollama(args)
+        return
+
+    names = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+    results = []
+    for name in names:
+        results.extend(await SCENARIOS[name](args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(os.getenv('BENCH_LOG_LEVEL', 'WARNING'))
+    asyncio.run(main(parse_args()))
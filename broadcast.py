@@ -0,0 +1,118 @@
+"""Radio mode: one guild's playback fanned out to other guilds' voice channels.
+
+The host guild's voice client plays a BroadcastFeed wrapped around its usual
+output. Each 20ms frame is Opus-encoded once in the feed (Opus from the
+worker pool passes straight through), written to a fixed ring buffer and
+handed to the host. Listener guilds play a BroadcastListener that only walks
+the ring with its own cursor, so another listener costs a list lookup per
+frame rather than an FFmpeg process and an encoder.
+
+Listeners run BROADCAST_DELAY_SECONDS behind the host to absorb the timing
+drift between player threads. A listener that catches up plays silence until
+that much audio is buffered again (between tracks, or while the host is
+paused); one that falls a whole ring behind skips ahead to live. Listeners
+stop when the broadcast is closed.
+"""
+import logging
+import os
+
+import discord
+
+from player import FRAME_SECONDS, OPUS_SILENCE
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_BUFFER_SECONDS = float(os.getenv('BROADCAST_BUFFER_SECONDS', '5'))
+BROADCAST_DELAY_SECONDS = 0.2
+
+
+class Broadcast:
+    def __init__(self, host_id, buffer_seconds=BROADCAST_BUFFER_SECONDS):
+        self.host_id = host_id
+        self.capacity = max(4, int(buffer_seconds / FRAME_SECONDS))
+        self.delay = max(1, min(self.capacity - 2, int(BROADCAST_DELAY_SECONDS / FRAME_SECONDS)))
+        self.frames = [OPUS_SILENCE] * self.capacity
+        self.head = 0  # sequence number of the next frame written
+        self.encoder = None  # created on the first PCM frame
+        self.listeners = {}  # guild_id -> BroadcastListener
+        self.closed = False
+
+    def feed(self, source):
+        """Wrap the host's output so everything it plays is broadcast too"""
+        return BroadcastFeed(self, source)
+
+    def subscribe(self, guild_id):
+        listener = self.listeners[guild_id] = BroadcastListener(self, guild_id)
+        return listener
+
+    def unsubscribe(self, guild_id, listener):
+        if self.listeners.get(guild_id) is listener:
+            del self.listeners[guild_id]
+
+    def publish(self, frame, opus):
+        """Audio thread: encode a frame if needed and append it to the ring"""
+        if not opus:
+            if self.encoder is None:
+                self.encoder = discord.opus.Encoder()
+            frame = self.encoder.encode(frame, self.encoder.SAMPLES_PER_FRAME)
+        self.frames[self.head % self.capacity] = frame
+        self.head += 1
+        return frame
+
+    def close(self):
+        self.closed = True
+        self.listeners.clear()
+
+
+class BroadcastFeed(discord.AudioSource):
+    """The host's source: plays the wrapped output and publishes every frame"""
+    def __init__(self, broadcast, source):
+        self.broadcast = broadcast
+        self.source = source
+
+    def is_opus(self):
+        return True
+
+    def read(self):
+        frame = self.source.read()
+        if not frame:
+            return b''
+        return self.broadcast.publish(frame, self.source.is_opus())
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+class BroadcastListener(discord.AudioSource):
+    """A listener guild's source: reads the host's frames from the ring"""
+    def __init__(self, broadcast, guild_id):
+        self.broadcast = broadcast
+        self.guild_id = guild_id
+        self.cursor = broadcast.head
+        self.buffering = True
+
+    def is_opus(self):
+        return True
+
+    def read(self):
+        broadcast = self.broadcast
+        if broadcast.closed:
+            return b''
+        head = broadcast.head
+        # Fell a whole ring behind (paused, or a stalled audio thread): rejoin live.
+        # The slot at head is kept out of reach, the host may be writing it.
+        if head - self.cursor >= broadcast.capacity - 1:
+            self.cursor = head - broadcast.delay
+        if self.cursor >= head:
+            self.buffering = True
+        if self.buffering:
+            if head - self.cursor < broadcast.delay:
+                return OPUS_SILENCE
+            self.buffering = False
+        frame = broadcast.frames[self.cursor % broadcast.capacity]
+        self.cursor += 1
+        return frame
+
+    def cleanup(self):
+        # Called by the voice client once playback stops
+        self.broadcast.unsubscribe(self.guild_id, self)
@@ -0,0 +1,107 @@
+"""Idle voice disconnects for the Music cog.
+
+IdleManager keeps, per guild, the voice channel the bot is in and how many
+non-bot members are listening there. The count is set once when the bot
+joins a channel and then only adjusted by +1/-1 from voice state events, so
+an event costs a couple of dict lookups instead of a member scan. When the
+count reaches zero a disconnect timer starts; anyone rejoining within
+IDLE_GRACE_SECONDS cancels it and the queue survives. When the timer fires,
+the channel's members are counted again (a missed event can leave the
+running count wrong) and only if nobody is there does the release callback
+tear the guild's playback state down. resync() recounts every tracked
+channel, for after a gateway reconnect.
+"""
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+IDLE_GRACE_SECONDS = float(os.getenv('IDLE_GRACE_SECONDS', '60'))
+
+
+class IdleManager:
+    def __init__(self, release, get_channel, grace=IDLE_GRACE_SECONDS):
+        self.release = release  # async callable(guild_id)
+        self.get_channel = get_channel  # channel id -> channel, or None
+        self.grace = grace
+        self.channels = {}  # guild_id -> id of the bot's voice channel
+        self.listeners = {}  # guild_id -> non-bot members in that channel
+        self.timers = {}  # guild_id -> pending disconnect task
+
+    def joined(self, guild_id, channel):
+        """The bot connected to (or moved into) a voice channel"""
+        self.channels[guild_id] = channel.id
+        self.listeners[guild_id] = sum(1 for m in channel.members if not m.bot)
+        self.update(guild_id)
+
+    def recount(self, guild_id):
+        """Replace the running count with a scan of the channel's members"""
+        channel = self.get_channel(self.channels[guild_id])
+        self.listeners[guild_id] = sum(1 for m in channel.members if not m.bot) if channel else 0
+
+    def resync(self):
+        """Recount every tracked channel; voice events may have been missed while disconnected"""
+        for guild_id in list(self.channels):
+            self.recount(guild_id)
+            self.update(guild_id)
+
+    def left(self, guild_id):
+        """The bot left voice; stop tracking the guild"""
+        self.channels.pop(guild_id, None)
+        self.listeners.pop(guild_id, None)
+        self.cancel(guild_id)
+
+    def voice_state_update(self, member, before, after, bot_user):
+        before_id = before.channel.id if before.channel else None
+        after_id = after.channel.id if after.channel else None
+        if before_id == after_id:
+            return  # mute/deafen/stream changes
+        guild_id = member.guild.id
+
+        if member.id == bot_user.id:
+            if after.channel:
+                self.joined(guild_id, after.channel)
+            else:
+                self.left(guild_id)
+            return
+
+        tracked = self.channels.get(guild_id)
+        if tracked is None or member.bot:
+            return
+        if before_id == tracked:
+            self.listeners[guild_id] -= 1
+        elif after_id == tracked:
+            self.listeners[guild_id] += 1
+        else:
+            return
+        self.update(guild_id)
+
+    def update(self, guild_id):
+        if self.listeners.get(guild_id, 0) > 0:
+            self.cancel(guild_id)
+        elif guild_id not in self.timers:
+            self.timers[guild_id] = asyncio.create_task(self.expire(guild_id))
+
+    def cancel(self, guild_id):
+        timer = self.timers.pop(guild_id, None)
+        if timer:
+            timer.cancel()
+
+    async def expire(self, guild_id):
+        await asyncio.sleep(self.grace)
+        self.timers.pop(guild_id, None)
+        if guild_id not in self.channels:
+            return
+        self.recount(guild_id)
+        if self.listeners[guild_id] > 0:
+            return
+        try:
+            await self.release(guild_id)
+        except Exception as e:
+            logger.error(f"Error releasing idle guild {guild_id}: {e}")
+
+    def close(self):
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
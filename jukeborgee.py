@@ -1,27 +1,57 @@
+import time
+STARTUP_STARTED = time.perf_counter()
+
 import discord
 from discord.ext import commands
-import yt_dlp
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
 import asyncio
 import os
+import sys
 import random
 from urllib.parse import urlparse, parse_qs
 import re
-import requests
 import base64
 from dotenv import load_dotenv
 import logging
 from datetime import datetime, timedelta
-import time
 import tempfile
 import shutil
-import googleapiclient.discovery
-from googleapiclient.errors import HttpError
+import importlib.util
+import difflib
+import itertools
 from collections import defaultdict
 from ai_chat_bot import AIChatBot
+from audio_backend import create_audio_source, shutdown_audio_pool
+from outbox import get_outbox, reply_to
+from player import GaplessSource, PrerolledSource, CROSSFADE_SECONDS, PRELOAD_SECONDS
+from audio_filters import AudioSettings, FilteredSource, FILTERS, MAX_VOLUME
+from broadcast import Broadcast, BroadcastFeed
+from loudness import LoudnessIndex
+from idle import IdleManager
+from singleflight import SingleFlight
+from state_store import StateStore, GuildStateDict, TrackQueue, Track
+from track_cache import FailureCache, DOWNLOAD_FALLBACK, failure_key
+from search_index import SearchIndex, normalize_title
 import json
 
+def lazy_import(name):
+    """Import a module on first attribute access instead of at startup"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+# Heavy integrations, loaded the first time they are used
+yt_dlp = lazy_import('yt_dlp')
+spotipy = lazy_import('spotipy')
+requests = lazy_import('requests')
+googleapiclient_discovery = lazy_import('googleapiclient.discovery')
+googleapiclient_errors = lazy_import('googleapiclient.errors')
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,9 +59,22 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Load responses from JSON
-with open('responses.json', 'r', encoding='utf-8') as f:
-    RESPONSES = json.load(f)
+class LazyResponses:
+    """responses.json, read on first lookup"""
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+
+    def __getitem__(self, key):
+        if self._data is None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._data = json.load(f)
+        return self._data[key]
+
+RESPONSES = LazyResponses(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'responses.json'))
+
+# Startup phase timings, reported once the bot is ready
+STARTUP_TIMES = {}
 
 # Bot configuration
 BOT_TOKEN = os.getenv('BOT_TOKEN')
@@ -41,6 +84,57 @@ SPOTIFY_REFRESH_TOKEN = os.getenv('SPOTIFY_REFRESH_TOKEN')
 YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
 AI_MODEL_PATH = os.getenv('AI_MODEL_PATH', './models/llama-2-7b-chat.Q4_K_M.gguf')
 
+# Sharding (set per worker process by shard_supervisor.py)
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None
+SHARD_IDS = [int(s) for s in os.getenv('SHARD_IDS', '').split(',') if s.strip()] or None
+WORKER_ID = os.getenv('WORKER_ID')
+
+# Gateway: "lean" (minimal intents, voice-only member cache) or "full"
+GATEWAY_PROFILE = os.getenv('GATEWAY_PROFILE', 'lean')
+GATEWAY_MAX_MESSAGES = int(os.getenv('GATEWAY_MAX_MESSAGES', '100'))
+
+# Alternative search fan-out
+# 0 runs every query variant at once, one round trip
+ALTERNATIVE_SEARCH_CONCURRENCY = int(os.getenv('ALTERNATIVE_SEARCH_CONCURRENCY', '0'))
+ALTERNATIVE_SEARCH_RESULTS = 3
+ALTERNATIVE_PENALTY_WORDS = ['live', 'cover', 'remix', 'karaoke', 'nightcore', 'sped up', 'slowed', 'reaction']
+ALTERNATIVE_PENALTY_PATTERNS = [re.compile(rf'\b{re.escape(word)}\b') for word in ALTERNATIVE_PENALTY_WORDS]
+def parse_iso8601_duration(value):
+    """Seconds in an ISO-8601 duration like PT1H2M3S, or None"""
+    match = re.fullmatch(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?', value or '')
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = (int(g or 0) for g in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def owns_guild(guild_id):
+    """Whether this worker's shards serve a guild (always true when not sharded)"""
+    if not SHARD_COUNT or not SHARD_IDS:
+        return True
+    return (guild_id >> 22) % SHARD_COUNT in SHARD_IDS
+
+
+def format_duration(seconds):
+    """Format seconds as M:SS or H:MM:SS"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+# YouTube API setup
+_youtube_client = None
+
+def build_youtube_client():
+    """Build the YouTube v3 client once per process without fetching discovery over the network"""
+    global _youtube_client
+    if _youtube_client is None:
+        started = time.perf_counter()
+        _youtube_client = googleapiclient_discovery.build(
+            'youtube', 'v3', developerKey=YOUTUBE_API_KEY,
+            static_discovery=True, cache_discovery=False
+        )
+        logger.info(f"YouTube API client built in {time.perf_counter() - started:.2f}s")
+    return _youtube_client
+
 # Spotify setup
 def get_spotify_client():
     try:
@@ -86,28 +180,220 @@ ydl_opts = {
     'postprocessor_args': ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
 }
 
+STREAM_BEFORE_OPTIONS = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
+
+# !queue paging
+QUEUE_PAGE_SIZE = 10
+QUEUE_VIEW_TIMEOUT = 180
+
+class QueueView(discord.ui.View):
+    """Buttons that page through a guild's queue by editing one message"""
+    def __init__(self, music, guild_id, page=0):
+        super().__init__(timeout=QUEUE_VIEW_TIMEOUT)
+        self.music = music
+        self.guild_id = guild_id
+        self.page = page
+        self.message = None
+    
+    async def show(self, interaction, page):
+        if not self.music.queue.get(self.guild_id):
+            self.stop()
+            await interaction.response.edit_message(content=RESPONSES['music']['queue']['empty'], view=None)
+            return
+        self.page, content = self.music.queue_message(self.guild_id, page)
+        await interaction.response.edit_message(content=content, view=self)
+    
+    @discord.ui.button(label='⏮', style=discord.ButtonStyle.secondary)
+    async def first(self, interaction, button):
+        await self.show(interaction, 0)
+    
+    @discord.ui.button(label='◀', style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction, button):
+        await self.show(interaction, self.page - 1)
+    
+    @discord.ui.button(label='▶', style=discord.ButtonStyle.secondary)
+    async def next(self, interaction, button):
+        await self.show(interaction, self.page + 1)
+    
+    @discord.ui.button(label='⏭', style=discord.ButtonStyle.secondary)
+    async def last(self, interaction, button):
+        await self.show(interaction, len(self.music.queue.get(self.guild_id) or ()))
+    
+    async def on_timeout(self):
+        await self.close()
+    
+    async def close(self):
+        """Stop listening and remove the buttons from the message"""
+        self.stop()
+        if self.music.queue_views.get(self.guild_id) is self:
+            del self.music.queue_views[self.guild_id]
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
 class Music(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.queue = {}
+        # Per-guild state survives restarts; each guild is restored when first touched
+        self.state = StateStore()
+        self.queue = GuildStateDict(self.load_queue, self.save_queue, self.state.delete_queue)
         self.voice_clients = {}
-        self.error_logs = {}
+        self.error_logs = GuildStateDict(self.state.load_errors, self.save_errors,
+                                         lambda guild_id: self.state.save_errors(guild_id, []))
         self.error_threshold = 3
-        self.loop = {}
-        self.command_channels = {}  # Track where commands are issued from
+        self.loop = GuildStateDict(self.load_loop, self.save_loop,
+                                   lambda guild_id: self.state.save_settings(guild_id, loop=0))
+        self.command_channels = GuildStateDict(self.load_command_channel, self.save_command_channel,
+                                               lambda guild_id: self.state.save_settings(guild_id, channel_id=None))
+        self.sessions_resumed = False
+        self.failures = FailureCache(self.state)
+        self.substitutes = {}  # guild_id -> (alt key, original url, title, alt url, alt title) of the stand-in up next
+        self.search_index = SearchIndex(self.state)
+        self.queue_pages = {}  # guild_id -> (queue, version, {page: text})
+        self.queue_views = {}
+        self.players = {}  # guild_id -> GaplessSource currently handed to the voice client
+        self.audio_settings = {}
+        self.broadcasts = {}  # host guild_id -> Broadcast of its playback
+        self.loudness = LoudnessIndex(self.state)
+        self.idle = IdleManager(self.release_idle_guild, self.bot.get_channel)
+        # Guilds asking for the same video at the same time share one lookup or download
+        self.inflight = SingleFlight()
+        self.file_copies = itertools.count(1)
         self.temp_dir = os.path.join(os.getcwd(), 'temp_audio')
+        if WORKER_ID is not None:
+            # Each shard worker cleans up only its own downloads
+            self.temp_dir = os.path.join(self.temp_dir, f"worker-{WORKER_ID}")
         os.makedirs(self.temp_dir, exist_ok=True)
         
-        # Initialize YouTube API client
-        if YOUTUBE_API_KEY:
-            self.youtube_api_available = True
-            self.youtube = googleapiclient.discovery.build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
-        else:
-            self.youtube_api_available = False
+        # YouTube API client is built on first use
+        self.youtube = None
+        self.youtube_api_available = bool(YOUTUBE_API_KEY)
+        if not self.youtube_api_available:
             logger.warning("YouTube API key not found. Using fallback methods only.")
         
-        # Start temp cleanup task
-        self.cleanup_task = bot.loop.create_task(self.cleanup_temp_files())
+        # Temp cleanup task is started in cog_load
+        self.cleanup_task = None
+    
+    async def announce(self, channel, content):
+        """Queue a player status line; consecutive lines share one edited message"""
+        await get_outbox().status(channel, content)
+    
+    async def cog_load(self):
+        """Start background tasks once, when the cog is added to the bot"""
+        self.cleanup_task = asyncio.create_task(self.cleanup_temp_files())
+        self.state.start()
+        self.loudness.start()
+        self.loudness.scan(self.temp_dir)
+    
+    def load_queue(self, guild_id):
+        saved = self.state.load_queue(guild_id)
+        if saved:
+            tracks, head = saved
+            return TrackQueue(tracks, head, self.state.queue_journal(guild_id))
+        return None
+    
+    def save_queue(self, guild_id, tracks):
+        queue = TrackQueue(tracks, journal=self.state.queue_journal(guild_id))
+        self.state.journal(guild_id, 'rewrite', queue)
+        return queue
+    
+    def save_errors(self, guild_id, errors):
+        self.state.save_errors(guild_id, errors)
+        return errors
+    
+    def load_loop(self, guild_id):
+        return True if self.state.load_settings(guild_id).get('loop') else None
+    
+    def save_loop(self, guild_id, enabled):
+        self.state.save_settings(guild_id, loop=int(bool(enabled)))
+        return enabled
+    
+    def load_command_channel(self, guild_id):
+        channel_id = self.state.load_settings(guild_id).get('channel_id')
+        return self.bot.get_channel(channel_id) if channel_id else None
+    
+    def save_command_channel(self, guild_id, channel):
+        self.state.save_settings(guild_id, channel_id=channel.id)
+        return channel
+    
+    def forget_session(self, guild_id):
+        """Stop resuming this guild's voice session after a restart"""
+        self.state.save_settings(guild_id, voice_channel_id=None, current_url=None, current_title=None)
+        self.queue_pages.pop(guild_id, None)
+    
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        self.idle.voice_state_update(member, before, after, self.bot.user)
+    
+    async def release_idle_guild(self, guild_id):
+        """Leave voice and drop a guild's playback state once nobody has listened for the grace period"""
+        if guild_id in self.queue:
+            self.queue[guild_id].clear()
+        if guild_id in self.loop:
+            del self.loop[guild_id]
+        if guild_id in self.command_channels:
+            del self.command_channels[guild_id]
+        
+        player = self.players.pop(guild_id, None)
+        if player:
+            player.clear_next()
+            if player.preload_task:
+                player.preload_task.cancel()
+        if guild_id in self.queue_views:
+            await self.queue_views[guild_id].close()
+        self.audio_settings.pop(guild_id, None)
+        self.substitutes.pop(guild_id, None)
+        self.end_broadcast(guild_id)
+        
+        voice_client = self.voice_clients.pop(guild_id, None)
+        if voice_client:
+            await voice_client.disconnect(force=True)
+            logger.info(f"Auto-disconnected from {voice_client.channel.name} - nobody listening")
+        self.forget_session(guild_id)
+    
+    def queued_files(self):
+        """Temp files still referenced by a queue, including guilds not restored yet"""
+        files = self.state.queued_files()
+        for guild_id in list(dict.keys(self.queue)):
+            for url, _ in dict.__getitem__(self.queue, guild_id):
+                if url.startswith('file://'):
+                    files.add(url[7:])
+        return files
+    
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Rejoin voice and resume playback for guilds that were playing before a restart"""
+        if self.sessions_resumed:
+            # A later on_ready is a full gateway reconnect; voice events may have been lost
+            self.idle.resync()
+            return
+        self.sessions_resumed = True
+        
+        for guild_id, voice_channel_id, current in self.state.active_sessions():
+            # Workers share one state DB; other workers' sessions are theirs to resume
+            if not owns_guild(guild_id):
+                continue
+            try:
+                channel = self.bot.get_channel(voice_channel_id)
+                if (not channel or not self.command_channels.get(guild_id)
+                        or not any(not m.bot for m in channel.members)):
+                    self.state.save_settings(guild_id, voice_channel_id=None)
+                    continue
+                
+                if current and not self.loop.get(guild_id):
+                    if guild_id not in self.queue:
+                        self.queue[guild_id] = []
+                    self.queue[guild_id].insert(0, current)
+                if not self.queue.get(guild_id):
+                    continue
+                
+                self.voice_clients[guild_id] = await channel.connect()
+                logger.info(f"Resuming playback in {channel.name} after restart")
+                await self.play_next(guild_id)
+            except Exception as e:
+                logger.error(f"Error resuming session for guild {guild_id}: {e}")
     
     def is_drm_error(self, error_message):
         """Check if an error message indicates DRM protection"""
@@ -118,14 +404,25 @@ class Music(commands.Cog):
     
     def cog_unload(self):
         """Clean up when cog is unloaded"""
-        if hasattr(self, 'cleanup_task'):
+        if self.cleanup_task:
             self.cleanup_task.cancel()
+            self.cleanup_task = None
+        shutdown_audio_pool()
+        self.idle.close()
+        self.loudness.stop()
+        
+        # Keep downloads that a saved queue will play after the restart
+        try:
+            keep = self.queued_files()
+        except Exception:
+            keep = set()
+        self.state.close()
         
         try:
             if os.path.exists(self.temp_dir):
                 for file_name in os.listdir(self.temp_dir):
                     file_path = os.path.join(self.temp_dir, file_name)
-                    if os.path.isfile(file_path):
+                    if os.path.isfile(file_path) and file_path not in keep:
                         try:
                             os.remove(file_path)
                         except:
@@ -142,11 +439,7 @@ class Music(commands.Cog):
                     temp_files = {os.path.join(self.temp_dir, f) for f in os.listdir(self.temp_dir) 
                                  if os.path.isfile(os.path.join(self.temp_dir, f))}
                     
-                    files_in_queue = set()
-                    for guild_id in self.queue:
-                        for url, _ in self.queue[guild_id]:
-                            if url.startswith('file://'):
-                                files_in_queue.add(url[7:])
+                    files_in_queue = self.queued_files()
                     
                     files_to_delete = temp_files - files_in_queue
                     
@@ -158,6 +451,7 @@ class Music(commands.Cog):
                                 files_to_delete.add(file_path)
                     
                     for file_path in files_to_delete:
+                        self.loudness.discard(file_path)
                         try:
                             if os.path.exists(file_path):
                                 os.remove(file_path)
@@ -174,17 +468,38 @@ class Music(commands.Cog):
                 logger.error(f"Error in temp file cleanup: {e}")
                 await asyncio.sleep(3600)
     
-    async def find_alternative_version(self, original_title, channel):
-        """Try multiple search queries to find a non-DRM version"""
-        video_id = None
+    def score_alternative(self, entry, original_title, original_duration=None):
+        """Rank a search result by title similarity and duration match"""
+        title = normalize_title(entry.get('title') or '')
+        original = normalize_title(original_title)
+        score = difflib.SequenceMatcher(None, original, title).ratio()
+        
+        duration = entry.get('duration')
+        if original_duration and duration:
+            # Full bonus for an exact match, none once 25% off
+            drift = abs(duration - original_duration) / original_duration
+            score += 0.5 * max(0.0, 1.0 - drift * 4)
+        
+        # Match on the raw titles so every bracketed tag counts, not only the ones normalize_title keeps
+        raw_title = (entry.get('title') or '').lower()
+        raw_original = original_title.lower()
+        for pattern in ALTERNATIVE_PENALTY_PATTERNS:
+            if pattern.search(raw_title) and not pattern.search(raw_original):
+                score -= 0.3
+        return score
+    
+    async def find_alternative_version(self, original_url, original_title, channel, original_duration=None):
+        """Search several query variants at once for a non-DRM version and pick the best match"""
+        # The blocked original matches its own title best, so it is never a candidate
+        video_id = self.extract_video_id(original_url)
         if "youtube.com" in original_title or "youtu.be" in original_title:
-            video_id = self.extract_video_id(original_title)
             if video_id and self.youtube_api_available:
                 try:
                     video_info = await self.get_youtube_info(video_id)
                     if video_info:
                         original_title = video_info['title']
-                        await channel.send(RESPONSES['music']['drm']['searching_alt'].format(title=original_title))
+                        original_duration = original_duration or parse_iso8601_duration(video_info['duration'])
+                        await self.announce(channel, RESPONSES['music']['drm']['searching_alt'].format(title=original_title))
                 except Exception:
                     original_title = video_id
         
@@ -197,33 +512,52 @@ class Music(commands.Cog):
             f"{original_title} full song"
         ]
         
-        for variant in search_variants:
-            search_query = f"ytsearch:{variant}"
-            try:
-                with yt_dlp.YoutubeDL({'quiet': True, 'format': 'bestaudio'}) as ytdl:
-                    data = await asyncio.get_event_loop().run_in_executor(
-                        None, lambda: ytdl.extract_info(search_query, download=False, process=False)
-                    )
-                    
-                    if data and 'entries' in data and data['entries']:
-                        entry = data['entries'][0]
-                        url = f"https://www.youtube.com/watch?v={entry['id']}"
-                        title = entry.get('title', original_title)
-                        
-                        await channel.send(RESPONSES['music']['status']['found_alternative'].format(title=title))
-                        return url, title
-            except Exception as e:
-                continue
+        loop = asyncio.get_event_loop()
+        semaphore = asyncio.Semaphore(ALTERNATIVE_SEARCH_CONCURRENCY or len(search_variants))
+        
+        async def search(variant):
+            search_query = f"ytsearch{ALTERNATIVE_SEARCH_RESULTS}:{variant}"
+            async with semaphore:
+                try:
+                    with yt_dlp.YoutubeDL({'quiet': True, 'format': 'bestaudio'}) as ytdl:
+                        # Entries are lazy with process=False, so page them in the executor too
+                        return await loop.run_in_executor(
+                            None, lambda: list((ytdl.extract_info(search_query, download=False, process=False) or {}).get('entries') or [])
+                        )
+                except Exception as e:
+                    logger.error(f"Error searching alternative '{variant}': {e}")
+                    return []
+        
+        candidates = {}
+        for entries in await asyncio.gather(*(search(variant) for variant in search_variants)):
+            for entry in entries:
+                if entry and entry.get('id') and entry['id'] != video_id:
+                    candidates.setdefault(entry['id'], entry)
+        
+        if not candidates:
+            return None, None
         
-        return None, None
+        best = max(candidates.values(), key=lambda e: self.score_alternative(e, original_title, original_duration))
+        url = f"https://www.youtube.com/watch?v={best['id']}"
+        title = best.get('title', original_title)
+        
+        await self.announce(channel, RESPONSES['music']['status']['found_alternative'].format(title=title))
+        return url, title
     
+    async def get_youtube_client(self):
+        """Build the YouTube API client from the bundled offline discovery document"""
+        if self.youtube is None:
+            self.youtube = await asyncio.get_event_loop().run_in_executor(None, build_youtube_client)
+        return self.youtube
+
     async def get_youtube_info(self, video_id):
         """Get video information using YouTube API"""
         if not self.youtube_api_available:
             return None
             
         try:
-            request = self.youtube.videos().list(
+            youtube = await self.get_youtube_client()
+            request = youtube.videos().list(
                 part="snippet,contentDetails",
                 id=video_id
             )
@@ -236,6 +570,7 @@ class Music(commands.Cog):
             title = video_data['snippet']['title']
             channel = video_data['snippet']['channelTitle']
             duration = video_data['contentDetails']['duration']
+            self.search_index.record(video_id, title, channel)
             
             return {
                 'id': video_id,
@@ -243,7 +578,7 @@ class Music(commands.Cog):
                 'channel': channel,
                 'duration': duration
             }
-        except HttpError as e:
+        except googleapiclient_errors.HttpError as e:
             logger.error(f"YouTube API error: {e}")
             return None
         except Exception as e:
@@ -262,7 +597,27 @@ class Music(commands.Cog):
         return None
     
     async def download_to_temp_file(self, url, title):
-        """Download YouTube audio to a temporary file"""
+        """Download YouTube audio to a temporary file of this caller's own"""
+        file_path, shared = await self.inflight.do(('download', failure_key(url)),
+                                                   lambda: self.download_audio(url, title))
+        if not shared or not file_path:
+            return file_path
+        # Played files are deleted when their track ends, so each guild gets its own link
+        root, ext = os.path.splitext(file_path)
+        copy_path = f"{root}_{next(self.file_copies)}{ext}"
+        try:
+            try:
+                os.link(file_path, copy_path)
+            except OSError:
+                shutil.copyfile(file_path, copy_path)
+        except OSError as e:
+            logger.error(f"Error sharing downloaded file {file_path}: {e}")
+            return None
+        self.loudness.share(copy_path, file_path)
+        return copy_path
+    
+    async def download_audio(self, url, title):
+        """Download audio with yt-dlp's fallbacks; None if every format fails"""
         safe_title = "".join([c for c in title if c.isalpha() or c.isdigit() or c==' ']).rstrip()
         safe_title = safe_title.replace(' ', '_')[:50]
         
@@ -341,6 +696,7 @@ class Music(commands.Cog):
                                         )
                                     
                                     if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+                                        self.loudness.submit(file_path, alt_url)
                                         return file_path
                                 except Exception as e:
                                     error_message = str(e)
@@ -385,6 +741,7 @@ class Music(commands.Cog):
                     continue
             
             if success:
+                self.loudness.submit(file_path, url)
                 return file_path
             else:
                 logger.error(f"Failed to download audio: {error_message}")
@@ -422,7 +779,7 @@ class Music(commands.Cog):
         error_report += "```"
         
         if len(error_list) > 0:
-            await channel.send(error_report)
+            await self.announce(channel, error_report)
         
         self.error_logs[guild_id] = []
 
@@ -432,26 +789,24 @@ class Music(commands.Cog):
             self.error_logs[guild_id] = []
             
         self.error_logs[guild_id].append((track_title, error_type))
+        self.state.save_errors(guild_id, self.error_logs[guild_id])
         
         return len(self.error_logs[guild_id]) >= self.error_threshold
         
     async def fetch_youtube_playlist(self, url, ctx):
         """Fetches and processes a YouTube playlist"""
         try:
-            await ctx.send(RESPONSES['music']['status']['processing_youtube'].format(type='playlist'))
+            await reply_to(ctx, RESPONSES['music']['status']['processing_youtube'].format(type='playlist'))
             
-            with yt_dlp.YoutubeDL({
+            playlist_dict = await self.extract_info('playlist', url, {
                 'extract_flat': True,
                 'force_generic_extractor': False,
                 'ignoreerrors': True,
                 'playlistend': 50
-            }) as ytdl:
-                playlist_dict = await asyncio.get_event_loop().run_in_executor(
-                    None, lambda: ytdl.extract_info(url, download=False)
-                )
-                
+            })
+            
             if not playlist_dict:
-                await ctx.send(RESPONSES['music']['errors']['youtube_error'])
+                await reply_to(ctx, RESPONSES['music']['errors']['youtube_error'])
                 return []
                 
             tracks = []
@@ -464,12 +819,13 @@ class Music(commands.Cog):
                             
                         video_title = entry.get('title', 'Unknown Title')
                         if video_url:
-                            tracks.append((video_url, video_title))
+                            tracks.append(Track(video_url, video_title, entry.get('duration')))
+                            self.search_index.record(entry.get('id'), entry.get('title'), entry.get('channel') or entry.get('uploader'))
             
             return tracks
         except Exception as e:
             logger.error(f"Error fetching YouTube playlist: {e}")
-            await ctx.send(RESPONSES['music']['errors']['youtube_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['youtube_error'])
             return []
         
     def handle_playback_complete(self, error, guild_id, file_path=None):
@@ -483,12 +839,292 @@ class Music(commands.Cog):
                 logger.info(f"Cleaned up temp file: {file_path}")
             except Exception as e:
                 logger.error(f"Error cleaning up temp file: {e}")
+        if file_path:
+            self.bot.loop.call_soon_threadsafe(self.loudness.discard, file_path)
         
         asyncio.run_coroutine_threadsafe(
             self.play_next(guild_id),
             self.bot.loop
         )
         
+    async def extract_info(self, kind, url, ydl_opts):
+        """yt-dlp info for url, shared with concurrent lookups of the same kind and video"""
+        def extract():
+            with yt_dlp.YoutubeDL(ydl_opts) as ytdl:
+                return ytdl.extract_info(url, download=False)
+        data, _ = await self.inflight.do((kind, failure_key(url)),
+                                         lambda: asyncio.get_event_loop().run_in_executor(None, extract))
+        return data
+    
+    async def extract_stream_info(self, url):
+        return await self.extract_info('stream', url, self.stream_ydl_opts(url.startswith('ytsearch:')))
+    
+    def stream_ydl_opts(self, is_search):
+        """yt-dlp options for resolving a track to a playable stream"""
+        return {
+            'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
+            'quiet': False,
+            'no_warnings': False,
+            'ignoreerrors': True,
+            'default_search': 'ytsearch' if is_search else None,
+            'noplaylist': True,
+            'skip_download': False,
+            'continue_dl': True,
+            'ignore_no_formats_error': True,
+            'ignore_config': True,
+            'geo_bypass': True,
+            'extractor_args': {'youtube': {'player_client': ['android', 'web']}}
+        }
+    
+    def is_hls_stream(self, data):
+        """HLS/SABR streams 403 when played directly and have to be downloaded"""
+        return ('manifest.googlevideo.com' in str(data.get('url', '')) or
+                any('hls' in str(f.get('protocol', '')) for f in data.get('formats', [])))
+    
+    def select_stream_url(self, data):
+        """Pick a direct audio URL from yt-dlp info, preferring non-HLS formats"""
+        if 'url' in data:
+            return data['url']
+        
+        if 'formats' in data and data['formats']:
+            # Prioritize non-HLS formats to avoid SABR issues
+            audio_formats = [f for f in data['formats'] 
+                            if f.get('acodec') != 'none' and f.get('url') and 'hls' not in f.get('protocol', '')]
+            
+            if not audio_formats:
+                # Fallback to any audio format if no non-HLS found
+                audio_formats = [f for f in data['formats'] 
+                                if f.get('acodec') != 'none' and f.get('url')]
+            
+            if audio_formats:
+                if all('abr' in f for f in audio_formats):
+                    audio_formats.sort(key=lambda f: f.get('abr', 0), reverse=True)
+                
+                return audio_formats[0]['url']
+        return None
+    
+    def start_playback(self, guild_id, source, track, channel):
+        """Play source as the head of a gapless chain and schedule opening the next track"""
+        player = GaplessSource(source, track)
+        player.on_lost = lambda offset: asyncio.run_coroutine_threadsafe(
+            self.recover_stream(guild_id, player, offset), self.bot.loop
+        )
+        self.players[guild_id] = player
+        # Volume and filters run on PCM; Opus from the worker pool plays as is
+        output = player if player.is_opus() else FilteredSource(
+            player, self.get_audio_settings(guild_id), track_gain=lambda: player.track.get('gain', 1.0)
+        )
+        broadcast = self.broadcasts.get(guild_id)
+        if broadcast:
+            output = broadcast.feed(output)
+        self.voice_clients[guild_id].play(output, after=lambda e: self.handle_track_end(e, guild_id, player, channel))
+        self.schedule_preload(guild_id, player, channel)
+    
+    def listening_to(self, guild_id):
+        """The broadcast a guild is tuned in to, if any"""
+        for broadcast in self.broadcasts.values():
+            if guild_id in broadcast.listeners:
+                return broadcast
+        return None
+    
+    def swap_source(self, voice_client, source):
+        """Replace what a voice client is playing; discord.py resumes on a swap, so keep a pause"""
+        paused = voice_client.is_paused()
+        voice_client.source = source
+        if paused:
+            voice_client.pause()
+    
+    def end_broadcast(self, guild_id):
+        """Stop broadcasting a guild's playback; its listeners stop too"""
+        broadcast = self.broadcasts.pop(guild_id, None)
+        if not broadcast:
+            return
+        broadcast.close()
+        voice_client = self.voice_clients.get(guild_id)
+        source = voice_client.source if voice_client else None
+        if isinstance(source, BroadcastFeed):
+            self.swap_source(voice_client, source.source)
+    
+    async def resolve_stream_url(self, url):
+        """Fresh direct audio URL for a track, or None if it only plays as a download"""
+        data = await self.extract_stream_info(url)
+        if data and data.get('entries'):
+            data = data['entries'][0]
+        if not data or self.is_hls_stream(data):
+            return None
+        return self.select_stream_url(data)
+    
+    async def open_at(self, track, offset, fresh=False):
+        """Pre-rolled source for a playing track starting at offset seconds, or None"""
+        seek = f"-ss {offset:.2f}"
+        if track['file_path']:
+            return await self.preroll_source(track['file_path'], seek)
+        if not fresh and track.get('stream_url'):
+            source = await self.preroll_source(track['stream_url'], f"{seek} {STREAM_BEFORE_OPTIONS}")
+            if source:
+                return source
+        # An expired or 403'd URL: one extractor round trip for a fresh one
+        track['stream_url'] = await self.resolve_stream_url(track['url'])
+        if not track['stream_url']:
+            return None
+        return await self.preroll_source(track['stream_url'], f"{seek} {STREAM_BEFORE_OPTIONS}")
+    
+    async def preroll_source(self, path, before_options):
+        """Open a source and decode its first frames; None if nothing came out"""
+        source = PrerolledSource(create_audio_source(path, before_options=before_options))
+        await asyncio.get_event_loop().run_in_executor(None, source.preroll)
+        if source.buffered:
+            return source
+        source.cleanup()
+        return None
+    
+    async def recover_stream(self, guild_id, player, offset):
+        """Reopen a stream that dropped mid-track and continue from where it stopped"""
+        track = player.track
+        started = time.perf_counter()
+        try:
+            source = await self.open_at(track, offset, fresh=True)
+        except Exception as e:
+            logger.error(f"Error reopening {track['title']}: {e}")
+            source = None
+        if source is None or self.players.get(guild_id) is not player or player.track is not track:
+            if source:
+                source.cleanup()
+            player.abandon_recovery()
+            return
+        player.replace(source)
+        logger.info(f"Resumed {track['title']} at {format_duration(offset)} after the stream dropped "
+                    f"({time.perf_counter() - started:.1f}s)")
+    
+    def get_audio_settings(self, guild_id):
+        """Live volume/filter settings for a guild, restored from the store on first use"""
+        if guild_id not in self.audio_settings:
+            saved = self.state.load_settings(guild_id)
+            volume = saved.get('volume')
+            filters = [f for f in (saved.get('audio_filters') or '').split(',') if f in FILTERS]
+            self.audio_settings[guild_id] = AudioSettings(1.0 if volume is None else volume, filters)
+        return self.audio_settings[guild_id]
+    
+    def save_audio_settings(self, guild_id):
+        settings = self.get_audio_settings(guild_id)
+        self.state.save_settings(guild_id, volume=settings.volume, audio_filters=",".join(sorted(settings.filters)))
+    
+    def schedule_preload(self, guild_id, player, channel):
+        # Open the next track shortly before this one ends, or right away if its length is unknown
+        duration = player.track.get('duration')
+        delay = max(0.0, duration - PRELOAD_SECONDS - CROSSFADE_SECONDS) if duration else 0.0
+        player.preload_task = asyncio.create_task(self.preload_next(guild_id, player, channel, delay))
+    
+    def queue_head(self, guild_id):
+        queue = self.queue.get(guild_id)
+        return queue[0] if queue else None
+    
+    async def preload_next(self, guild_id, player, channel, delay):
+        """Resolve the next queued track and attach its pre-rolled source to the player"""
+        try:
+            await asyncio.sleep(delay)
+            entry = self.queue_head(guild_id)
+            if self.players.get(guild_id) is not player or entry is None:
+                return
+            
+            url, title = entry
+            loop = asyncio.get_event_loop()
+            if url.startswith('file://'):
+                file_path = url[7:]
+                if not os.path.exists(file_path):
+                    return
+                source = create_audio_source(file_path)
+                track = {
+                    'url': url, 'title': title, 'file_path': file_path, 'duration': entry.duration,
+                    'gain': self.loudness.gain(url, file_path),
+                }
+            else:
+                # Known failures and HLS streams go through play_next's fallbacks instead
+                if self.failures.get(url):
+                    return
+                data = await self.extract_stream_info(url)
+                if data and data.get('entries'):
+                    data = data['entries'][0]
+                if not data or self.is_hls_stream(data):
+                    return
+                stream_url = self.select_stream_url(data)
+                if not stream_url:
+                    return
+                source = create_audio_source(stream_url, before_options=STREAM_BEFORE_OPTIONS)
+                track = {
+                    'url': url, 'title': data.get('title', title), 'file_path': None, 'stream_url': stream_url,
+                    'duration': data.get('duration') or entry.duration,
+                    'gain': self.loudness.gain(data.get('webpage_url', url)),
+                }
+            
+            source = PrerolledSource(source)
+            await loop.run_in_executor(None, source.preroll)
+            if self.players.get(guild_id) is not player:
+                source.cleanup()
+                return
+            player.set_next(
+                source, track,
+                accept=lambda: self.queue_head(guild_id) is entry,
+                on_start=lambda previous: asyncio.run_coroutine_threadsafe(
+                    self.advance_gapless(guild_id, player, entry, previous, channel), self.bot.loop
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error preloading next track: {e}")
+    
+    async def advance_gapless(self, guild_id, player, entry, previous, channel):
+        """Queue bookkeeping after the player moved on to the preloaded track by itself"""
+        try:
+            queue = self.queue.get(guild_id)
+            if queue and queue[0] is entry:
+                queue.pop(0)
+                if guild_id in self.loop and self.loop[guild_id]:
+                    queue.append(entry)
+            
+            if not previous['file_path']:
+                self.confirm_substitute(guild_id, previous)
+            track = player.track
+            self.state.save_settings(guild_id, current_url=track['url'], current_title=track['title'])
+            if previous['file_path']:
+                self.loudness.discard(previous['file_path'])
+                if os.path.exists(previous['file_path']):
+                    os.remove(previous['file_path'])
+                    logger.info(f"Cleaned up temp file: {previous['file_path']}")
+            
+            await self.announce(channel, RESPONSES['music']['status']['now_playing'].format(title=track['title']))
+            self.schedule_preload(guild_id, player, channel)
+        except Exception as e:
+            logger.error(f"Error advancing to preloaded track: {e}")
+    
+    def try_substitute(self, guild_id, url, title, alt_url, alt_title):
+        """Remember a substitute for a DRM-blocked track; it is cached only once it has played"""
+        if failure_key(alt_url) == failure_key(url):
+            return
+        self.substitutes[guild_id] = (failure_key(alt_url), url, title, alt_url, alt_title)
+    
+    def confirm_substitute(self, guild_id, track):
+        """A stream played through; if it stood in for a blocked track, cache it as that track's substitute"""
+        pending = self.substitutes.get(guild_id)
+        if pending and pending[0] == failure_key(track['url']):
+            del self.substitutes[guild_id]
+            _, url, title, alt_url, alt_title = pending
+            self.failures.record(url, "drm", title, alt_url, alt_title)
+    
+    def handle_track_end(self, error, guild_id, player, channel):
+        """After callback for a gapless chain: hand off to the per-track handlers"""
+        if self.players.get(guild_id) is player:
+            del self.players[guild_id]
+        if player.preload_task:
+            self.bot.loop.call_soon_threadsafe(player.preload_task.cancel)
+        
+        track = player.track
+        if track['file_path']:
+            self.handle_playback_complete(error, guild_id, track['file_path'])
+        else:
+            if not error:
+                self.bot.loop.call_soon_threadsafe(self.confirm_substitute, guild_id, track)
+            self.handle_playback_error(error, guild_id, track['url'], track['title'], channel, track.get('duration'))
+    
     async def play_next(self, guild_id):
         try:
             # Get the command channel for this guild
@@ -497,61 +1133,72 @@ class Music(commands.Cog):
                 return
                 
             if guild_id in self.queue and self.queue[guild_id]:
-                url, title = self.queue[guild_id].pop(0)
+                track = self.queue[guild_id].pop(0)
+                url, title = track
+                self.state.save_settings(guild_id, current_url=url, current_title=title)
+                pending = self.substitutes.get(guild_id)
+                if pending and pending[0] != failure_key(url):
+                    # The stand-in failed before it could play through
+                    del self.substitutes[guild_id]
                 
                 if guild_id in self.loop and self.loop[guild_id]:
-                    self.queue[guild_id].append((url, title))
+                    self.queue[guild_id].append(track)
                 
-                voice_client = self.voice_clients[guild_id]
+                # Known-bad tracks skip the resolve/download ladder entirely
+                failure = None if url.startswith('file://') else self.failures.get(url)
+                if failure:
+                    if failure['alt_url'] == DOWNLOAD_FALLBACK:
+                        temp_file = await self.download_to_temp_file(url, title)
+                        if temp_file:
+                            self.queue[guild_id].insert(0, Track(f"file://{temp_file}", title, track.duration))
+                            await self.play_next(guild_id)
+                            return
+                        # The download route stopped working, run the full ladder again
+                        self.failures.forget(url)
+                    elif failure['alt_url']:
+                        if failure_key(failure['alt_url']) == failure_key(url):
+                            # Mapped to itself by an older version; find a real substitute
+                            self.failures.forget(url)
+                        else:
+                            logger.info(f"Using cached substitute for {title}: {failure['alt_url']}")
+                            url, title = failure['alt_url'], failure['alt_title'] or title
+                    else:
+                        logger.info(f"Skipping known {failure['failure']} track: {title}")
+                        self.add_error_log(guild_id, title, failure['failure'])
+                        if len(self.error_logs.get(guild_id, [])) >= self.error_threshold:
+                            await self.post_error_report(guild_id, channel)
+                        await self.play_next(guild_id)
+                        return
                 
                 if url.startswith('file://'):
                     file_path = url[7:]
                     
                     if os.path.exists(file_path):
                         try:
-                            source = discord.FFmpegPCMAudio(file_path)
-                            voice_client.play(
-                                source, 
-                                after=lambda e: self.handle_playback_complete(e, guild_id, file_path)
-                            )
-                            await channel.send(RESPONSES['music']['status']['now_playing'].format(title=title))
+                            source = create_audio_source(file_path)
+                            self.start_playback(guild_id, source, {
+                                'url': url, 'title': title, 'file_path': file_path, 'duration': track.duration,
+                                'gain': self.loudness.gain(url, file_path),
+                            }, channel)
+                            await self.announce(channel, RESPONSES['music']['status']['now_playing'].format(title=title))
                         except Exception as e:
                             logger.error(f"Error playing local file: {e}")
-                            await channel.send(RESPONSES['music']['errors']['error_playing'].format(title=title))
+                            await self.announce(channel, RESPONSES['music']['errors']['error_playing'].format(title=title))
                             await self.play_next(guild_id)
                         return
                     else:
                         logger.error(f"Local file not found: {file_path}")
-                        await channel.send(RESPONSES['music']['errors']['file_not_found'].format(title=title))
+                        await self.announce(channel, RESPONSES['music']['errors']['file_not_found'].format(title=title))
                         await self.play_next(guild_id)
                         return
                 
                 is_search = url.startswith('ytsearch:')
                 
                 try:
-                    loop = asyncio.get_event_loop()
-                    
-                    ydl_opts = {
-                        'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
-                        'quiet': False,
-                        'no_warnings': False,
-                        'ignoreerrors': True,
-                        'default_search': 'ytsearch' if is_search else None,
-                        'noplaylist': True,
-                        'skip_download': False,
-                        'continue_dl': True,
-                        'ignore_no_formats_error': True,
-                        'ignore_config': True,
-                        'geo_bypass': True,
-                        'extractor_args': {'youtube': {'player_client': ['android', 'web']}}
-                    }
-                    
                     try:
-                        with yt_dlp.YoutubeDL(ydl_opts) as ytdl:
-                            if is_search:
-                                logger.info(f"Searching for: {url}")
-                                
-                            data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=False))
+                        if is_search:
+                            logger.info(f"Searching for: {url}")
+                        data = await self.extract_stream_info(url)
                         
                         if not data:
                             video_id = self.extract_video_id(url)
@@ -560,13 +1207,15 @@ class Music(commands.Cog):
                                 video_info = await self.get_youtube_info(video_id)
                                 if video_info:
                                     logger.info(f"Using YouTube API fallback for: {title}")
-                                    await channel.send(RESPONSES['music']['drm']['no_stream'])
+                                    await self.announce(channel, RESPONSES['music']['drm']['no_stream'])
                                     temp_file = await self.download_to_temp_file(url, video_info['title'])
                                     if temp_file:
-                                        self.queue[guild_id].insert(0, (f"file://{temp_file}", video_info['title']))
+                                        self.failures.record(url, "not_found", title, DOWNLOAD_FALLBACK)
+                                        self.queue[guild_id].insert(0, Track(f"file://{temp_file}", video_info['title'], track.duration))
                                         await self.play_next(guild_id)
                                         return
                                 
+                            self.failures.record(url, "not_found", title, confirmed=False)
                             self.add_error_log(guild_id, title, "not_found")
                             logger.error(f"Error finding: {title}")
                             
@@ -582,24 +1231,27 @@ class Music(commands.Cog):
                             video_id = self.extract_video_id(url)
                             if video_id and self.youtube_api_available:
                                 logger.info(f"DRM detected, trying YouTube API: {title}")
-                                await channel.send(RESPONSES['music']['drm']['detected'])
+                                await self.announce(channel, RESPONSES['music']['drm']['detected'])
                                 
                                 video_info = await self.get_youtube_info(video_id)
                                 if video_info:
                                     temp_file = await self.download_to_temp_file(url, video_info['title'])
                                     if temp_file:
-                                        self.queue[guild_id].insert(0, (f"file://{temp_file}", video_info['title']))
+                                        self.failures.record(url, "drm", title, DOWNLOAD_FALLBACK)
+                                        self.queue[guild_id].insert(0, Track(f"file://{temp_file}", video_info['title'], track.duration))
                                         await self.play_next(guild_id)
                                         return
                             
-                            await channel.send(RESPONSES['music']['drm']['api_failed'])
-                            alt_url, alt_title = await self.find_alternative_version(title, channel)
+                            await self.announce(channel, RESPONSES['music']['drm']['api_failed'])
+                            alt_url, alt_title = await self.find_alternative_version(url, title, channel, track.duration)
                             if alt_url:
-                                self.queue[guild_id].insert(0, (alt_url, alt_title or title))
+                                self.try_substitute(guild_id, url, title, alt_url, alt_title)
+                                self.queue[guild_id].insert(0, Track(alt_url, alt_title or title, track.duration))
                             else:
                                 search_query = f"ytsearch:{title} lyrics"
-                                await channel.send(RESPONSES['music']['drm']['trying_generic'])
-                                self.queue[guild_id].insert(0, (search_query, title))
+                                await self.announce(channel, RESPONSES['music']['drm']['trying_generic'])
+                                self.try_substitute(guild_id, url, title, search_query, title)
+                                self.queue[guild_id].insert(0, Track(search_query, title, track.duration))
                             
                             await self.play_next(guild_id)
                             return
@@ -610,35 +1262,15 @@ class Music(commands.Cog):
                         data = data['entries'][0]
                     
                     # Check for HLS/SABR streaming that causes 403 errors
-                    if ('manifest.googlevideo.com' in str(data.get('url', '')) or 
-                        any('hls' in str(f.get('protocol', '')) for f in data.get('formats', []))):
+                    if self.is_hls_stream(data):
                         logger.info(f"HLS/SABR detected, downloading to temp file: {title}")
                         temp_file = await self.download_to_temp_file(url, title)
                         if temp_file:
-                            self.queue[guild_id].insert(0, (f"file://{temp_file}", title))
+                            self.queue[guild_id].insert(0, Track(f"file://{temp_file}", title, track.duration))
                             await self.play_next(guild_id)
                             return
                     
-                    stream_url = None
-                    
-                    if 'url' in data:
-                        stream_url = data['url']
-                    
-                    elif 'formats' in data and data['formats']:
-                        # Prioritize non-HLS formats to avoid SABR issues
-                        audio_formats = [f for f in data['formats'] 
-                                        if f.get('acodec') != 'none' and f.get('url') and 'hls' not in f.get('protocol', '')]
-                        
-                        if not audio_formats:
-                            # Fallback to any audio format if no non-HLS found
-                            audio_formats = [f for f in data['formats'] 
-                                            if f.get('acodec') != 'none' and f.get('url')]
-                        
-                        if audio_formats:
-                            if all('abr' in f for f in audio_formats):
-                                audio_formats.sort(key=lambda f: f.get('abr', 0), reverse=True)
-                            
-                            stream_url = audio_formats[0]['url']
+                    stream_url = self.select_stream_url(data)
                     
                     if not stream_url:
                         video_id = self.extract_video_id(url)
@@ -646,13 +1278,15 @@ class Music(commands.Cog):
                             video_info = await self.get_youtube_info(video_id)
                             if video_info:
                                 logger.info(f"No stream URL, using YouTube API for: {title}")
-                                await channel.send(RESPONSES['music']['drm']['no_stream'])
+                                await self.announce(channel, RESPONSES['music']['drm']['no_stream'])
                                 temp_file = await self.download_to_temp_file(url, video_info['title'])
                                 if temp_file:
-                                    self.queue[guild_id].insert(0, (f"file://{temp_file}", video_info['title']))
+                                    self.failures.record(url, "no_stream", title, DOWNLOAD_FALLBACK)
+                                    self.queue[guild_id].insert(0, Track(f"file://{temp_file}", video_info['title'], track.duration))
                                     await self.play_next(guild_id)
                                     return
                         
+                        self.failures.record(url, "no_stream", title, confirmed=False)
                         self.add_error_log(guild_id, title, "no_stream")
                         logger.error(f"No valid audio stream found for: {title}")
                         
@@ -664,14 +1298,20 @@ class Music(commands.Cog):
                     
                     if 'title' in data:
                         title = data['title']
+                    self.search_index.record(
+                        self.extract_video_id(data.get('webpage_url', '')), data.get('title'),
+                        data.get('channel') or data.get('uploader'),
+                        query=url.partition(':')[2] if is_search else None, played=True
+                    )
                     
                     try:
-                        source = discord.FFmpegPCMAudio(
-                            stream_url, 
-                            before_options="-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
-                        )
-                        voice_client.play(source, after=lambda e: self.handle_playback_error(e, guild_id, url, title, channel))
-                        await channel.send(RESPONSES['music']['status']['now_playing'].format(title=title))
+                        source = create_audio_source(stream_url, before_options=STREAM_BEFORE_OPTIONS)
+                        self.start_playback(guild_id, source, {
+                            'url': url, 'title': title, 'file_path': None, 'stream_url': stream_url,
+                            'duration': data.get('duration') or track.duration,
+                            'gain': self.loudness.gain(data.get('webpage_url', url)),
+                        }, channel)
+                        await self.announce(channel, RESPONSES['music']['status']['now_playing'].format(title=title))
                         
                         if guild_id in self.error_logs and self.error_logs[guild_id]:
                             await self.post_error_report(guild_id, channel)
@@ -684,26 +1324,29 @@ class Music(commands.Cog):
                             video_id = self.extract_video_id(url)
                             if video_id and self.youtube_api_available:
                                 logger.info(f"DRM error during playback, trying API: {title}")
-                                await channel.send(RESPONSES['music']['drm']['error_playback'])
+                                await self.announce(channel, RESPONSES['music']['drm']['error_playback'])
                                 video_info = await self.get_youtube_info(video_id)
                                 if video_info:
                                     temp_file = await self.download_to_temp_file(url, video_info['title'])
                                     if temp_file:
-                                        self.queue[guild_id].insert(0, (f"file://{temp_file}", video_info['title']))
+                                        self.failures.record(url, "drm", title, DOWNLOAD_FALLBACK)
+                                        self.queue[guild_id].insert(0, Track(f"file://{temp_file}", video_info['title'], track.duration))
                                         await self.play_next(guild_id)
                                         return
                             
                             self.add_error_log(guild_id, title, "drm")
                             
-                            await channel.send(RESPONSES['music']['drm']['api_failed'])
-                            alt_url, alt_title = await self.find_alternative_version(title, channel)
+                            await self.announce(channel, RESPONSES['music']['drm']['api_failed'])
+                            alt_url, alt_title = await self.find_alternative_version(url, title, channel, track.duration)
                             if alt_url:
-                                self.queue[guild_id].insert(0, (alt_url, alt_title or title))
+                                self.try_substitute(guild_id, url, title, alt_url, alt_title)
+                                self.queue[guild_id].insert(0, Track(alt_url, alt_title or title, track.duration))
                                 await self.play_next(guild_id)
                             else:
                                 search_query = f"ytsearch:{title} lyrics"
-                                await channel.send(RESPONSES['music']['drm']['trying_generic'])
-                                self.queue[guild_id].insert(0, (search_query, title))
+                                await self.announce(channel, RESPONSES['music']['drm']['trying_generic'])
+                                self.try_substitute(guild_id, url, title, search_query, title)
+                                self.queue[guild_id].insert(0, Track(search_query, title, track.duration))
                                 await self.play_next(guild_id)
                         else:
                             self.add_error_log(guild_id, title, "general")
@@ -721,14 +1364,16 @@ class Music(commands.Cog):
                         await self.post_error_report(guild_id, channel)
                         
                     await self.play_next(guild_id)
+            else:
+                self.state.save_settings(guild_id, current_url=None, current_title=None)
         except Exception as e:
             logger.error(f"Error in play_next: {e}")
 
-    def handle_playback_error(self, error, guild_id, url, title, channel):
+    def handle_playback_error(self, error, guild_id, url, title, channel, duration=None):
         """Handle errors that occur during playback"""
         if error:
             asyncio.run_coroutine_threadsafe(
-                self.process_playback_error(error, guild_id, url, title, channel),
+                self.process_playback_error(error, guild_id, url, title, channel, duration),
                 self.bot.loop
             )
         else:
@@ -737,35 +1382,43 @@ class Music(commands.Cog):
                 self.bot.loop
             )
             
-    async def process_playback_error(self, error, guild_id, url, title, channel):
+    async def process_playback_error(self, error, guild_id, url, title, channel, duration=None):
         """Process playback errors and try alternatives for DRM issues"""
         error_msg = str(error).lower()
         logger.error(f"Playback error: {error}")
         
-        if self.is_drm_error(error_msg) or "403" in error_msg:
+        # A bare 403 is usually an expired stream URL, so only DRM gets cached
+        is_drm = self.is_drm_error(error_msg)
+        if is_drm or "403" in error_msg:
             video_id = self.extract_video_id(url)
             if video_id and self.youtube_api_available:
                 logger.info(f"DRM error during playback, using YouTube API for: {title}")
-                await channel.send(RESPONSES['music']['drm']['error_playback'])
+                await self.announce(channel, RESPONSES['music']['drm']['error_playback'])
                 
                 video_info = await self.get_youtube_info(video_id)
                 if video_info:
                     temp_file = await self.download_to_temp_file(url, video_info['title'])
                     if temp_file:
-                        self.queue[guild_id].insert(0, (f"file://{temp_file}", video_info['title']))
+                        if is_drm:
+                            self.failures.record(url, "drm", title, DOWNLOAD_FALLBACK)
+                        self.queue[guild_id].insert(0, Track(f"file://{temp_file}", video_info['title'], duration))
                         await self.play_next(guild_id)
                         return
             
             self.add_error_log(guild_id, title, "drm")
             
-            await channel.send(RESPONSES['music']['drm']['api_failed'])
-            alt_url, alt_title = await self.find_alternative_version(title, channel)
+            await self.announce(channel, RESPONSES['music']['drm']['api_failed'])
+            alt_url, alt_title = await self.find_alternative_version(url, title, channel, duration)
             if alt_url:
-                self.queue[guild_id].insert(0, (alt_url, alt_title or title))
+                if is_drm:
+                    self.try_substitute(guild_id, url, title, alt_url, alt_title)
+                self.queue[guild_id].insert(0, Track(alt_url, alt_title or title, duration))
             else:
                 search_query = f"ytsearch:{title} lyrics"
-                await channel.send(RESPONSES['music']['drm']['trying_generic'])
-                self.queue[guild_id].insert(0, (search_query, title))
+                await self.announce(channel, RESPONSES['music']['drm']['trying_generic'])
+                if is_drm:
+                    self.try_substitute(guild_id, url, title, search_query, title)
+                self.queue[guild_id].insert(0, Track(search_query, title, duration))
         else:
             self.add_error_log(guild_id, title, "playback")
         
@@ -800,7 +1453,8 @@ class Music(commands.Cog):
                     if item['track'] and item['track']['type'] == 'track':
                         track = item['track']
                         search_query = f"{track['artists'][0]['name']} - {track['name']}"
-                        tracks.append((f"ytsearch:{search_query}", search_query))
+                        duration = track['duration_ms'] / 1000 if track.get('duration_ms') else None
+                        tracks.append(Track(f"ytsearch:{search_query}", search_query, duration))
                 
                 if results['next']:
                     results = spotify.next(results)
@@ -823,19 +1477,20 @@ class Music(commands.Cog):
                 
                 if ctx.guild.id in self.voice_clients:
                     if self.voice_clients[ctx.guild.id].channel == channel:
-                        await ctx.send(RESPONSES['music']['errors']['already_connected'])
+                        await reply_to(ctx, RESPONSES['music']['errors']['already_connected'])
                         return
                     else:
                         await self.voice_clients[ctx.guild.id].disconnect()
                 
                 voice_client = await channel.connect()
                 self.voice_clients[ctx.guild.id] = voice_client
-                await ctx.send(RESPONSES['music']['status']['joined'].format(channel=channel.name))
+                self.state.save_settings(ctx.guild.id, voice_channel_id=channel.id)
+                await reply_to(ctx, RESPONSES['music']['status']['joined'].format(channel=channel.name))
             else:
-                await ctx.send(RESPONSES['music']['errors']['not_in_voice'])
+                await reply_to(ctx, RESPONSES['music']['errors']['not_in_voice'])
         except Exception as e:
             logger.error(f"Error joining voice channel: {e}")
-            await ctx.send(RESPONSES['music']['errors']['join_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['join_error'])
             
     @commands.command()
     async def shuffle(self, ctx):
@@ -845,17 +1500,17 @@ class Music(commands.Cog):
         try:
             guild_id = ctx.guild.id
             if guild_id not in self.queue or len(self.queue[guild_id]) < 2:
-                await ctx.send(RESPONSES['music']['errors']['shuffle_min'])
+                await reply_to(ctx, RESPONSES['music']['errors']['shuffle_min'])
                 return
                 
             current_queue = self.queue[guild_id]
             random.shuffle(current_queue)
             self.queue[guild_id] = current_queue
             
-            await ctx.send(RESPONSES['music']['status']['shuffled'])
+            await reply_to(ctx, RESPONSES['music']['status']['shuffled'])
         except Exception as e:
             logger.error(f"Error shuffling queue: {e}")
-            await ctx.send(RESPONSES['music']['errors']['shuffle_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['shuffle_error'])
     
     @commands.command()
     async def loop(self, ctx):
@@ -872,13 +1527,13 @@ class Music(commands.Cog):
             self.loop[guild_id] = not self.loop[guild_id]
             
             if self.loop[guild_id]:
-                await ctx.send(RESPONSES['music']['status']['loop_enabled'])
+                await reply_to(ctx, RESPONSES['music']['status']['loop_enabled'])
             else:
-                await ctx.send(RESPONSES['music']['status']['loop_disabled'])
+                await reply_to(ctx, RESPONSES['music']['status']['loop_disabled'])
                 
         except Exception as e:
             logger.error(f"Error toggling loop: {e}")
-            await ctx.send(RESPONSES['music']['errors']['loop_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['loop_error'])
         
     @commands.command()
     async def leave(self, ctx):
@@ -887,8 +1542,11 @@ class Music(commands.Cog):
         
         try:
             if ctx.guild.id in self.voice_clients:
+                self.end_broadcast(ctx.guild.id)
+                self.substitutes.pop(ctx.guild.id, None)
                 await self.voice_clients[ctx.guild.id].disconnect()
                 del self.voice_clients[ctx.guild.id]
+                self.forget_session(ctx.guild.id)
                 if ctx.guild.id in self.queue:
                     del self.queue[ctx.guild.id]
                 if ctx.guild.id in self.loop:
@@ -896,10 +1554,10 @@ class Music(commands.Cog):
                 if ctx.guild.id in self.command_channels:
                     del self.command_channels[ctx.guild.id]
             else:
-                await ctx.send(RESPONSES['music']['errors']['not_connected'])
+                await reply_to(ctx, RESPONSES['music']['errors']['not_connected'])
         except Exception as e:
             logger.error(f"Error leaving voice channel: {e}")
-            await ctx.send(RESPONSES['music']['errors']['leave_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['leave_error'])
             
     @commands.command()
     async def play(self, ctx, *, url):
@@ -917,28 +1575,28 @@ class Music(commands.Cog):
                 self.queue[guild_id] = []
             
             if 'spotify.com/playlist/' in url:
-                await ctx.send(RESPONSES['music']['status']['processing_spotify'].format(type='playlist'))
+                await reply_to(ctx, RESPONSES['music']['status']['processing_spotify'].format(type='playlist'))
                 tracks = self.get_spotify_playlist_tracks(url)
                 
                 if not tracks:
-                    await ctx.send(RESPONSES['music']['errors']['spotify_error'].format(type='playlist'))
+                    await reply_to(ctx, RESPONSES['music']['errors']['spotify_error'].format(type='playlist'))
                     return
                 
-                self.queue[guild_id].extend([(url, title) for url, title in tracks])
+                self.queue[guild_id].extend(tracks)
                 
                 if not self.voice_clients[guild_id].is_playing():
                     await self.play_next(guild_id)
                 else:
-                    await ctx.send(RESPONSES['music']['status']['added_tracks'].format(count=len(tracks), type='playlist'))
+                    await reply_to(ctx, RESPONSES['music']['status']['added_tracks'].format(count=len(tracks), type='playlist'))
                 
             elif 'spotify.com/track/' in url:
-                await ctx.send(RESPONSES['music']['status']['processing_spotify'].format(type='track'))
+                await reply_to(ctx, RESPONSES['music']['status']['processing_spotify'].format(type='track'))
                 search_query = self.get_spotify_track_info(url)
                 if not search_query:
-                    await ctx.send(RESPONSES['music']['errors']['spotify_error'].format(type='track'))
+                    await reply_to(ctx, RESPONSES['music']['errors']['spotify_error'].format(type='track'))
                     return
                     
-                await ctx.send(RESPONSES['music']['status']['searching_youtube'].format(query=search_query))
+                await reply_to(ctx, RESPONSES['music']['status']['searching_youtube'].format(query=search_query))
                 url = f"ytsearch:{search_query}"
                 title = search_query
                 
@@ -947,110 +1605,114 @@ class Music(commands.Cog):
                 if not self.voice_clients[guild_id].is_playing():
                     await self.play_next(guild_id)
                 else:
-                    await ctx.send(RESPONSES['music']['status']['added_to_queue'].format(title=title))
+                    await reply_to(ctx, RESPONSES['music']['status']['added_to_queue'].format(title=title))
                 
             elif ('youtube.com' in url and 'list=' in url):
-                await ctx.send(RESPONSES['music']['status']['processing_youtube'].format(type='playlist'))
+                await reply_to(ctx, RESPONSES['music']['status']['processing_youtube'].format(type='playlist'))
                 tracks = await self.fetch_youtube_playlist(url, ctx)
                 
                 if not tracks:
-                    await ctx.send(RESPONSES['music']['errors']['youtube_error'])
+                    await reply_to(ctx, RESPONSES['music']['errors']['youtube_error'])
                     return
                 
-                self.queue[guild_id].extend([(track_url, track_title) for track_url, track_title in tracks])
+                self.queue[guild_id].extend(tracks)
                 
                 if not self.voice_clients[guild_id].is_playing():
                     await self.play_next(guild_id)
                 else:
-                    await ctx.send(RESPONSES['music']['status']['added_tracks'].format(count=len(tracks), type='YouTube playlist'))
+                    await reply_to(ctx, RESPONSES['music']['status']['added_tracks'].format(count=len(tracks), type='YouTube playlist'))
             
             elif ('youtube.com/watch' in url or 'youtu.be/' in url):
                 video_id = self.extract_video_id(url)
                 if not video_id:
-                    await ctx.send(RESPONSES['music']['errors']['invalid_url'])
+                    await reply_to(ctx, RESPONSES['music']['errors']['invalid_url'])
                     return
                 
-                await ctx.send(RESPONSES['music']['status']['processing_youtube'].format(type='video'))
+                await reply_to(ctx, RESPONSES['music']['status']['processing_youtube'].format(type='video'))
                 
                 try:
-                    loop = asyncio.get_event_loop()
-                    
-                    with yt_dlp.YoutubeDL({
+                    data = await self.extract_info('video', url, {
                         'format': 'bestaudio/best',
                         'quiet': True,
                         'default_search': 'ytsearch',
                         'ignoreerrors': True,
                         'noplaylist': True
-                    }) as ytdl:
-                        data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=False))
+                    })
+                    
+                    if data:
+                        title = data.get('title', 'Unknown Title')
+                        webpage_url = data.get('webpage_url', url)
+                        self.search_index.record(video_id, data.get('title'), data.get('channel') or data.get('uploader'))
                         
-                        if data:
-                            title = data.get('title', 'Unknown Title')
-                            webpage_url = data.get('webpage_url', url)
-                            
-                            self.queue[guild_id].append((webpage_url, title))
-                            
-                            if not self.voice_clients[guild_id].is_playing():
-                                await self.play_next(guild_id)
-                            else:
-                                await ctx.send(RESPONSES['music']['status']['added_to_queue'].format(title=title))
-                            return
+                        self.queue[guild_id].append(Track(webpage_url, title, data.get('duration')))
+                        
+                        if not self.voice_clients[guild_id].is_playing():
+                            await self.play_next(guild_id)
+                        else:
+                            await reply_to(ctx, RESPONSES['music']['status']['added_to_queue'].format(title=title))
+                        return
                 except Exception as e:
                     error_str = str(e)
                     if self.is_drm_error(error_str):
-                        await ctx.send(RESPONSES['music']['drm']['detected'])
+                        await reply_to(ctx, RESPONSES['music']['drm']['detected'])
                     else:
                         raise
                 
                 title = "YouTube Video"
                 channel_name = None
+                duration = None
                 if self.youtube_api_available:
                     try:
                         video_info = await self.get_youtube_info(video_id)
                         if video_info:
                             title = video_info['title']
                             channel_name = video_info.get('channel', '')
+                            duration = parse_iso8601_duration(video_info['duration'])
                     except Exception as e:
                         logger.error(f"Error getting YouTube info: {e}")
                 
-                await ctx.send(RESPONSES['music']['status']['downloading'].format(title=title))
+                await reply_to(ctx, RESPONSES['music']['status']['downloading'].format(title=title))
                 temp_file = await self.download_to_temp_file(url, title)
                 
                 if temp_file:
-                    self.queue[guild_id].append((f"file://{temp_file}", title))
+                    self.queue[guild_id].append(Track(f"file://{temp_file}", title, duration))
                     
                     if not self.voice_clients[guild_id].is_playing():
                         await self.play_next(guild_id)
                     else:
-                        await ctx.send(RESPONSES['music']['status']['added_to_queue'].format(title=title))
+                        await reply_to(ctx, RESPONSES['music']['status']['added_to_queue'].format(title=title))
                 else:
                     search_text = title
                     if channel_name:
                         search_text = f"{title} {channel_name}"
                         
-                    await ctx.send(RESPONSES['music']['status']['searching_exact'].format(title=title))
+                    await reply_to(ctx, RESPONSES['music']['status']['searching_exact'].format(title=title))
                     search_query = f"ytsearch:{search_text}"
                     
-                    self.queue[guild_id].append((search_query, title))
+                    self.queue[guild_id].append(Track(search_query, title, duration))
                     
                     if not self.voice_clients[guild_id].is_playing():
                         await self.play_next(guild_id)
                     else:
-                        await ctx.send(RESPONSES['music']['status']['added_to_queue'].format(title=title))
+                        await reply_to(ctx, RESPONSES['music']['status']['added_to_queue'].format(title=title))
             
             else:
                 try:
                     is_search = url.startswith(('ytsearch:', 'scsearch:'))
                     
                     if not is_search and not url.startswith(('http://', 'https://')):
-                        search_query = f"ytsearch:{url}"
-                        await ctx.send(RESPONSES['music']['status']['searching'].format(query=url))
-                        title = url
+                        # Songs this bot has resolved before skip the remote search
+                        indexed = self.search_index.lookup(url)
+                        if indexed:
+                            search_query, title = indexed
+                        else:
+                            search_query = f"ytsearch:{url}"
+                            await reply_to(ctx, RESPONSES['music']['status']['searching'].format(query=url))
+                            title = url
                         
                         self.queue[guild_id].append((search_query, title))
                     else:
-                        loop = asyncio.get_event_loop()
-                        with yt_dlp.YoutubeDL({
+                        data = await self.extract_info('url', url, {
                             'format': 'bestaudio/best',
                             'quiet': True,
                             'default_search': 'ytsearch',
@@ -1059,23 +1721,22 @@ class Music(commands.Cog):
                             'ignore_no_formats_error': True,
                             'ignore_config': True,
                             'geo_bypass': True
-                        }) as ytdl:
-                            data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=False))
+                        })
                         
                         title = data.get('title', 'Unknown Title')
                         
                         webpage_url = data.get('webpage_url', url)
                         
-                        self.queue[guild_id].append((webpage_url, title))
+                        self.queue[guild_id].append(Track(webpage_url, title, data.get('duration')))
                     
                     if not self.voice_clients[guild_id].is_playing():
                         await self.play_next(guild_id)
                     else:
-                        await ctx.send(RESPONSES['music']['status']['added_to_queue'].format(title=title))
+                        await reply_to(ctx, RESPONSES['music']['status']['added_to_queue'].format(title=title))
                         
                 except Exception as e:
                     logger.error(f"Error processing URL: {e}")
-                    await ctx.send(RESPONSES['music']['errors']['processing_error'])
+                    await reply_to(ctx, RESPONSES['music']['errors']['processing_error'])
                     
                     search_query = f"ytsearch:{url}"
                     title = url
@@ -1085,11 +1746,11 @@ class Music(commands.Cog):
                     if not self.voice_clients[guild_id].is_playing():
                         await self.play_next(guild_id)
                     else:
-                        await ctx.send(RESPONSES['music']['status']['added_search'])
+                        await reply_to(ctx, RESPONSES['music']['status']['added_search'])
                         
         except Exception as e:
             logger.error(f"Error in play command: {e}")
-            await ctx.send(RESPONSES['music']['errors']['processing_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['processing_error'])
     
     @commands.command()
     async def pause(self, ctx):
@@ -1099,12 +1760,12 @@ class Music(commands.Cog):
         try:
             if ctx.guild.id in self.voice_clients and self.voice_clients[ctx.guild.id].is_playing():
                 self.voice_clients[ctx.guild.id].pause()
-                await ctx.send(RESPONSES['music']['status']['paused'])
+                await reply_to(ctx, RESPONSES['music']['status']['paused'])
             else:
-                await ctx.send(RESPONSES['music']['errors']['nothing_playing'])
+                await reply_to(ctx, RESPONSES['music']['errors']['nothing_playing'])
         except Exception as e:
             logger.error(f"Error pausing: {e}")
-            await ctx.send(RESPONSES['music']['errors']['pause_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['pause_error'])
     
     @commands.command()
     async def resume(self, ctx):
@@ -1114,12 +1775,12 @@ class Music(commands.Cog):
         try:
             if ctx.guild.id in self.voice_clients and self.voice_clients[ctx.guild.id].is_paused():
                 self.voice_clients[ctx.guild.id].resume()
-                await ctx.send(RESPONSES['music']['status']['resumed'])
+                await reply_to(ctx, RESPONSES['music']['status']['resumed'])
             else:
-                await ctx.send(RESPONSES['music']['errors']['nothing_paused'])
+                await reply_to(ctx, RESPONSES['music']['errors']['nothing_paused'])
         except Exception as e:
             logger.error(f"Error resuming: {e}")
-            await ctx.send(RESPONSES['music']['errors']['resume_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['resume_error'])
     
     @commands.command()
     async def stop(self, ctx):
@@ -1128,17 +1789,20 @@ class Music(commands.Cog):
         
         try:
             if ctx.guild.id in self.voice_clients:
+                # Cut short, the current stand-in hasn't proven anything
+                self.substitutes.pop(ctx.guild.id, None)
                 self.voice_clients[ctx.guild.id].stop()
                 if ctx.guild.id in self.queue:
                     self.queue[ctx.guild.id].clear()
                 if ctx.guild.id in self.loop:
                     self.loop[ctx.guild.id] = False
-                await ctx.send(RESPONSES['music']['status']['stopped'])
+                self.state.save_settings(ctx.guild.id, current_url=None, current_title=None)
+                await reply_to(ctx, RESPONSES['music']['status']['stopped'])
             else:
-                await ctx.send(RESPONSES['music']['errors']['nothing_playing'])
+                await reply_to(ctx, RESPONSES['music']['errors']['nothing_playing'])
         except Exception as e:
             logger.error(f"Error stopping: {e}")
-            await ctx.send(RESPONSES['music']['errors']['stop_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['stop_error'])
     
     @commands.command()
     async def skip(self, ctx):
@@ -1147,13 +1811,217 @@ class Music(commands.Cog):
         
         try:
             if ctx.guild.id in self.voice_clients and self.voice_clients[ctx.guild.id].is_playing():
-                self.voice_clients[ctx.guild.id].stop()
-                await ctx.send(RESPONSES['music']['status']['skipped'])
+                # A skipped stand-in didn't play through, so it isn't cached
+                self.substitutes.pop(ctx.guild.id, None)
+                # Cut straight to the preloaded next track when there is one
+                player = self.players.get(ctx.guild.id)
+                if not (player and player.skip()):
+                    self.voice_clients[ctx.guild.id].stop()
+                await reply_to(ctx, RESPONSES['music']['status']['skipped'])
             else:
-                await ctx.send(RESPONSES['music']['errors']['nothing_playing'])
+                await reply_to(ctx, RESPONSES['music']['errors']['nothing_playing'])
         except Exception as e:
             logger.error(f"Error skipping: {e}")
-            await ctx.send(RESPONSES['music']['errors']['skip_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['skip_error'])
+    
+    @commands.command()
+    async def volume(self, ctx, level: int = None):
+        """Show or set the playback volume in percent (0-200), applied live"""
+        # Store the command channel
+        self.command_channels[ctx.guild.id] = ctx.channel
+        
+        try:
+            settings = self.get_audio_settings(ctx.guild.id)
+            if level is not None:
+                if not 0 <= level <= MAX_VOLUME * 100:
+                    await reply_to(ctx, RESPONSES['music']['errors']['volume_range'].format(max=int(MAX_VOLUME * 100)))
+                    return
+                settings.volume = level / 100
+                self.save_audio_settings(ctx.guild.id)
+            await reply_to(ctx, RESPONSES['music']['status']['volume'].format(volume=round(settings.volume * 100)))
+        except Exception as e:
+            logger.error(f"Error setting volume: {e}")
+            await reply_to(ctx, RESPONSES['music']['errors']['volume_error'])
+    
+    @commands.command()
+    async def seek(self, ctx, position=None):
+        """Jump to a position in the current track (m:ss, seconds, or +/- seconds)"""
+        # Store the command channel
+        self.command_channels[ctx.guild.id] = ctx.channel
+        
+        try:
+            player = self.players.get(ctx.guild.id)
+            if not player:
+                await reply_to(ctx, RESPONSES['music']['errors']['nothing_playing'])
+                return
+            match = re.fullmatch(r'([+-])?(?:(\d+):)?(\d+)', position or '')
+            if not match:
+                await reply_to(ctx, RESPONSES['music']['errors']['seek_usage'])
+                return
+            sign, minutes, seconds = match.groups()
+            target = int(minutes or 0) * 60 + int(seconds)
+            if sign:
+                target = player.position + (target if sign == '+' else -target)
+            target = max(0.0, target)
+            
+            track = player.track
+            duration = track.get('duration')
+            if duration and target >= duration:
+                await reply_to(ctx, RESPONSES['music']['errors']['seek_range'].format(duration=format_duration(duration)))
+                return
+            
+            source = await self.open_at(track, target)
+            if source is None or player.track is not track or self.players.get(ctx.guild.id) is not player:
+                if source:
+                    source.cleanup()
+                await reply_to(ctx, RESPONSES['music']['errors']['seek_error'])
+                return
+            player.replace(source, target)
+            await reply_to(ctx, RESPONSES['music']['status']['seeked'].format(position=format_duration(target)))
+        except Exception as e:
+            logger.error(f"Error seeking: {e}")
+            await reply_to(ctx, RESPONSES['music']['errors']['seek_error'])
+    
+    @commands.command(name='filter')
+    async def audio_filter(self, ctx, name=None):
+        """Toggle an audio filter (normalize, bassboost, nightcore) or turn all off"""
+        # Store the command channel
+        self.command_channels[ctx.guild.id] = ctx.channel
+        
+        try:
+            settings = self.get_audio_settings(ctx.guild.id)
+            if name:
+                name = name.lower()
+                if name == 'off':
+                    settings.filters = set()
+                elif name in FILTERS:
+                    # Swap in a new set so the audio thread never sees one mid-change
+                    settings.filters = settings.filters ^ {name}
+                else:
+                    await reply_to(ctx, RESPONSES['music']['errors']['unknown_filter'].format(filters=", ".join(FILTERS)))
+                    return
+                self.save_audio_settings(ctx.guild.id)
+            
+            if settings.filters:
+                await reply_to(ctx, RESPONSES['music']['status']['filters'].format(filters=", ".join(sorted(settings.filters))))
+            else:
+                await reply_to(ctx, RESPONSES['music']['status']['filters_off'])
+        except Exception as e:
+            logger.error(f"Error setting filter: {e}")
+            await reply_to(ctx, RESPONSES['music']['errors']['filter_error'])
+    
+    @commands.command()
+    async def broadcast(self, ctx):
+        """Start or stop sharing this server's playback with other servers"""
+        # Store the command channel
+        self.command_channels[ctx.guild.id] = ctx.channel
+        
+        try:
+            guild_id = ctx.guild.id
+            if guild_id in self.broadcasts:
+                self.end_broadcast(guild_id)
+                await reply_to(ctx, RESPONSES['music']['status']['broadcast_stopped'])
+                return
+            if guild_id not in self.voice_clients:
+                await reply_to(ctx, RESPONSES['music']['errors']['not_connected'])
+                return
+            if self.listening_to(guild_id):
+                await reply_to(ctx, RESPONSES['music']['errors']['broadcast_listening'])
+                return
+            
+            broadcast = self.broadcasts[guild_id] = Broadcast(guild_id)
+            voice_client = self.voice_clients[guild_id]
+            # Broadcast the current track from here on, not just the next one
+            if voice_client.is_playing() or voice_client.is_paused():
+                self.swap_source(voice_client, broadcast.feed(voice_client.source))
+            await reply_to(ctx, RESPONSES['music']['status']['broadcast_started'].format(guild_id=guild_id))
+        except Exception as e:
+            logger.error(f"Error toggling broadcast: {e}")
+            await reply_to(ctx, RESPONSES['music']['errors']['broadcast_error'])
+    
+    @commands.command()
+    async def tune(self, ctx, host_id: int = None):
+        """Listen to another server's broadcast, or stop listening with no argument"""
+        # Store the command channel
+        self.command_channels[ctx.guild.id] = ctx.channel
+        
+        try:
+            guild_id = ctx.guild.id
+            current = self.listening_to(guild_id)
+            if host_id is None:
+                if not current:
+                    await reply_to(ctx, RESPONSES['music']['errors']['not_tuned'])
+                    return
+                # The listener unsubscribes itself when the voice client stops it
+                self.voice_clients[guild_id].stop()
+                await reply_to(ctx, RESPONSES['music']['status']['untuned'])
+                # Songs queued while listening play now
+                if self.queue.get(guild_id):
+                    await self.play_next(guild_id)
+                return
+            
+            broadcast = self.broadcasts.get(host_id)
+            if broadcast is None or host_id == guild_id:
+                await reply_to(ctx, RESPONSES['music']['errors']['broadcast_not_found'])
+                return
+            if guild_id not in self.voice_clients:
+                await self.join(ctx)
+                if guild_id not in self.voice_clients:
+                    return
+            voice_client = self.voice_clients[guild_id]
+            if guild_id in self.broadcasts or (not current and (voice_client.is_playing() or voice_client.is_paused())):
+                await reply_to(ctx, RESPONSES['music']['errors']['tune_busy'])
+                return
+            
+            listener = broadcast.subscribe(guild_id)
+            if current:
+                # Switching stations: swap sources without stopping the voice client
+                old = voice_client.source
+                self.swap_source(voice_client, listener)
+                old.cleanup()
+            else:
+                voice_client.play(listener)
+            host = self.bot.get_guild(host_id)
+            await reply_to(ctx, RESPONSES['music']['status']['tuned'].format(guild=host.name if host else host_id))
+        except Exception as e:
+            logger.error(f"Error tuning in to broadcast: {e}")
+            await reply_to(ctx, RESPONSES['music']['errors']['broadcast_error'])
+
+    def render_queue_page(self, guild_id, page):
+        """Queue listing for one page, cached until the queue changes"""
+        queue = self.queue[guild_id]
+        cached = self.queue_pages.get(guild_id)
+        if not cached or cached[0] is not queue or cached[1] != queue.version:
+            cached = (queue, queue.version, {})
+            self.queue_pages[guild_id] = cached
+        
+        pages = cached[2]
+        if page not in pages:
+            start = page * QUEUE_PAGE_SIZE
+            pages[page] = "\n".join([
+                f"{i+1}. {track[1]}" + (f" [{format_duration(track.duration)}]" if track.duration else "")
+                for i, track in enumerate(queue[start:start + QUEUE_PAGE_SIZE], start)
+            ])
+        return pages[page]
+    
+    def queue_message(self, guild_id, page):
+        """Clamp page to the queue and return (page, message text)"""
+        queue = self.queue[guild_id]
+        page_count = max(1, -(-len(queue) // QUEUE_PAGE_SIZE))
+        page = max(0, min(page, page_count - 1))
+        
+        loop_status = RESPONSES['music']['queue']['loop_on'] if guild_id in self.loop and self.loop[guild_id] else RESPONSES['music']['queue']['loop_off']
+        
+        seconds, unknown = queue.total_duration()
+        if unknown:
+            total = RESPONSES['music']['queue']['total_unknown'].format(duration=format_duration(seconds), count=unknown)
+        else:
+            total = RESPONSES['music']['queue']['total'].format(duration=format_duration(seconds))
+        
+        header = RESPONSES['music']['queue']['header'].format(loop_status=loop_status) + f" {total}"
+        if page_count > 1:
+            header += "\n" + RESPONSES['music']['queue']['page'].format(page=page + 1, pages=page_count, count=len(queue))
+        return page, header + f"\n```{self.render_queue_page(guild_id, page)}```"
     
     @commands.command()
     async def queue(self, ctx):
@@ -1163,18 +2031,22 @@ class Music(commands.Cog):
         try:
             guild_id = ctx.guild.id
             if guild_id in self.queue and self.queue[guild_id]:
-                queue_list = "\n".join([f"{i+1}. {title}" for i, (url, title) in enumerate(self.queue[guild_id][:10])])
-                if len(self.queue[guild_id]) > 10:
-                    queue_list += f"\n" + RESPONSES['music']['queue']['more_items'].format(count=len(self.queue[guild_id]) - 10)
-                
-                loop_status = RESPONSES['music']['queue']['loop_on'] if guild_id in self.loop and self.loop[guild_id] else RESPONSES['music']['queue']['loop_off']
+                # Only one live pager per guild; the previous one loses its buttons
+                if guild_id in self.queue_views:
+                    await self.queue_views[guild_id].close()
                 
-                await ctx.send(RESPONSES['music']['queue']['header'].format(loop_status=loop_status) + f"\n```{queue_list}```")
+                page, content = self.queue_message(guild_id, 0)
+                if len(self.queue[guild_id]) > QUEUE_PAGE_SIZE:
+                    view = QueueView(self, guild_id, page)
+                    view.message = await reply_to(ctx, content, view=view)
+                    self.queue_views[guild_id] = view
+                else:
+                    await reply_to(ctx, content)
             else:
-                await ctx.send(RESPONSES['music']['queue']['empty'])
+                await reply_to(ctx, RESPONSES['music']['queue']['empty'])
         except Exception as e:
             logger.error(f"Error showing queue: {e}")
-            await ctx.send(RESPONSES['music']['errors']['queue_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['queue_error'])
     
     @commands.command()
     async def clear(self, ctx):
@@ -1186,12 +2058,12 @@ class Music(commands.Cog):
             if guild_id in self.queue:
                 self.queue[guild_id].clear()
                 loop_status = " (Loop remains ON)" if guild_id in self.loop and self.loop[guild_id] else ""
-                await ctx.send(RESPONSES['music']['status']['queue_cleared'].format(loop_status=loop_status))
+                await reply_to(ctx, RESPONSES['music']['status']['queue_cleared'].format(loop_status=loop_status))
             else:
-                await ctx.send(RESPONSES['music']['status']['queue_empty'])
+                await reply_to(ctx, RESPONSES['music']['status']['queue_empty'])
         except Exception as e:
             logger.error(f"Error clearing queue: {e}")
-            await ctx.send(RESPONSES['music']['errors']['clear_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['clear_error'])
             
     @commands.command()
     async def ytsearch(self, ctx, *, query):
@@ -1200,9 +2072,12 @@ class Music(commands.Cog):
         self.command_channels[ctx.guild.id] = ctx.channel
         
         try:
-            await ctx.send(RESPONSES['music']['status']['searching_youtube'].format(query=query))
-            
-            search_query = f"ytsearch:{query}"
+            indexed = self.search_index.lookup(query)
+            if indexed:
+                search_query, title = indexed
+            else:
+                await reply_to(ctx, RESPONSES['music']['status']['searching_youtube'].format(query=query))
+                search_query, title = f"ytsearch:{query}", query
             guild_id = ctx.guild.id
             
             if guild_id not in self.voice_clients:
@@ -1213,16 +2088,16 @@ class Music(commands.Cog):
             if guild_id not in self.queue:
                 self.queue[guild_id] = []
             
-            self.queue[guild_id].append((search_query, query))
+            self.queue[guild_id].append((search_query, title))
             
             if not self.voice_clients[guild_id].is_playing():
                 await self.play_next(guild_id)
             else:
-                await ctx.send(RESPONSES['music']['status']['added_to_queue'].format(title=query))
+                await reply_to(ctx, RESPONSES['music']['status']['added_to_queue'].format(title=title))
                 
         except Exception as e:
             logger.error(f"Error in ytsearch command: {e}")
-            await ctx.send(RESPONSES['music']['errors']['search_error'])
+            await reply_to(ctx, RESPONSES['music']['errors']['search_error'])
 
 class Games(commands.Cog):
     def __init__(self, bot):
@@ -1246,13 +2121,13 @@ class Games(commands.Cog):
             
             if chamber == 1:
                 del self.roulette_chambers[user_id]
-                await ctx.send(RESPONSES['games']['roulette']['bang'].format(user=ctx.author.display_name))
+                await reply_to(ctx, RESPONSES['games']['roulette']['bang'].format(user=ctx.author.display_name))
             else:
                 self.roulette_chambers[user_id] -= 1
-                await ctx.send(RESPONSES['games']['roulette']['safe'].format(user=ctx.author.display_name))
+                await reply_to(ctx, RESPONSES['games']['roulette']['safe'].format(user=ctx.author.display_name))
         except Exception as e:
             logger.error(f"Error in roulette: {e}")
-            await ctx.send(RESPONSES['games']['roulette']['jammed'])
+            await reply_to(ctx, RESPONSES['games']['roulette']['jammed'])
             
     @commands.command()
     async def tts(self, ctx):
@@ -1261,14 +2136,14 @@ class Games(commands.Cog):
     @commands.command()
     async def rps(self, ctx, choice=None):
         if not choice:
-            await ctx.send(RESPONSES['games']['rps']['usage'])
+            await reply_to(ctx, RESPONSES['games']['rps']['usage'])
             return
         
         choices = ['rock', 'paper', 'scissors']
         choice = choice.lower()
         
         if choice not in choices:
-            await ctx.send(RESPONSES['games']['rps']['invalid'])
+            await reply_to(ctx, RESPONSES['games']['rps']['invalid'])
             return
         
         bot_choice = random.choice(choices)
@@ -1282,7 +2157,7 @@ class Games(commands.Cog):
         else:
             result = RESPONSES['games']['rps']['lose']
         
-        await ctx.send(RESPONSES['games']['rps']['result'].format(
+        await reply_to(ctx, RESPONSES['games']['rps']['result'].format(
             user_choice=choice.capitalize(),
             bot_choice=bot_choice.capitalize(),
             result=result
@@ -1291,19 +2166,19 @@ class Games(commands.Cog):
     @commands.command(name='8ball')
     async def magic_8ball(self, ctx, *, question=None):
         if not question:
-            await ctx.send(RESPONSES['games']['magic_8ball']['no_question'])
+            await reply_to(ctx, RESPONSES['games']['magic_8ball']['no_question'])
             return
         
         response = random.choice(RESPONSES['games']['magic_8ball']['responses'])
-        await ctx.send(f"🎱 **{response}**")
+        await reply_to(ctx, f"🎱 **{response}**")
     
     @commands.command()
     async def flip(self, ctx):
         result = random.choice(['Heads', 'Tails'])
         if result == 'Heads':
-            await ctx.send(RESPONSES['games']['flip']['heads'])
+            await reply_to(ctx, RESPONSES['games']['flip']['heads'])
         else:
-            await ctx.send(RESPONSES['games']['flip']['tails'])
+            await reply_to(ctx, RESPONSES['games']['flip']['tails'])
     
     @commands.command()
     async def roll(self, ctx, *, dice='1d6'):
@@ -1320,7 +2195,7 @@ class Games(commands.Cog):
             num_dice = int(num_dice)
             num_sides = int(num_sides)
             if num_dice > 10 or num_sides > 100:
-                await ctx.send(RESPONSES['games']['roll']['too_many'])
+                await reply_to(ctx, RESPONSES['games']['roll']['too_many'])
                 return
             rolls = [random.randint(1, num_sides) for _ in range(num_dice)]
             subtotal = sum(rolls)
@@ -1332,14 +2207,14 @@ class Games(commands.Cog):
                 mod_str = f" - {abs(modifier)}"
             if num_dice == 1:
                 if modifier != 0:
-                    await ctx.send(RESPONSES['games']['roll']['single_mod'].format(
+                    await reply_to(ctx, RESPONSES['games']['roll']['single_mod'].format(
                         subtotal=subtotal, modifier=mod_str, total=total
                     ))
                 else:
-                    await ctx.send(RESPONSES['games']['roll']['single'].format(result=total))
+                    await reply_to(ctx, RESPONSES['games']['roll']['single'].format(result=total))
             else:
                 if modifier != 0:
-                    await ctx.send(RESPONSES['games']['roll']['multiple_mod'].format(
+                    await reply_to(ctx, RESPONSES['games']['roll']['multiple_mod'].format(
                         dice=f"{num_dice}d{num_sides}",
                         rolls=rolls,
                         subtotal=subtotal,
@@ -1347,42 +2222,42 @@ class Games(commands.Cog):
                         total=total
                     ))
                 else:
-                    await ctx.send(RESPONSES['games']['roll']['multiple'].format(
+                    await reply_to(ctx, RESPONSES['games']['roll']['multiple'].format(
                         dice=f"{num_dice}d{num_sides}",
                         rolls=rolls,
                         total=total
                     ))
         except ValueError:
-            await ctx.send(RESPONSES['games']['roll']['invalid'])
+            await reply_to(ctx, RESPONSES['games']['roll']['invalid'])
     
     @commands.command()
     async def fortune(self, ctx):
         fortune = random.choice(RESPONSES['games']['fortune']['responses'])
-        await ctx.send(f"🥠 **Your fortune:** {fortune}")
+        await reply_to(ctx, f"🥠 **Your fortune:** {fortune}")
     
     @commands.command()
     async def choose(self, ctx, *options):
         if len(options) < 2:
-            await ctx.send(RESPONSES['games']['choose']['not_enough'])
+            await reply_to(ctx, RESPONSES['games']['choose']['not_enough'])
             return
         
         choice = random.choice(options)
-        await ctx.send(RESPONSES['games']['choose']['result'].format(choice=choice))
+        await reply_to(ctx, RESPONSES['games']['choose']['result'].format(choice=choice))
         
     @commands.command()
     async def uwu(self, ctx, *, text=""):
         if not text:
-            await ctx.send(RESPONSES['games']['uwu']['no_text'])
+            await reply_to(ctx, RESPONSES['games']['uwu']['no_text'])
             return
         uwu_text = text.replace('r', 'w').replace('l', 'w').replace('R', 'W').replace('L', 'W')
         uwu_text = uwu_text.replace('n', 'ny').replace('N', 'Ny')
         uwu_text += " " + random.choice(RESPONSES['games']['uwu']['suffixes'])
-        await ctx.send(uwu_text)
+        await reply_to(ctx, uwu_text)
     
     @commands.command()
     async def rate(self, ctx, *, thing=""):
         if not thing:
-            await ctx.send(RESPONSES['games']['rate']['no_thing'])
+            await reply_to(ctx, RESPONSES['games']['rate']['no_thing'])
             return
             
         if thing.lower() == "groob":
@@ -1415,93 +2290,104 @@ class Games(commands.Cog):
             else:
                 emoji = random.choice(RESPONSES['games']['rate']['emojis']['amazing'])
             
-        await ctx.send(RESPONSES['games']['rate']['result'].format(thing=thing, rating=rating, emoji=emoji))
+        await reply_to(ctx, RESPONSES['games']['rate']['result'].format(thing=thing, rating=rating, emoji=emoji))
         
     @commands.command()
     async def whoban(self, ctx):
-        await ctx.send(RESPONSES['games']['whoban'])
+        await reply_to(ctx, RESPONSES['games']['whoban'])
         
     @commands.command()
     async def spamdog(self, ctx):
+        # Paced by the channel's outbox, behind any command replies
         for i in range(5):
-            await ctx.send(RESPONSES['games']['spamdog'])
-            await asyncio.sleep(0.5)
+            await get_outbox().chatter(ctx.channel, RESPONSES['games']['spamdog'])
             
     @commands.command()
     async def games(self, ctx):
-        await ctx.send(RESPONSES['games']['list'])
+        await reply_to(ctx, RESPONSES['games']['list'])
         
     @commands.command(name='roastme')
     async def roastme(self, ctx):
         roast = random.choice(RESPONSES['games']['roasts'])
-        await ctx.send(RESPONSES['games']['roast_format'].format(mention=ctx.author.mention, roast=roast))
+        await reply_to(ctx, RESPONSES['games']['roast_format'].format(mention=ctx.author.mention, roast=roast))
 
     @commands.command(name='7ball')
     async def seven_ball(self, ctx, *, question=None):
         if not question:
-            await ctx.send(RESPONSES['games']['seven_ball']['no_question'])
+            await reply_to(ctx, RESPONSES['games']['seven_ball']['no_question'])
             return
         
         response = random.choice(RESPONSES['games']['seven_ball']['responses'])
-        await ctx.send(f"🎱 **{response}**")
+        await reply_to(ctx, f"🎱 **{response}**")
 
 # Bot setup
-intents = discord.Intents.default()
-intents.message_content = True
-intents.voice_states = True
-intents.members = True
-bot = commands.Bot(command_prefix='!', intents=intents, case_insensitive=True)
-ydl = yt_dlp.YoutubeDL(ydl_opts)
-
-# Global event to check for auto-leave when users leave voice channels
-@bot.event
-async def on_voice_state_update(member, before, after):
-    if member.id == bot.user.id:
-        return
+def gateway_options(profile=GATEWAY_PROFILE):
+    """Intents and cache settings for the gateway connection"""
+    # "full" caches every member of every guild, chunked at startup
+    if profile == 'full':
+        intents = discord.Intents.default()
+        intents.message_content = True
+        intents.voice_states = True
+        intents.members = True
+        return {'intents': intents}
     
-    if before.channel and (not after.channel or before.channel != after.channel):
-        guild = before.channel.guild
-        guild_id = guild.id
-        
-        music_cog = bot.get_cog('Music')
-        if not music_cog:
-            return
-        
-        if guild_id in music_cog.voice_clients and music_cog.voice_clients[guild_id].channel == before.channel:
-            human_count = sum(1 for m in before.channel.members if not m.bot)
-            
-            if human_count == 0:
-                if guild_id in music_cog.queue:
-                    music_cog.queue[guild_id].clear()
-                
-                if guild_id in music_cog.loop:
-                    del music_cog.loop[guild_id]
-                
-                if guild_id in music_cog.command_channels:
-                    del music_cog.command_channels[guild_id]
-                
-                try:
-                    await music_cog.voice_clients[guild_id].disconnect(force=True)
-                    del music_cog.voice_clients[guild_id]
-                    logger.info(f"Auto-disconnected from {before.channel.name} - all users left")
-                except Exception as e:
-                    logger.error(f"Error auto-disconnecting: {e}")
+    # "lean" subscribes only to what the cogs use and caches just the members in
+    # voice, which is all on_voice_state_update needs to count listeners
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.dm_messages = True
+    intents.message_content = True
+    intents.voice_states = True
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+    return {
+        'intents': intents,
+        'member_cache_flags': member_cache_flags,
+        'max_messages': GATEWAY_MAX_MESSAGES,
+        'chunk_guilds_at_startup': False,
+    }
+
+if SHARD_COUNT:
+    # Sharded worker: only this process's shards connect, so every per-guild
+    # dict in the cogs holds just the guilds those shards own
+    bot = commands.AutoShardedBot(command_prefix='!', case_insensitive=True,
+                                  shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **gateway_options())
+else:
+    bot = commands.Bot(command_prefix='!', case_insensitive=True, **gateway_options())
 
 @bot.command()
 async def commands(ctx):
-    await ctx.send(RESPONSES['commands']['list'])
+    await reply_to(ctx, RESPONSES['commands']['list'])
 
 @bot.event
-async def on_ready():
-    print(f'✅ {bot.user} has connected to Discord!')
+async def on_shard_ready(shard_id):
+    logger.info(f"Shard {shard_id}/{SHARD_COUNT} ready (worker {WORKER_ID})")
+
+def report_startup():
+    """Log how long each startup phase took"""
+    phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in STARTUP_TIMES.items())
+    total = time.perf_counter() - STARTUP_STARTED
+    print(f'⏱️ Startup: {phases}, total {total:.2f}s')
+
+async def setup_hook():
+    """Add the cogs once per process, before the gateway connects"""
+    if bot.get_cog('Music'):
+        return
     try:
-        await bot.add_cog(Music(bot))
-        await bot.add_cog(Games(bot))
+        started = time.perf_counter()
         
         # Create AI cog with responses
-        ai_cog = AIChatBot(bot)
+        ai_cog = AIChatBot(bot, model_path=AI_MODEL_PATH)
         ai_cog.responses = RESPONSES['ai']
-        await bot.add_cog(ai_cog)
+        
+        await asyncio.gather(
+            bot.add_cog(Music(bot)),
+            bot.add_cog(Games(bot)),
+            bot.add_cog(ai_cog)
+        )
+        STARTUP_TIMES['cogs'] = time.perf_counter() - started
+        STARTUP_TIMES['_setup_done'] = time.perf_counter()
         
         print('✅ All cogs loaded successfully')
         
@@ -1512,6 +2398,31 @@ async def on_ready():
     except Exception as e:
         logger.error(f"Error loading cogs: {e}")
 
+# Bot.close() removes the cogs, so each cog's cog_unload tears down its own tasks
+bot.setup_hook = setup_hook
+
+close_cogs = bot.close
+
+async def close():
+    """Shut down, then stop the outbox every cog sends through"""
+    await close_cogs()
+    get_outbox().close()
+
+bot.close = close
+
+@bot.event
+async def on_ready():
+    print(f'✅ {bot.user} has connected to Discord!')
+    if SHARD_COUNT:
+        print(f'✅ Worker {WORKER_ID} running shards {SHARD_IDS} of {SHARD_COUNT}')
+    
+    # on_ready fires again after every gateway reconnect; report only the first
+    if 'gateway' not in STARTUP_TIMES:
+        STARTUP_TIMES['gateway'] = time.perf_counter() - STARTUP_TIMES.pop('_setup_done', STARTUP_STARTED)
+        report_startup()
+
+STARTUP_TIMES['imports'] = time.perf_counter() - STARTUP_STARTED
+
 # Run the bot
 if __name__ == "__main__":
     try:
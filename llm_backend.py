@@ -0,0 +1,188 @@
+"""Text generation backends for AIChatBot.
+
+HttpBackend posts to an Ollama-compatible /api/generate endpoint (the
+default). LlamaCppBackend loads the GGUF at AI_MODEL_PATH in-process with
+llama-cpp-python, so small deployments don't need a separate model server.
+The model is loaded once and every generation runs on one dedicated worker
+thread (llama.cpp contexts aren't thread-safe), which keeps the event loop
+free. Every prompt starts with the same PREPROMPT, so the worker evaluates
+it once at load time; llama.cpp reuses the longest matching token prefix
+of its context, so later requests only evaluate the history and the new
+message.
+
+ModelWarmer hides model load time from users: it preloads the model (and
+the PREPROMPT prefix) when the cog loads or AI is enabled, and while !chat
+has been used recently it re-warms the model shortly before the server's
+keep_alive would unload it.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# CPU tuning for the in-process backend. Generation is memory-bound and runs
+# best on physical cores; prompt evaluation can use every logical core.
+AI_THREADS = int(os.getenv('AI_THREADS', '0')) or max(1, (os.cpu_count() or 2) // 2)
+AI_BATCH_THREADS = int(os.getenv('AI_BATCH_THREADS', '0')) or (os.cpu_count() or 1)
+AI_CONTEXT_TOKENS = int(os.getenv('AI_CONTEXT_TOKENS', '2048'))
+AI_GPU_LAYERS = int(os.getenv('AI_GPU_LAYERS', '0'))  # 0 = CPU only
+
+# How long the server keeps the model loaded after a request (Ollama keep_alive)
+AI_KEEP_ALIVE = int(os.getenv('AI_KEEP_ALIVE', '600'))
+# Keep the model loaded for this long after the last !chat
+AI_WARM_WINDOW = int(os.getenv('AI_WARM_WINDOW', '1800'))
+
+
+class HttpBackend:
+    # A timed-out request closes its connection and the server stops generating
+    pending = 0
+
+    def __init__(self, url, model="dolphin-mistral:7b"):
+        self.url = url
+        self.model = model
+
+    def start(self, prefix=None):
+        pass
+
+    async def warm(self, prefix):
+        """Load the model and cache the prompt prefix on the server"""
+        await self.generate(prefix, {"num_predict": 1})
+
+    async def generate(self, prompt, options):
+        async with aiohttp.ClientSession() as session:
+            payload = {
+                "model": self.model,
+                "prompt": prompt,
+                "stream": False,
+                "keep_alive": AI_KEEP_ALIVE,
+                "options": options,
+            }
+            async with session.post(self.url, json=payload) as response:
+                if response.status != 200:
+                    raise Exception(f"API returned status code {response.status}")
+                result = await response.json()
+                return result.get('response', '').strip()
+
+    def close(self):
+        pass
+
+
+class LlamaCppBackend:
+    def __init__(self, model_path, threads=AI_THREADS, batch_threads=AI_BATCH_THREADS,
+                 context_tokens=AI_CONTEXT_TOKENS, gpu_layers=AI_GPU_LAYERS):
+        self.model_path = model_path
+        self.threads = threads
+        self.batch_threads = batch_threads
+        self.context_tokens = context_tokens
+        self.gpu_layers = gpu_layers
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='llama')
+        self.llm = None
+        self.loading = None
+        # Generations queued or running on the worker, including ones whose caller timed out
+        self.pending = 0
+
+    def _load(self, prefix):
+        """Worker thread: load the model and evaluate the shared prompt prefix"""
+        if self.llm is not None:
+            return
+        # Imported here so the HTTP backend works without llama-cpp-python installed
+        from llama_cpp import Llama
+
+        started = time.perf_counter()
+        self.llm = Llama(
+            model_path=self.model_path,
+            n_ctx=self.context_tokens,
+            n_threads=self.threads,
+            n_threads_batch=self.batch_threads,
+            n_gpu_layers=self.gpu_layers,
+            verbose=False,
+        )
+        if prefix:
+            self.llm.eval(self.llm.tokenize(prefix.encode('utf-8')))
+        logger.info(f"Loaded {self.model_path} with {self.threads}/{self.batch_threads} threads "
+                    f"in {time.perf_counter() - started:.1f}s")
+
+    def start(self, prefix=None):
+        """Begin loading the model on the worker thread without waiting for it"""
+        if self.loading is None:
+            self.loading = asyncio.get_running_loop().run_in_executor(self.executor, self._load, prefix)
+
+    async def warm(self, prefix):
+        # The model stays loaded once it is; this only waits for the first load
+        self.start(prefix)
+        await self.loading
+
+    def _generate(self, prompt, options):
+        result = self.llm.create_completion(
+            prompt,
+            max_tokens=options.get('num_predict', 128),
+            temperature=options.get('temperature', 0.8),
+            top_p=options.get('top_p', 0.95),
+            stop=options.get('stop'),
+        )
+        return result['choices'][0]['text'].strip()
+
+    async def generate(self, prompt, options):
+        self.start()
+        try:
+            await self.loading
+        except Exception:
+            # Let the next request retry the load
+            self.loading = None
+            raise
+        loop = asyncio.get_running_loop()
+        # A timeout only stops the await; a running completion keeps the worker busy until it finishes
+        future = self.executor.submit(self._generate, prompt, options)
+        self.pending += 1
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._finished))
+        return await asyncio.wrap_future(future)
+
+    def _finished(self):
+        self.pending -= 1
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ModelWarmer:
+    def __init__(self, backend, prefix):
+        self.backend = backend
+        self.prefix = prefix
+        self.last_used = 0.0
+        self.task = None
+
+    def start(self, warm_now=True):
+        """Keep the model warm while there is traffic; warm_now preloads it right away"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run(warm_now))
+
+    def touch(self, warm_now=False):
+        """Record AI use; a !chat loads the model itself, so by default just keep it warm after"""
+        self.last_used = time.monotonic()
+        self.start(warm_now)
+
+    async def run(self, warm_now):
+        while True:
+            if warm_now:
+                started = time.perf_counter()
+                try:
+                    await self.backend.warm(self.prefix)
+                    logger.info(f"Model warm ({time.perf_counter() - started:.1f}s)")
+                except Exception as e:
+                    logger.error(f"Error warming model: {e}")
+            # Re-warm a little before the server would unload the model
+            await asyncio.sleep(AI_KEEP_ALIVE * 0.8)
+            if time.monotonic() - self.last_used > AI_WARM_WINDOW:
+                return
+            warm_now = True
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
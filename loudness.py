@@ -0,0 +1,142 @@
+"""Background loudness analysis for consistent playback levels.
+
+Every downloaded track is measured once with FFmpeg's EBU R128 filter
+(integrated loudness and true peak) in the background, a few FFmpeg
+processes at a time. Results are stored in the state database under the
+track's video ID when it is known, so later plays of the same video, streamed
+or downloaded, get a precomputed gain toward LOUDNESS_TARGET without any
+analysis on the play path.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+
+from track_cache import failure_key, MAX_CACHED_KEYS
+
+logger = logging.getLogger(__name__)
+
+LOUDNESS_TARGET = float(os.getenv('LOUDNESS_TARGET', '-16'))  # LUFS
+LOUDNESS_WORKERS = int(os.getenv('LOUDNESS_WORKERS', '1'))
+# Leave headroom below full scale after the gain is applied
+PEAK_CEILING = -1.0  # dBTP
+MAX_GAIN_DB = 12.0
+
+INTEGRATED_PATTERN = re.compile(r'I:\s+(-?[\d.]+) LUFS')
+PEAK_PATTERN = re.compile(r'Peak:\s+(-?[\d.]+|-inf) dBFS')
+
+
+def track_key(url):
+    """Index key for a track: its video ID when known, else the file name or URL"""
+    if url.startswith('file://'):
+        return f"file:{os.path.basename(url[7:])}"
+    return failure_key(url)
+
+
+def gain_for(entry):
+    """Linear gain that brings a measured track to the target without clipping"""
+    if not entry or entry['integrated'] is None:
+        return 1.0
+    gain_db = min(LOUDNESS_TARGET - entry['integrated'], MAX_GAIN_DB)
+    if entry['peak'] is not None:
+        gain_db = min(gain_db, PEAK_CEILING - entry['peak'])
+    return 10 ** (gain_db / 20)
+
+
+async def measure(file_path):
+    """Run FFmpeg's ebur128 filter over a file; returns (integrated LUFS, true peak dBFS)"""
+    process = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-hide_banner', '-nostats', '-i', file_path,
+        '-af', 'ebur128=peak=true', '-f', 'null', '-',
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {process.returncode}")
+    output = stderr.decode(errors='replace')
+    # The summary at the end repeats the final values; take the last match
+    integrated = INTEGRATED_PATTERN.findall(output)
+    peaks = PEAK_PATTERN.findall(output)
+    if not integrated:
+        raise RuntimeError("no loudness summary in ffmpeg output")
+    peak = peaks[-1] if peaks else None
+    return float(integrated[-1]), None if peak in (None, '-inf') else float(peak)
+
+
+class LoudnessIndex:
+    def __init__(self, store, workers=LOUDNESS_WORKERS):
+        self.store = store
+        self.entries = {}  # key -> entry dict, or None when not analyzed
+        self.sources = {}  # downloaded file path -> key of the track it came from
+        self.jobs = asyncio.Queue()
+        self.workers = workers
+        self.tasks = []
+
+    def lookup(self, key):
+        if key not in self.entries:
+            if len(self.entries) >= MAX_CACHED_KEYS:
+                self.entries.clear()
+            self.entries[key] = self.store.load_loudness(key)
+        return self.entries[key]
+
+    def gain(self, url, file_path=None):
+        """Precomputed gain for a track URL or downloaded file, 1.0 if not analyzed yet"""
+        key = self.sources.get(file_path) if file_path else None
+        return gain_for(self.lookup(key or track_key(url)))
+
+    def submit(self, file_path, source_url=None):
+        """Queue a downloaded file for analysis, keyed by the track it was downloaded for"""
+        key = track_key(source_url) if source_url else track_key(f"file://{file_path}")
+        self.sources[file_path] = key
+        if self.lookup(key) is None:
+            self.jobs.put_nowait((key, file_path))
+        return key
+
+    def share(self, copy_path, file_path):
+        """A copy of an already submitted download uses its track's analysis, no second pass"""
+        key = self.sources.get(file_path)
+        if key:
+            self.sources[copy_path] = key
+        else:
+            self.submit(copy_path)
+
+    def discard(self, file_path):
+        """Forget a deleted download; its analysis stays under the track's key"""
+        self.sources.pop(file_path, None)
+
+    def scan(self, directory):
+        """Queue files already in the temp directory (e.g. from a restored queue)"""
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and path not in self.sources:
+                self.submit(path)
+
+    async def run(self):
+        while True:
+            key, file_path = await self.jobs.get()
+            try:
+                if self.lookup(key) is not None or not os.path.exists(file_path):
+                    continue
+                started = time.perf_counter()
+                integrated, peak = await measure(file_path)
+                entry = {'integrated': integrated, 'peak': peak, 'analyzed_at': time.time()}
+                self.entries[key] = entry
+                self.store.save_loudness(key, entry)
+                logger.info(f"Loudness of {key}: {integrated:.1f} LUFS, peak {peak} dBFS "
+                            f"({time.perf_counter() - started:.1f}s)")
+            except Exception as e:
+                logger.error(f"Error analyzing loudness of {file_path}: {e}")
+            finally:
+                self.jobs.task_done()
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self.run()) for _ in range(max(1, self.workers))]
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
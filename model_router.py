@@ -0,0 +1,147 @@
+"""Two-tier model cascade for AIChatBot.
+
+The persona answers in a handful of words, so most prompts go to a small
+model with a tight token budget and a one-line stop. A prompt is sent to the
+large model straight away only when it looks like it needs one (long,
+multi-sentence, code, "explain"-style questions), and a small-model reply is
+escalated when it fails a cheap quality check (empty, rambling, echoing the
+prompt, or sounding like an assistant). Routing decisions and per-tier
+latency are counted in `stats`.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+
+from llm_backend import HttpBackend, LlamaCppBackend
+
+logger = logging.getLogger(__name__)
+
+# Off unless set: a model that isn't pulled would fail every short prompt before escalating
+AI_SMALL_MODEL = os.getenv('AI_SMALL_MODEL', '')
+AI_LARGE_MODEL = os.getenv('AI_LARGE_MODEL', 'dolphin-mistral:7b')
+# GGUF for the small tier when AI_BACKEND=llama_cpp; without it every prompt uses AI_MODEL_PATH
+AI_SMALL_MODEL_PATH = os.getenv('AI_SMALL_MODEL_PATH')
+# Prompts longer than this skip the small model
+AI_ROUTE_MAX_WORDS = int(os.getenv('AI_ROUTE_MAX_WORDS', '16'))
+# Small-model replies longer than this are escalated
+SMALL_REPLY_MAX_WORDS = 20
+
+SMALL_OPTIONS = {
+    "num_predict": 24,
+    "temperature": 0.9,
+    "top_p": 0.95,
+    "stop": ["User:", "\n", "```"]
+}
+LARGE_OPTIONS = {
+    "num_predict": 128,
+    "temperature": 0.95,
+    "top_p": 0.98,
+    "stop": ["User:", "\n\n", "```"]
+}
+# JSON objects merged over the defaults, e.g. {"num_predict": 16, "stop": ["\n"]}
+SMALL_OPTIONS.update(json.loads(os.getenv('AI_SMALL_OPTIONS', '{}')))
+LARGE_OPTIONS.update(json.loads(os.getenv('AI_LARGE_OPTIONS', '{}')))
+
+COMPLEX_PATTERN = re.compile(
+    r'```|\b(explain|describe|compare|summari[sz]e|translate|write|code|list|steps|difference|how (do|does|to|can))\b',
+    re.IGNORECASE
+)
+ASSISTANT_PATTERN = re.compile(
+    r"\b(as an ai|language model|i apologize|i cannot|i'm sorry|assistant|i am not able)\b",
+    re.IGNORECASE
+)
+
+
+class Tier:
+    def __init__(self, name, backend, options):
+        self.name = name
+        self.backend = backend
+        self.options = options
+
+
+def needs_large_model(message):
+    """Heuristic: does this prompt need more than a one-liner?"""
+    if len(message.split()) > AI_ROUTE_MAX_WORDS:
+        return True
+    if len(re.findall(r'[.!?]+\s+\w', message)) >= 2:
+        return True
+    return bool(COMPLEX_PATTERN.search(message))
+
+
+def acceptable(reply, message):
+    """Cheap quality check on a small-model reply"""
+    text = reply.strip()
+    if not text or len(text.split()) > SMALL_REPLY_MAX_WORDS:
+        return False
+    if ASSISTANT_PATTERN.search(text) or 'User:' in text or 'Jukeborgee:' in text:
+        return False
+    # Parroting the prompt back
+    return text.lower() != message.strip().lower()
+
+
+class ModelRouter:
+    def __init__(self, small, large):
+        self.small = small  # None disables the cascade
+        self.large = large
+        self.stats = Counter()
+
+    def tiers(self):
+        return [tier for tier in (self.small, self.large) if tier]
+
+    def start(self, prefix=None):
+        for tier in self.tiers():
+            tier.backend.start(prefix)
+
+    def pending(self):
+        """Generations still occupying a backend, whether or not anyone is waiting for them"""
+        return sum(tier.backend.pending for tier in self.tiers())
+
+    async def warm(self, prefix):
+        await asyncio.gather(*(tier.backend.warm(prefix) for tier in self.tiers()))
+
+    async def _run(self, tier, prompt):
+        started = time.perf_counter()
+        try:
+            return await tier.backend.generate(prompt, tier.options)
+        finally:
+            self.stats[f'{tier.name}_calls'] += 1
+            self.stats[f'{tier.name}_ms'] += int((time.perf_counter() - started) * 1000)
+
+    async def reply(self, prompt, message):
+        """Generate a reply to the formatted prompt; message is the user's raw text"""
+        if self.small is None or needs_large_model(message):
+            self.stats['routed_large'] += 1
+            return await self._run(self.large, prompt)
+
+        self.stats['routed_small'] += 1
+        try:
+            reply = await self._run(self.small, prompt)
+            if acceptable(reply, message):
+                return reply
+            self.stats['escalated_quality'] += 1
+            logger.info(f"Escalating to {self.large.name} model, small reply rejected: {reply[:80]!r}")
+        except Exception as e:
+            self.stats['escalated_error'] += 1
+            logger.error(f"Small model failed, escalating: {e}")
+        return await self._run(self.large, prompt)
+
+    def close(self):
+        for tier in self.tiers():
+            tier.backend.close()
+
+
+def create_router(name, api_url, model_path):
+    """Cascade for AI_BACKEND: "http" (default) or "llama_cpp" for in-process inference"""
+    if name == 'llama_cpp':
+        logger.info(f"Using in-process llama.cpp model at {model_path}")
+        large = Tier('large', LlamaCppBackend(model_path), LARGE_OPTIONS)
+        small = Tier('small', LlamaCppBackend(AI_SMALL_MODEL_PATH), SMALL_OPTIONS) if AI_SMALL_MODEL_PATH else None
+    else:
+        logger.info(f"Using LLM API at {api_url} ({AI_SMALL_MODEL} -> {AI_LARGE_MODEL})")
+        large = Tier('large', HttpBackend(api_url, AI_LARGE_MODEL), LARGE_OPTIONS)
+        small = Tier('small', HttpBackend(api_url, AI_SMALL_MODEL), SMALL_OPTIONS) if AI_SMALL_MODEL else None
+    return ModelRouter(small, large)
@@ -0,0 +1,189 @@
+"""Per-channel outbound message queue.
+
+Everything the cogs send goes through one queue per text channel, drained
+by a small task that paces sends with a token bucket sized to Discord's
+per-channel limit, so the bot waits before a burst instead of running into
+429s. Command replies are sent ahead of anything queued;
+consecutive status lines from the player (downloading, DRM fallbacks, now
+playing, ...) are merged into a single message that is edited as new lines
+arrive; low-priority chatter goes last.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Discord allows about 5 messages per 5 seconds per channel
+OUTBOX_BURST = int(os.getenv('OUTBOX_BURST', '5'))
+OUTBOX_WINDOW = float(os.getenv('OUTBOX_WINDOW', '5'))
+# Status lines are appended to the last status message while it is this recent
+STATUS_COALESCE_SECONDS = 60
+STATUS_MAX_LINES = 10
+MESSAGE_LIMIT = 2000
+# Channel queues with nothing to send for this long are dropped
+OUTBOX_IDLE_SECONDS = 120
+
+
+class ChannelOutbox:
+    def __init__(self, outbox, channel):
+        self.outbox = outbox
+        self.channel = channel
+        self.replies = deque()
+        self.statuses = deque()
+        self.chatter = deque()
+        self.wakeup = asyncio.Event()
+        self.tokens = float(OUTBOX_BURST)
+        self.refilled = time.monotonic()
+        self.status_message = None
+        self.status_lines = []
+        self.status_sent = 0
+        self.task = None
+
+    def push(self, queue, item):
+        queue.append(item)
+        self.wakeup.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def pending(self):
+        return bool(self.replies or self.statuses or self.chatter)
+
+    async def acquire(self):
+        """Wait for a token from the channel's send bucket"""
+        rate = OUTBOX_BURST / OUTBOX_WINDOW
+        while True:
+            now = time.monotonic()
+            self.tokens = min(OUTBOX_BURST, self.tokens + (now - self.refilled) * rate)
+            self.refilled = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / rate)
+
+    async def run(self):
+        while True:
+            if not self.pending():
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), OUTBOX_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    if not self.pending():
+                        self.outbox.drop(self)
+                        return
+                    continue
+
+            await self.acquire()
+            try:
+                if self.replies:
+                    content, kwargs, future = self.replies.popleft()
+                    try:
+                        message = await self.channel.send(content, **kwargs)
+                        if not future.done():
+                            future.set_result(message)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                    # Later status lines start a new message below the reply
+                    self.status_message = None
+                elif self.statuses:
+                    lines = list(self.statuses)
+                    self.statuses.clear()
+                    await self.send_status(lines)
+                else:
+                    await self.channel.send(self.chatter.popleft())
+                    self.status_message = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error sending to channel {getattr(self.channel, 'id', '?')}: {e}")
+
+    async def send_status(self, lines):
+        """Append lines to the current status message, or start a new one"""
+        combined = self.status_lines + lines
+        if (self.status_message is not None
+                and time.monotonic() - self.status_sent < STATUS_COALESCE_SECONDS
+                and len(combined) <= STATUS_MAX_LINES
+                and len("\n".join(combined)) <= MESSAGE_LIMIT):
+            try:
+                await self.status_message.edit(content="\n".join(combined))
+                self.status_lines = combined
+                return
+            except discord.HTTPException:
+                # Deleted or no longer editable; fall through and send a new one
+                pass
+
+        # Lines that don't fit one message are split across several
+        chunks, chunk = [], []
+        for line in lines:
+            if chunk and (len(chunk) >= STATUS_MAX_LINES or len("\n".join(chunk + [line])) > MESSAGE_LIMIT):
+                chunks.append(chunk)
+                chunk = []
+            chunk.append(line[:MESSAGE_LIMIT])
+        chunks.append(chunk)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await self.acquire()
+            self.status_message = await self.channel.send("\n".join(chunk))
+            self.status_lines = chunk
+            self.status_sent = time.monotonic()
+
+
+class Outbox:
+    def __init__(self):
+        self.channels = {}
+
+    def get(self, channel):
+        outbox = self.channels.get(channel.id)
+        if outbox is None:
+            outbox = self.channels[channel.id] = ChannelOutbox(self, channel)
+        return outbox
+
+    def drop(self, channel_outbox):
+        if self.channels.get(channel_outbox.channel.id) is channel_outbox:
+            del self.channels[channel_outbox.channel.id]
+
+    async def reply(self, channel, content=None, **kwargs):
+        """Send a command reply ahead of queued status lines and return the message"""
+        future = asyncio.get_running_loop().create_future()
+        outbox = self.get(channel)
+        outbox.push(outbox.replies, (content, kwargs, future))
+        return await future
+
+    async def status(self, channel, content):
+        """Queue a status line; it is merged with neighbouring lines and doesn't wait"""
+        outbox = self.get(channel)
+        outbox.push(outbox.statuses, content)
+
+    async def chatter(self, channel, content):
+        """Queue a low-priority message, sent once replies and status lines are out"""
+        outbox = self.get(channel)
+        outbox.push(outbox.chatter, content)
+
+    def close(self):
+        """Stop every channel task; unsent replies are cancelled"""
+        for outbox in list(self.channels.values()):
+            if outbox.task:
+                outbox.task.cancel()
+            for _, _, future in outbox.replies:
+                future.cancel()
+        self.channels.clear()
+
+
+_outbox = None
+
+
+def get_outbox():
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox()
+    return _outbox
+
+
+async def reply_to(ctx, content=None, **kwargs):
+    """Send a command reply through the channel's outbox, ahead of status lines and chatter"""
+    return await get_outbox().reply(ctx.channel, content, **kwargs)
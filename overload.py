@@ -0,0 +1,94 @@
+"""Load shedding for AI chat.
+
+OverloadController tracks how many generations are in flight and a moving
+average of how long they take. Past AI_MAX_INFLIGHT, or while the average is
+above AI_LATENCY_LIMIT, new !chat calls are answered immediately from a
+recent reply to the same prompt or from the persona's canned `busy_responses`
+instead of queueing behind the backend. While shedding for latency, one
+request every AI_PROBE_INTERVAL still goes through so the average can
+recover. Every generation is bounded by AI_TIMEOUT. A timeout only stops the
+wait: an in-process llama.cpp completion keeps its worker busy until it ends,
+so admission also counts the backend's own queue.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+AI_MAX_INFLIGHT = int(os.getenv('AI_MAX_INFLIGHT', '8'))
+AI_LATENCY_LIMIT = float(os.getenv('AI_LATENCY_LIMIT', '8'))  # seconds
+AI_TIMEOUT = float(os.getenv('AI_TIMEOUT', '20'))  # seconds
+AI_PROBE_INTERVAL = 5.0
+LATENCY_SMOOTHING = 0.3
+REPLY_CACHE_SIZE = 256
+
+
+def prompt_key(prompt):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', prompt.lower()).split())
+
+
+class OverloadController:
+    def __init__(self, max_inflight=AI_MAX_INFLIGHT, latency_limit=AI_LATENCY_LIMIT, timeout=AI_TIMEOUT,
+                 backlog=None):
+        self.max_inflight = max_inflight
+        # Work the backend is still doing, counting generations abandoned after a timeout
+        self.backlog = backlog or (lambda: 0)
+        self.latency_limit = latency_limit
+        self.timeout = timeout
+        self.inflight = 0
+        self.latency = 0.0  # moving average, seconds
+        self.last_probe = 0.0
+        self.replies = OrderedDict()  # prompt key -> last generated reply
+        self.stats = Counter()
+
+    def admit(self):
+        """Whether a new generation may start now"""
+        if max(self.inflight, self.backlog()) >= self.max_inflight:
+            self.stats['shed_queue'] += 1
+            return False
+        if self.latency > self.latency_limit:
+            now = time.monotonic()
+            if now - self.last_probe < AI_PROBE_INTERVAL:
+                self.stats['shed_latency'] += 1
+                return False
+            self.last_probe = now
+            self.stats['probes'] += 1
+        self.stats['admitted'] += 1
+        return True
+
+    def record(self, seconds):
+        self.latency += (seconds - self.latency) * LATENCY_SMOOTHING
+
+    async def run(self, coro):
+        """Await a generation with the timeout, feeding its latency into the average"""
+        self.inflight += 1
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(coro, self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise
+        finally:
+            self.inflight -= 1
+            self.record(time.monotonic() - started)
+
+    def remember(self, prompt, reply):
+        key = prompt_key(prompt)
+        self.replies[key] = reply
+        self.replies.move_to_end(key)
+        if len(self.replies) > REPLY_CACHE_SIZE:
+            self.replies.popitem(last=False)
+
+    def fallback(self, prompt, canned):
+        """Instant reply while overloaded: a cached reply to this prompt, else a canned line"""
+        cached = self.replies.get(prompt_key(prompt))
+        if cached:
+            self.stats['cached_replies'] += 1
+            return cached
+        self.stats['canned_replies'] += 1
+        return random.choice(canned)
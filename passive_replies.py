@@ -0,0 +1,123 @@
+"""Decides which channel messages the AI joins in on by itself.
+
+Every message in a channel is scored locally, with no LLM involved: direct
+mentions and replies to the bot score highest, then its name, then persona
+keywords and questions. Only messages above AI_PASSIVE_THRESHOLD get a
+reply, and each channel has a token bucket of AI_PASSIVE_PER_HOUR replies.
+Unprompted (keyword-only) replies are additionally held to
+AI_PASSIVE_MAX_FRACTION of the messages seen, so LLM calls stay a small,
+bounded share of traffic however busy a channel gets.
+"""
+import logging
+import os
+import re
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+AI_PASSIVE_REPLIES = os.getenv('AI_PASSIVE_REPLIES', '0') == '1'
+AI_PASSIVE_THRESHOLD = float(os.getenv('AI_PASSIVE_THRESHOLD', '0.6'))
+AI_PASSIVE_PER_HOUR = int(os.getenv('AI_PASSIVE_PER_HOUR', '20'))
+AI_PASSIVE_MAX_FRACTION = float(os.getenv('AI_PASSIVE_MAX_FRACTION', '0.05'))
+# Minimum gap between unprompted replies in one channel
+PASSIVE_COOLDOWN = 60
+# Recent bot messages remembered per channel, to detect replies to them
+RECENT_BOT_MESSAGES = 50
+
+NAME_PATTERN = re.compile(r'\b(jukeborgee|corgee|borgee)\b', re.IGNORECASE)
+RIVAL_PATTERN = re.compile(r'cyborgee', re.IGNORECASE)
+KEYWORD_PATTERN = re.compile(
+    r'\b(potato|rice|polard|poland|eep|eepy|cofefe|elden ring|groob|debrod|kurwa)\b', re.IGNORECASE
+)
+
+DIRECT_SCORE = 1.0
+NAME_SCORE = 0.7
+RIVAL_SCORE = 0.7  # answered from the canned cyborgee pool, no LLM call
+TRIGGER_SCORE = 0.4  # injection phrases; need another signal to get a (canned) reply
+KEYWORD_SCORE = 0.45
+QUESTION_SCORE = 0.15
+
+
+class ChannelBudget:
+    def __init__(self):
+        self.tokens = float(AI_PASSIVE_PER_HOUR)
+        self.refilled = time.monotonic()
+        self.last_unprompted = 0.0
+        self.bot_messages = deque(maxlen=RECENT_BOT_MESSAGES)
+
+    def take(self, now):
+        rate = AI_PASSIVE_PER_HOUR / 3600
+        self.tokens = min(AI_PASSIVE_PER_HOUR, self.tokens + (now - self.refilled) * rate)
+        self.refilled = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class PassiveScorer:
+    def __init__(self, trigger_phrases=()):
+        self.trigger_phrases = [phrase.lower() for phrase in trigger_phrases]
+        self.channels = {}
+        self.seen = 0
+        self.unprompted = 0
+
+    def channel(self, channel_id):
+        budget = self.channels.get(channel_id)
+        if budget is None:
+            budget = self.channels[channel_id] = ChannelBudget()
+        return budget
+
+    def sent(self, message):
+        """Remember one of the bot's own messages so replies to it count as direct"""
+        self.channel(message.channel.id).bot_messages.append(message.id)
+
+    def is_direct(self, message, bot_user):
+        if bot_user in message.mentions:
+            return True
+        reference = message.reference
+        if reference is None:
+            return False
+        resolved = reference.resolved
+        if resolved is not None and getattr(resolved, 'author', None) == bot_user:
+            return True
+        return reference.message_id in self.channel(message.channel.id).bot_messages
+
+    def score(self, message, direct):
+        if direct:
+            return DIRECT_SCORE
+        text = message.content.lower()
+        score = 0.0
+        if NAME_PATTERN.search(text):
+            score += NAME_SCORE
+        if RIVAL_PATTERN.search(text):
+            score += RIVAL_SCORE
+        if any(phrase in text for phrase in self.trigger_phrases):
+            score += TRIGGER_SCORE
+        if KEYWORD_PATTERN.search(text):
+            score += KEYWORD_SCORE
+        if '?' in text:
+            score += QUESTION_SCORE
+        return score
+
+    def should_reply(self, message, bot_user):
+        """Score a message and spend the channel's budget; True when it deserves a reply"""
+        self.seen += 1
+        direct = self.is_direct(message, bot_user)
+        if self.score(message, direct) < AI_PASSIVE_THRESHOLD:
+            return False
+
+        budget = self.channel(message.channel.id)
+        now = time.monotonic()
+        if not direct:
+            if now - budget.last_unprompted < PASSIVE_COOLDOWN:
+                return False
+            if self.unprompted + 1 > self.seen * AI_PASSIVE_MAX_FRACTION:
+                return False
+        if not budget.take(now):
+            return False
+        if not direct:
+            budget.last_unprompted = now
+            self.unprompted += 1
+        return True
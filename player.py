@@ -0,0 +1,280 @@
+"""Gapless playback for the Music cog.
+
+A GaplessSource is handed to VoiceClient.play once and plays a chain of
+sources back to back. While one track plays, the cog opens the next track's
+source (FFmpeg spawned, first frames decoded) and attaches it; when the
+current source runs out the switch happens inside read(), on the audio
+thread, with no gap. With CROSSFADE_SECONDS set, the last seconds of the
+outgoing PCM are held back in a small lookahead buffer and mixed with the
+start of the next track.
+
+The player counts the frames it hands out, so it always knows the playback
+position. When a stream ends well before its known duration (an expired or
+403'd googlevideo URL), it plays silence and asks the cog, through on_lost,
+for a new source opened at the lost offset; replace() splices that source
+in. `!seek` uses replace() with an explicit position.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import discord
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CROSSFADE_SECONDS = float(os.getenv('CROSSFADE_SECONDS', '0'))
+# How long before the end of a track (when its length is known) the next one is opened
+PRELOAD_SECONDS = float(os.getenv('PRELOAD_SECONDS', '15'))
+PREROLL_FRAMES = 5
+# A stream that stops this far before its known end is treated as a dropped connection
+LOST_STREAM_MARGIN = 5.0
+# How long to play silence while a dropped stream is reopened
+RECOVERY_TIMEOUT = 10.0
+MAX_RECOVERIES = 3
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+CHANNELS = discord.opus.Encoder.CHANNELS
+PCM_SILENCE = b'\x00' * FRAME_SIZE
+OPUS_SILENCE = b'\xf8\xff\xfe'
+
+
+def crossfade(outgoing, incoming, start, end):
+    """Mix two 20ms PCM frames with a linear fade from start to end (0..1)"""
+    ramp = np.repeat(np.linspace(start, end, SAMPLES_PER_FRAME, endpoint=False, dtype=np.float32), CHANNELS)
+    a = np.frombuffer(outgoing, dtype=np.int16).astype(np.float32)
+    b = np.frombuffer(incoming, dtype=np.int16).astype(np.float32)
+    mixed = a * (1.0 - ramp) + b * ramp
+    return np.clip(mixed, -32768, 32767).astype(np.int16).tobytes()
+
+
+class PrerolledSource(discord.AudioSource):
+    """Wraps a source and decodes its first frames ahead of playback"""
+    def __init__(self, source):
+        self.source = source
+        self.buffered = deque()
+
+    def preroll(self, frames=PREROLL_FRAMES):
+        """Blocking: start the source and buffer its first frames"""
+        for _ in range(frames):
+            frame = self.source.read()
+            if not frame:
+                break
+            self.buffered.append(frame)
+
+    def is_opus(self):
+        return self.source.is_opus()
+
+    def read(self):
+        if self.buffered:
+            return self.buffered.popleft()
+        return self.source.read()
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+class GaplessSource(discord.AudioSource):
+    """Chain of sources played back to back, with an optional PCM crossfade
+
+    `track` describes what is currently audible; the cog reads it from the
+    `after` callback and updates nothing else on the audio thread.
+    """
+    def __init__(self, source, track, crossfade_seconds=CROSSFADE_SECONDS):
+        self.source = source
+        self.track = track
+        self.frames = 0  # frames of the current track played so far
+        self.lock = threading.Lock()
+        self.pending = None  # (source, track, accept, on_start)
+        self.skip_requested = False
+        self.ended = False
+        # Opus packets can't be mixed, so only PCM sources crossfade
+        self.fade_frames = 0 if source.is_opus() else int(crossfade_seconds / FRAME_SECONDS)
+        self.lookahead = deque()
+        self.fading = deque()
+        self.fade_length = 0
+        self.preload_task = None  # owned by the cog
+        self.on_lost = None  # on_lost(offset_seconds), called on the audio thread
+        self.recovering = False
+        self.recovery_deadline = 0.0
+        self.recoveries = 0
+        self.replacement = None  # (source, position or None for a recovery)
+
+    def is_opus(self):
+        return self.source.is_opus()
+
+    @property
+    def position(self):
+        """Seconds played of the current track"""
+        return self.frames * FRAME_SECONDS
+
+    def set_next(self, source, track, accept=None, on_start=None):
+        """Attach the next track; accept() is checked at switch time, on_start(previous_track) called after"""
+        if source.is_opus() != self.is_opus():
+            source.cleanup()
+            return False
+        with self.lock:
+            previous, self.pending = self.pending, (source, track, accept, on_start)
+        if previous:
+            previous[0].cleanup()
+        return True
+
+    def has_next(self):
+        return self.pending is not None
+
+    def clear_next(self):
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending:
+            pending[0].cleanup()
+
+    def skip(self):
+        """Cut to the attached next track on the next read; False if none is attached"""
+        if self.pending is None:
+            return False
+        self.skip_requested = True
+        return True
+
+    def replace(self, source, position=None):
+        """Swap in a new source for the current track: at position seconds (seek), or where a lost stream stopped"""
+        with self.lock:
+            previous, self.replacement = self.replacement, (source, position)
+        if previous:
+            previous[0].cleanup()
+
+    def abandon_recovery(self):
+        """The lost stream couldn't be reopened; let the track end"""
+        self.recovery_deadline = 0.0
+
+    def _swap(self):
+        with self.lock:
+            replacement, self.replacement = self.replacement, None
+        source, position = replacement
+        if (position is None and not self.recovering) or (position is not None and self.ended):
+            # The track moved on while the new source was being opened
+            source.cleanup()
+            return
+        self.source.cleanup()
+        self.source = source
+        if position is not None:
+            self.frames = int(position / FRAME_SECONDS)
+            self.lookahead.clear()
+            self.fading = deque()
+        self.recovering = False
+        self.ended = False
+
+    def _stream_lost(self):
+        """Start recovering if the source ended well before the track's known duration"""
+        duration = self.track.get('duration')
+        if self.on_lost is None or self.track.get('file_path') or not duration or self.recoveries >= MAX_RECOVERIES:
+            return False
+        offset = (self.frames + len(self.lookahead)) * FRAME_SECONDS
+        if offset > duration - LOST_STREAM_MARGIN:
+            return False
+        self.recovering = True
+        self.recovery_deadline = time.monotonic() + RECOVERY_TIMEOUT
+        self.recoveries += 1
+        try:
+            self.on_lost(offset)
+        except Exception as e:
+            logger.error(f"Error reopening lost stream: {e}")
+            self.recovering = False
+            return False
+        return True
+
+    def _fill(self):
+        # Read ahead one extra frame per call until the crossfade buffer is full
+        wanted = 2 if len(self.lookahead) < self.fade_frames else 1
+        for _ in range(wanted):
+            if self.ended or self.recovering:
+                return
+            frame = self.source.read()
+            if not frame or (not self.is_opus() and len(frame) != FRAME_SIZE):
+                if not self._stream_lost():
+                    self.ended = True
+                return
+            self.lookahead.append(frame)
+
+    def _advance(self, hard_cut):
+        """Switch to the pending source; False when there is none to switch to"""
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending is None:
+            return False
+        source, track, accept, on_start = pending
+        try:
+            if accept and not accept():
+                source.cleanup()
+                return False
+        except Exception as e:
+            logger.error(f"Error checking next track: {e}")
+            source.cleanup()
+            return False
+
+        if not hard_cut and self.lookahead and not self.is_opus():
+            self.fading = self.lookahead
+            self.fade_length = len(self.fading)
+        else:
+            self.fading = deque()
+        self.lookahead = deque()
+        self.source.cleanup()
+        previous = self.track
+        self.source = source
+        self.track = track
+        self.frames = 0
+        self.ended = False
+        self.skip_requested = False
+        self.recovering = False
+        self.recoveries = 0
+        if on_start:
+            try:
+                on_start(previous)
+            except Exception as e:
+                logger.error(f"Error starting next track: {e}")
+        return True
+
+    def read(self):
+        if self.replacement is not None:
+            self._swap()
+        if self.skip_requested:
+            self.skip_requested = False
+            if not self._advance(hard_cut=True):
+                # The queue moved on since preloading; end this track normally
+                self.ended = True
+                self.recovering = False
+                self.lookahead.clear()
+
+        self._fill()
+        if self.recovering and not self.lookahead:
+            if time.monotonic() < self.recovery_deadline:
+                return OPUS_SILENCE if self.is_opus() else PCM_SILENCE
+            self.recovering = False
+            self.ended = True
+        # Hold back the tail of the track while a crossfade into the next one is possible
+        if self.ended and self.pending is not None and len(self.lookahead) <= self.fade_frames:
+            if self._advance(hard_cut=False):
+                self._fill()
+        if not self.lookahead:
+            if self.ended and self._advance(hard_cut=True):
+                self._fill()
+            if not self.lookahead:
+                return b''
+
+        frame = self.lookahead.popleft()
+        self.frames += 1
+        if self.fading:
+            done = self.fade_length - len(self.fading)
+            frame = crossfade(self.fading.popleft(), frame, done / self.fade_length, (done + 1) / self.fade_length)
+        return frame
+
+    def cleanup(self):
+        self.clear_next()
+        with self.lock:
+            replacement, self.replacement = self.replacement, None
+        if replacement:
+            replacement[0].cleanup()
+        self.source.cleanup()
@@ -0,0 +1,95 @@
+"""Local search index of tracks the bot has already resolved.
+
+Every YouTube video the bot learns about (played tracks, single videos,
+playlist entries, YouTube API lookups) is indexed by title, channel and the
+free-text queries that resolved to it, using an SQLite FTS5 table in the
+state database. `!play <text>` and `!ytsearch` ask the index first and only
+fall back to a remote `ytsearch:` when nothing matches confidently.
+"""
+import difflib
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Minimum similarity between a query and an indexed track to skip the remote search
+SEARCH_INDEX_MIN_CONFIDENCE = float(os.getenv('SEARCH_INDEX_MIN_CONFIDENCE', '0.8'))
+SEARCH_INDEX_CANDIDATES = 10
+# Taken off a match's similarity for each version tag the query didn't ask for
+SEARCH_INDEX_VERSION_PENALTY = 0.2
+
+TITLE_NOISE_PATTERN = re.compile(
+    r'[\(\[][^\)\]]*[\)\]]|\b(official|audio|video|lyrics?|music|full song|hd|hq|vevo|topic)\b'
+)
+VERSION_TAG_PATTERN = re.compile(
+    r'\b(live|cover|remix|acoustic|instrumental|karaoke|nightcore|sped up|slowed|reverb)\b'
+)
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def strip_noise(match):
+    # A bracketed "(Live at Wembley)" is a different recording, so its version words stay
+    return ' ' + ' '.join(VERSION_TAG_PATTERN.findall(match.group(0))) + ' '
+
+
+def normalize_title(title):
+    """Lowercase a title and strip bracketed tags (except version tags) and filler words"""
+    title = TITLE_NOISE_PATTERN.sub(strip_noise, title.lower())
+    return ' '.join(re.sub(r'[^\w\s]', ' ', title).split())
+
+
+def match_expression(query):
+    """FTS5 query requiring every word of the (normalized) query"""
+    tokens = TOKEN_PATTERN.findall(normalize_title(query))
+    return ' '.join(f'"{token}"' for token in tokens)
+
+
+class SearchIndex:
+    def __init__(self, store):
+        self.store = store
+
+    def record(self, video_id, title, channel=None, query=None, played=False):
+        """Index a resolved video, optionally with the query that found it"""
+        if not video_id or not title or not self.store.search_enabled:
+            return
+        self.store.save_indexed_track(video_id, title, channel, normalize_title(query) if query else None, played)
+
+    def confidence(self, query, title, channel, queries):
+        """Best similarity between the query and the ways this track is known"""
+        query = normalize_title(query)
+        wanted = set(VERSION_TAG_PATTERN.findall(query))
+        names = [title, f"{channel} {title}", f"{title} {channel}"] if channel else [title]
+        names = [normalize_title(name) for name in names] + queries.split('\n')
+        return max((
+            difflib.SequenceMatcher(None, query, name).ratio()
+            - SEARCH_INDEX_VERSION_PENALTY * len(set(VERSION_TAG_PATTERN.findall(name)) - wanted)
+            for name in names if name
+        ), default=0.0)
+
+    def lookup(self, query):
+        """Return (url, title) for a confident local match, or None to search remotely"""
+        if not self.store.search_enabled:
+            return None
+        expression = match_expression(query)
+        if not expression:
+            return None
+        try:
+            rows = self.store.search_tracks(expression, SEARCH_INDEX_CANDIDATES)
+        except Exception as e:
+            logger.error(f"Error searching local index: {e}")
+            return None
+
+        best = None
+        for video_id, title, channel, queries, plays in rows:
+            confidence = self.confidence(query, title, channel, queries)
+            # Among confident matches, a track the bot has played beats an unplayed playlist or API result
+            score = (confidence >= SEARCH_INDEX_MIN_CONFIDENCE, plays > 0, confidence, plays)
+            if best is None or score > best[0]:
+                best = (score, video_id, title)
+        if not best or not best[0][0]:
+            return None
+
+        (_, _, score, _), video_id, title = best
+        logger.info(f"Local index hit for '{query}': {title} ({score:.2f})")
+        return f"https://www.youtube.com/watch?v={video_id}", title
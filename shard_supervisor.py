@@ -0,0 +1,157 @@
+"""Multi-process shard supervisor for Jukeborgee.
+
+Splits the bot's gateway shards across several worker processes, each one
+running jukeborgee.py as an AutoShardedBot that owns a contiguous slice of
+shards, and restarts workers that crash.
+
+Usage:
+    python shard_supervisor.py
+
+Environment:
+    SHARD_COUNT      total shards (default: Discord's recommended count)
+    SHARD_WORKERS    worker processes (default: CPU count, capped at SHARD_COUNT)
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jukeborgee.py')
+GATEWAY_URL = 'https://discord.com/api/v10/gateway/bot'
+
+# Discord allows max_concurrency identifies per 5 seconds
+IDENTIFY_INTERVAL = 5.0
+RESTART_BACKOFF_MAX = 300
+HEALTHY_UPTIME = 600
+
+
+async def fetch_gateway_info():
+    """Ask Discord for the recommended shard count and identify concurrency"""
+    headers = {'Authorization': f'Bot {BOT_TOKEN}'}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_URL, headers=headers) as response:
+            if response.status != 200:
+                raise RuntimeError(f"Gateway lookup returned status code {response.status}")
+            data = await response.json()
+    limit = data.get('session_start_limit', {})
+    return data['shards'], limit.get('max_concurrency', 1)
+
+
+def split_shards(shard_count, worker_count):
+    """Split shard IDs into contiguous, evenly sized slices"""
+    worker_count = max(1, min(worker_count, shard_count))
+    base, extra = divmod(shard_count, worker_count)
+    slices = []
+    start = 0
+    for worker in range(worker_count):
+        size = base + (1 if worker < extra else 0)
+        slices.append(list(range(start, start + size)))
+        start += size
+    return slices
+
+
+class ShardWorker:
+    """One bot process owning a slice of shards, restarted when it dies"""
+    def __init__(self, worker_id, shard_ids, shard_count, start_delay):
+        self.worker_id = worker_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.start_delay = start_delay
+        self.process = None
+        self.restarts = 0
+        self.stopping = False
+        self.stopped = asyncio.Event()
+
+    def env(self):
+        env = dict(os.environ)
+        env['SHARD_COUNT'] = str(self.shard_count)
+        env['SHARD_IDS'] = ",".join(str(s) for s in self.shard_ids)
+        env['WORKER_ID'] = str(self.worker_id)
+        return env
+
+    async def sleep(self, seconds):
+        """Sleep that returns early when the supervisor shuts down"""
+        try:
+            await asyncio.wait_for(self.stopped.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        await self.sleep(self.start_delay)
+        backoff = 1
+        while not self.stopping:
+            started = time.monotonic()
+            logger.info(f"Starting worker {self.worker_id} with shards {self.shard_ids}")
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, BOT_SCRIPT, env=self.env(), cwd=os.path.dirname(BOT_SCRIPT)
+            )
+            returncode = await self.process.wait()
+            if self.stopping:
+                break
+
+            # Reset the backoff once a worker has stayed up for a while
+            if time.monotonic() - started > HEALTHY_UPTIME:
+                backoff = 1
+            self.restarts += 1
+            logger.error(f"Worker {self.worker_id} exited with code {returncode}, "
+                         f"restarting in {backoff}s (restart #{self.restarts})")
+            await self.sleep(backoff)
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+    def stop(self):
+        self.stopping = True
+        self.stopped.set()
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+
+
+async def supervise():
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN is not set")
+        return
+
+    shard_count = int(os.getenv('SHARD_COUNT', '0'))
+    max_concurrency = 1
+    try:
+        recommended, max_concurrency = await fetch_gateway_info()
+        shard_count = shard_count or recommended
+    except Exception as e:
+        logger.error(f"Error fetching gateway info: {e}")
+        if not shard_count:
+            return
+
+    worker_count = int(os.getenv('SHARD_WORKERS', '0')) or os.cpu_count() or 1
+    slices = split_shards(shard_count, worker_count)
+    logger.info(f"Running {shard_count} shards across {len(slices)} workers")
+
+    # Stagger workers so their shards don't all identify in the same window
+    workers = []
+    shards_started = 0
+    for worker_id, shard_ids in enumerate(slices):
+        delay = (shards_started // max_concurrency) * IDENTIFY_INTERVAL
+        workers.append(ShardWorker(worker_id, shard_ids, shard_count, delay))
+        shards_started += len(shard_ids)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: [worker.stop() for worker in workers])
+
+    await asyncio.gather(*(worker.run() for worker in workers))
+    for worker in workers:
+        if worker.process:
+            await worker.process.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(supervise())
@@ -0,0 +1,45 @@
+"""In-flight deduplication for the Music cog.
+
+When a playlist or a popular song is queued in many guilds at once, each
+guild would otherwise run its own yt-dlp extraction or download for the same
+video. SingleFlight keys those calls (by video ID or normalized search query)
+and, while one is running, hands every later caller the same future instead
+of starting another. Nothing is kept once the call finishes; remembering
+results is the failure cache's and search index's job.
+"""
+import asyncio
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}  # key -> future of the running call
+        self.stats = Counter()
+
+    async def do(self, key, factory):
+        """Await factory() once per key at a time; concurrent callers share its result
+
+        Returns (result, shared): shared is True for callers that joined a call
+        another caller started.
+        """
+        future = self.calls.get(key)
+        shared = future is not None
+        if shared:
+            self.stats[f'{key[0]}_shared'] += 1
+        else:
+            future = asyncio.ensure_future(factory())
+            self.calls[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+            self.stats[f'{key[0]}_calls'] += 1
+        # A waiter being cancelled (e.g. !stop) must not cancel the call for everyone else
+        return await asyncio.shield(future), shared
+
+    def _finished(self, key, future):
+        if self.calls.get(key) is future:
+            del self.calls[key]
+        if not future.cancelled():
+            # Retrieve the exception so it isn't reported as unhandled if every waiter left
+            future.exception()
@@ -0,0 +1,631 @@
+"""Persistent player state for the Music cog.
+
+Queues, loop flags, command channels, error logs and the voice session of
+each guild are kept in SQLite (WAL mode). Queue mutations are journaled per
+guild as small row operations (append, pop from the front, ...) and a
+background task writes every pending change in one transaction each
+STATE_FLUSH_INTERVAL seconds, so a burst of queue changes costs one commit.
+Guilds are restored lazily, the first time the cog touches them. The same
+database also holds the track failure cache (see track_cache.py), the
+local search index (see search_index.py) and measured track loudness (see
+loudness.py).
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'jukeborgee_state.db')
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL', '1.0'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_tracks (
+    guild_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    duration REAL,
+    PRIMARY KEY (guild_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id INTEGER PRIMARY KEY,
+    loop INTEGER NOT NULL DEFAULT 0,
+    channel_id INTEGER,
+    voice_channel_id INTEGER,
+    current_url TEXT,
+    current_title TEXT,
+    volume REAL,
+    audio_filters TEXT
+);
+CREATE TABLE IF NOT EXISTS error_logs (
+    guild_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    track TEXT NOT NULL,
+    error_type TEXT NOT NULL,
+    PRIMARY KEY (guild_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS track_failures (
+    key TEXT PRIMARY KEY,
+    failure TEXT NOT NULL,
+    title TEXT,
+    alt_url TEXT,
+    alt_title TEXT,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS track_loudness (
+    key TEXT PRIMARY KEY,
+    integrated REAL,
+    peak REAL,
+    analyzed_at REAL NOT NULL
+);
+"""
+
+# Needs SQLite built with FTS5; without it the local search index is disabled
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_tracks (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    channel TEXT,
+    queries TEXT NOT NULL DEFAULT '',
+    plays INTEGER NOT NULL DEFAULT 0
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS track_index USING fts5(
+    title, channel, queries,
+    content='indexed_tracks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS indexed_tracks_insert AFTER INSERT ON indexed_tracks BEGIN
+    INSERT INTO track_index (rowid, title, channel, queries) VALUES (new.id, new.title, new.channel, new.queries);
+END;
+CREATE TRIGGER IF NOT EXISTS indexed_tracks_delete AFTER DELETE ON indexed_tracks BEGIN
+    INSERT INTO track_index (track_index, rowid, title, channel, queries)
+    VALUES ('delete', old.id, old.title, old.channel, old.queries);
+END;
+CREATE TRIGGER IF NOT EXISTS indexed_tracks_update AFTER UPDATE ON indexed_tracks BEGIN
+    INSERT INTO track_index (track_index, rowid, title, channel, queries)
+    VALUES ('delete', old.id, old.title, old.channel, old.queries);
+    INSERT INTO track_index (rowid, title, channel, queries) VALUES (new.id, new.title, new.channel, new.queries);
+END;
+"""
+
+FAILURE_COLUMNS = ('failure', 'title', 'alt_url', 'alt_title', 'expires_at')
+
+LOUDNESS_COLUMNS = ('integrated', 'peak', 'analyzed_at')
+
+SETTINGS_COLUMNS = ('loop', 'channel_id', 'voice_channel_id', 'current_url', 'current_title',
+                    'volume', 'audio_filters')
+
+# Columns added after a table was first created, applied in place on older databases
+ADDED_COLUMNS = {
+    'queue_tracks': {'duration': 'REAL'},
+    'guild_settings': {'volume': 'REAL', 'audio_filters': 'TEXT'},
+}
+
+
+class Track(tuple):
+    """(url, title) queue entry that also carries its duration in seconds, if known"""
+    def __new__(cls, url, title, duration=None):
+        track = super().__new__(cls, (url, title))
+        track.duration = duration
+        return track
+
+    @classmethod
+    def of(cls, value):
+        """Accept a Track, an (url, title) pair or an (url, title, duration) row"""
+        return value if isinstance(value, cls) else cls(*value)
+
+
+class TrackQueue(list):
+    """List of (url, title) entries that journals every mutation
+
+    Appends and pops/inserts at the front are journaled as single row
+    operations; anything that reorders the middle (shuffle, remove, ...)
+    asks the store to rewrite the guild's queue on the next flush.
+
+    The queue also keeps prefix sums of track durations so the total length
+    and the time until any entry are O(1). Sums are indexed from an offset
+    that moves with pops and inserts at the front; other mutations drop them
+    and they are rebuilt on the next lookup.
+    """
+    def __init__(self, tracks=(), head=0, journal=None):
+        super().__init__(Track.of(t) for t in tracks)
+        self.head = head  # stored position of index 0
+        self.journal = journal
+        self.version = 0
+        self._sums = None  # _sums[_base + i] = (seconds, unknown durations) before entry i
+        self._base = 0
+
+    def _changed(self):
+        self.version += 1
+
+    def _invalidate(self):
+        self._sums = None
+        self._changed()
+
+    @staticmethod
+    def _add(sums, track, sign=1):
+        seconds, unknown = sums
+        return seconds + sign * (track.duration or 0), unknown + sign * (track.duration is None)
+
+    def _rebuild(self):
+        self._sums = [(0.0, 0)]
+        self._base = 0
+        for track in self:
+            self._sums.append(self._add(self._sums[-1], track))
+
+    def total_duration(self):
+        """(seconds, number of tracks with unknown duration) for the whole queue"""
+        return self.time_until(len(self))
+
+    def time_until(self, index):
+        """(seconds, unknown count) of the tracks ahead of entry index"""
+        if self._sums is None:
+            self._rebuild()
+        index = max(0, min(index, len(self)))
+        (seconds, unknown), (start_seconds, start_unknown) = self._sums[self._base + index], self._sums[self._base]
+        return seconds - start_seconds, unknown - start_unknown
+
+    def _put(self, position, track):
+        if self.journal:
+            self.journal('put', position, track)
+
+    def _rewrite(self):
+        if self.journal:
+            self.journal('rewrite', self)
+
+    def append(self, track):
+        track = Track.of(track)
+        super().append(track)
+        if self._sums is not None:
+            self._sums.append(self._add(self._sums[-1], track))
+        self._changed()
+        self._put(self.head + len(self) - 1, track)
+
+    def extend(self, tracks):
+        for track in tracks:
+            self.append(track)
+
+    def __iadd__(self, tracks):
+        self.extend(tracks)
+        return self
+
+    def insert(self, index, track):
+        track = Track.of(track)
+        if index == 0:
+            super().insert(0, track)
+            self.head -= 1
+            if self._sums is not None and self._base > 0:
+                self._base -= 1
+                self._sums[self._base] = self._add(self._sums[self._base + 1], track, -1)
+            else:
+                self._sums = None
+            self._changed()
+            self._put(self.head, track)
+        elif index >= len(self):
+            self.append(track)
+        else:
+            super().insert(index, track)
+            self._invalidate()
+            self._rewrite()
+
+    def pop(self, index=-1):
+        size = len(self)
+        track = super().pop(index)
+        if index == 0 or index == -size:
+            if self.journal:
+                self.journal('delete', self.head)
+            self.head += 1
+            if self._sums is not None:
+                self._base += 1
+                # Drop the sums of popped entries once they outnumber the live ones
+                if self._base > len(self):
+                    del self._sums[:self._base]
+                    self._base = 0
+            self._changed()
+        elif index == -1 or index == size - 1:
+            if self.journal:
+                self.journal('delete', self.head + size - 1)
+            if self._sums is not None:
+                self._sums.pop()
+            self._changed()
+        else:
+            self._invalidate()
+            self._rewrite()
+        return track
+
+    def clear(self):
+        super().clear()
+        self.head = 0
+        self._invalidate()
+        self._rewrite()
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [Track.of(v) for v in value]
+        else:
+            value = Track.of(value)
+        super().__setitem__(index, value)
+        self._invalidate()
+        self._rewrite()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._invalidate()
+        self._rewrite()
+
+    def remove(self, value):
+        super().remove(value)
+        self._invalidate()
+        self._rewrite()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._invalidate()
+        self._rewrite()
+
+    def reverse(self):
+        super().reverse()
+        self._invalidate()
+        self._rewrite()
+
+
+class GuildStateDict(dict):
+    """Per-guild dict whose entries are restored from the store on first access"""
+    def __init__(self, load, save=None, delete=None):
+        super().__init__()
+        self._load = load
+        self._save = save
+        self._delete = delete
+        self._restored = set()
+
+    def _restore(self, guild_id):
+        if guild_id in self._restored:
+            return
+        self._restored.add(guild_id)
+        value = self._load(guild_id)
+        if value is not None:
+            dict.__setitem__(self, guild_id, value)
+
+    def __contains__(self, guild_id):
+        self._restore(guild_id)
+        return dict.__contains__(self, guild_id)
+
+    def __getitem__(self, guild_id):
+        self._restore(guild_id)
+        return dict.__getitem__(self, guild_id)
+
+    def get(self, guild_id, default=None):
+        self._restore(guild_id)
+        return dict.get(self, guild_id, default)
+
+    def __setitem__(self, guild_id, value):
+        self._restored.add(guild_id)
+        if self._save:
+            value = self._save(guild_id, value)
+        dict.__setitem__(self, guild_id, value)
+
+    def setdefault(self, guild_id, default=None):
+        if guild_id not in self:
+            self[guild_id] = default
+        return dict.__getitem__(self, guild_id)
+
+    def __delitem__(self, guild_id):
+        self._restore(guild_id)
+        dict.__delitem__(self, guild_id)
+        if self._delete:
+            self._delete(guild_id)
+
+    def pop(self, guild_id, *default):
+        if guild_id in self:
+            value = dict.__getitem__(self, guild_id)
+            del self[guild_id]
+            return value
+        if default:
+            return default[0]
+        raise KeyError(guild_id)
+
+
+class StateStore:
+    """SQLite-backed store with batched, journaled writes"""
+    def __init__(self, path=STATE_DB_PATH, flush_interval=STATE_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only fsyncs at checkpoints, not on every commit
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row[1] for row in self.db.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    self.db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        self.db.execute("DELETE FROM track_failures WHERE expires_at < ?", (time.time(),))
+        try:
+            self.db.executescript(SEARCH_SCHEMA)
+            self.search_enabled = True
+        except sqlite3.OperationalError as e:
+            logger.error(f"Local search index disabled: {e}")
+            self.search_enabled = False
+        self.lock = threading.Lock()
+        # Reads get their own connection: under WAL they never wait for a write transaction
+        self.reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.reader.execute("PRAGMA query_only=ON")
+        self.read_lock = threading.Lock()
+        self.writing = None  # batch being committed by the executor, still visible to reads
+        self.pending_ops = []
+        self.pending_rewrites = {}
+        self.pending_settings = {}
+        self.pending_errors = {}
+        self.pending_failures = {}
+        self.pending_index = []
+        self.pending_loudness = {}
+        self.flush_task = None
+
+    # Reads (used for lazy per-guild restore)
+
+    def _query(self, sql, params=()):
+        with self.read_lock:
+            return self.reader.execute(sql, params).fetchall()
+
+    def _unwritten(self):
+        """Changes SQLite doesn't have yet, oldest first: the batch being committed, then pending ones"""
+        pending = (self.pending_ops, self.pending_rewrites, self.pending_settings, self.pending_errors,
+                   self.pending_failures, self.pending_index, self.pending_loudness)
+        return [self.writing, pending] if self.writing else [pending]
+
+    def load_queue(self, guild_id):
+        rows = self._query(
+            "SELECT position, url, title, duration FROM queue_tracks WHERE guild_id = ? ORDER BY position",
+            (guild_id,)
+        )
+        tracks = {position: Track(url, title, duration) for position, url, title, duration in rows}
+        for ops, rewrites, *_ in self._unwritten():
+            if guild_id in rewrites:
+                # Ops journaled before the rewrite are superseded by its snapshot
+                snapshot = rewrites[guild_id]
+                queue, head = snapshot if isinstance(snapshot, tuple) else (snapshot, getattr(snapshot, 'head', 0))
+                tracks = {head + i: Track.of(t) for i, t in enumerate(queue)}
+                continue
+            for op, op_guild_id, *args in ops:
+                if op_guild_id != guild_id:
+                    continue
+                if op == 'put':
+                    tracks[args[0]] = Track.of(args[1])
+                elif op == 'delete':
+                    tracks.pop(args[0], None)
+        if not tracks:
+            return None
+        positions = sorted(tracks)
+        return [tracks[position] for position in positions], positions[0]
+
+    def load_settings(self, guild_id):
+        rows = self._query(
+            f"SELECT {', '.join(SETTINGS_COLUMNS)} FROM guild_settings WHERE guild_id = ?",
+            (guild_id,)
+        )
+        settings = dict(zip(SETTINGS_COLUMNS, rows[0])) if rows else {}
+        for _, _, pending_settings, *_ in self._unwritten():
+            settings.update(pending_settings.get(guild_id, {}))
+        return settings
+
+    def load_errors(self, guild_id):
+        for _, _, _, errors, *_ in reversed(self._unwritten()):
+            if guild_id in errors:
+                return list(errors[guild_id]) or None
+        rows = self._query(
+            "SELECT track, error_type FROM error_logs WHERE guild_id = ? ORDER BY seq",
+            (guild_id,)
+        )
+        return [tuple(row) for row in rows] or None
+
+    def load_failure(self, key):
+        for *_, failures, _, _ in reversed(self._unwritten()):
+            if key in failures:
+                return failures[key]
+        rows = self._query(
+            f"SELECT {', '.join(FAILURE_COLUMNS)} FROM track_failures WHERE key = ?", (key,)
+        )
+        return dict(zip(FAILURE_COLUMNS, rows[0])) if rows else None
+
+    def load_loudness(self, key):
+        for *_, loudness in reversed(self._unwritten()):
+            if key in loudness:
+                return loudness[key]
+        rows = self._query(
+            f"SELECT {', '.join(LOUDNESS_COLUMNS)} FROM track_loudness WHERE key = ?", (key,)
+        )
+        return dict(zip(LOUDNESS_COLUMNS, rows[0])) if rows else None
+
+    def search_tracks(self, expression, limit):
+        """Indexed tracks matching an FTS5 expression, best ranked first"""
+        return self._query(
+            "SELECT t.video_id, t.title, t.channel, t.queries, t.plays FROM track_index "
+            "JOIN indexed_tracks t ON t.id = track_index.rowid "
+            "WHERE track_index MATCH ? ORDER BY bm25(track_index) LIMIT ?",
+            (expression, limit)
+        )
+
+    def active_sessions(self):
+        """Guilds that were connected to voice when the bot last stopped"""
+        rows = self._query(
+            "SELECT guild_id, voice_channel_id, current_url, current_title FROM guild_settings "
+            "WHERE voice_channel_id IS NOT NULL"
+        )
+        return [(guild_id, channel_id, (url, title) if url else None) for guild_id, channel_id, url, title in rows]
+
+    def queued_files(self):
+        """Temp file paths referenced by any saved queue, restored or not"""
+        rows = self._query("SELECT url FROM queue_tracks WHERE url LIKE 'file://%'")
+        rows += self._query("SELECT current_url FROM guild_settings WHERE current_url LIKE 'file://%'")
+        return {url[7:] for (url,) in rows}
+
+    # Writes (journaled, applied by flush)
+
+    def journal(self, guild_id, op, *args):
+        if op == 'rewrite':
+            self.pending_rewrites[guild_id] = args[0]
+        elif guild_id in self.pending_rewrites:
+            # The rewrite snapshot taken at flush time already includes this change
+            return
+        else:
+            self.pending_ops.append((op, guild_id, *args))
+
+    def queue_journal(self, guild_id):
+        return lambda op, *args: self.journal(guild_id, op, *args)
+
+    def save_settings(self, guild_id, **values):
+        self.pending_settings.setdefault(guild_id, {}).update(values)
+
+    def save_errors(self, guild_id, errors):
+        self.pending_errors[guild_id] = list(errors)
+
+    def save_failure(self, key, entry):
+        """Store a failure cache entry, or delete it when entry is None"""
+        self.pending_failures[key] = entry
+
+    def save_loudness(self, key, entry):
+        self.pending_loudness[key] = entry
+
+    def save_indexed_track(self, video_id, title, channel=None, query=None, played=False):
+        self.pending_index.append((video_id, title, channel, query or '', int(played)))
+
+    def delete_queue(self, guild_id):
+        self.pending_rewrites[guild_id] = []
+
+    def _take_batch(self):
+        batch = (
+            self.pending_ops,
+            {guild_id: (list(queue), getattr(queue, 'head', 0)) for guild_id, queue in self.pending_rewrites.items()},
+            self.pending_settings,
+            self.pending_errors,
+            self.pending_failures,
+            self.pending_index,
+            self.pending_loudness,
+        )
+        self.pending_ops = []
+        self.pending_rewrites = {}
+        self.pending_settings = {}
+        self.pending_errors = {}
+        self.pending_failures = {}
+        self.pending_index = []
+        self.pending_loudness = {}
+        return batch
+
+    def _write_batch(self, batch):
+        ops, rewrites, settings, errors, failures, indexed, loudness = batch
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                # Ops journaled before a rewrite are superseded by its snapshot
+                for op, guild_id, *args in ops:
+                    if op == 'put':
+                        position, track = args[0], Track.of(args[1])
+                        self.db.execute(
+                            "INSERT OR REPLACE INTO queue_tracks (guild_id, position, url, title, duration) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (guild_id, position, *track, track.duration)
+                        )
+                    elif op == 'delete':
+                        self.db.execute(
+                            "DELETE FROM queue_tracks WHERE guild_id = ? AND position = ?", (guild_id, args[0])
+                        )
+                for guild_id, (tracks, head) in rewrites.items():
+                    self.db.execute("DELETE FROM queue_tracks WHERE guild_id = ?", (guild_id,))
+                    self.db.executemany(
+                        "INSERT INTO queue_tracks (guild_id, position, url, title, duration) VALUES (?, ?, ?, ?, ?)",
+                        [(guild_id, head + i, *Track.of(t), Track.of(t).duration) for i, t in enumerate(tracks)]
+                    )
+                for guild_id, values in settings.items():
+                    columns = list(values)
+                    self.db.execute(
+                        f"INSERT INTO guild_settings (guild_id, {', '.join(columns)}) "
+                        f"VALUES (?, {', '.join('?' for _ in columns)}) "
+                        f"ON CONFLICT(guild_id) DO UPDATE SET "
+                        f"{', '.join(f'{c} = excluded.{c}' for c in columns)}",
+                        (guild_id, *values.values())
+                    )
+                for guild_id, entries in errors.items():
+                    self.db.execute("DELETE FROM error_logs WHERE guild_id = ?", (guild_id,))
+                    self.db.executemany(
+                        "INSERT INTO error_logs (guild_id, seq, track, error_type) VALUES (?, ?, ?, ?)",
+                        [(guild_id, i, track, error_type) for i, (track, error_type) in enumerate(entries)]
+                    )
+                for key, entry in failures.items():
+                    if entry is None:
+                        self.db.execute("DELETE FROM track_failures WHERE key = ?", (key,))
+                    else:
+                        self.db.execute(
+                            f"INSERT OR REPLACE INTO track_failures (key, {', '.join(FAILURE_COLUMNS)}) "
+                            f"VALUES (?, {', '.join('?' for _ in FAILURE_COLUMNS)})",
+                            (key, *(entry[c] for c in FAILURE_COLUMNS))
+                        )
+                # Merge into existing rows: keep the channel, count plays, collect new queries
+                self.db.executemany(
+                    "INSERT INTO indexed_tracks (video_id, title, channel, queries, plays) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(video_id) DO UPDATE SET title = excluded.title, "
+                    "channel = coalesce(excluded.channel, channel), plays = plays + excluded.plays, "
+                    "queries = CASE "
+                    "WHEN excluded.queries = '' OR instr(char(10) || queries || char(10), "
+                    "char(10) || excluded.queries || char(10)) THEN queries "
+                    "WHEN queries = '' THEN excluded.queries "
+                    "ELSE queries || char(10) || excluded.queries END",
+                    indexed
+                )
+                self.db.executemany(
+                    f"INSERT OR REPLACE INTO track_loudness (key, {', '.join(LOUDNESS_COLUMNS)}) "
+                    f"VALUES (?, {', '.join('?' for _ in LOUDNESS_COLUMNS)})",
+                    [(key, *(entry[c] for c in LOUDNESS_COLUMNS)) for key, entry in loudness.items()]
+                )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def has_pending(self):
+        return bool(self.pending_ops or self.pending_rewrites or self.pending_settings
+                    or self.pending_errors or self.pending_failures or self.pending_index
+                    or self.pending_loudness)
+
+    async def flush(self):
+        if not self.has_pending():
+            return
+        self.writing = self._take_batch()
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self._write_batch, self.writing)
+        finally:
+            self.writing = None
+
+    async def run(self):
+        """Background task: flush pending changes every flush_interval seconds"""
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error flushing player state: {e}")
+
+    def start(self):
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.run())
+
+    def close(self):
+        """Stop the flush task and write whatever is still pending"""
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        try:
+            if self.has_pending():
+                self._write_batch(self._take_batch())
+            with self.lock:
+                self.db.close()
+            with self.read_lock:
+                self.reader.close()
+        except Exception as e:
+            logger.error(f"Error closing state store: {e}")
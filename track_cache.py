@@ -0,0 +1,88 @@
+"""Negative cache for tracks that failed to resolve or play.
+
+When a track fails with `not_found`, `no_stream` or `drm`, the outcome of the
+whole fallback ladder is remembered for a while: either that nothing worked,
+the alternative that did work, or that downloading through the YouTube API
+route worked. The next time anyone queues the track it is skipped instantly
+or mapped straight to its substitute. Entries are persisted in the state
+store and expire per failure class. yt-dlp runs with ignoreerrors, so a bare
+miss may just be a rate limit or a network error; those are only trusted for
+UNCONFIRMED_FAILURE_TTL.
+"""
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a failure is retried from scratch
+FAILURE_TTLS = {
+    'drm': 7 * 24 * 3600,
+    'not_found': 24 * 3600,
+    'no_stream': 6 * 3600,
+}
+DEFAULT_FAILURE_TTL = 3600
+# A miss with no known cause is retried after a few minutes
+UNCONFIRMED_FAILURE_TTL = 600
+
+# In-memory lookups kept before the front cache is reset (the store keeps everything)
+MAX_CACHED_KEYS = 10000
+
+# alt_url marker: the direct download fallback worked for this track
+DOWNLOAD_FALLBACK = 'download:'
+
+VIDEO_ID_PATTERN = re.compile(r'(?:youtube\.com/watch\?(?:.*&)?v=|youtu\.be/)([\w-]{11})')
+
+
+def failure_key(url):
+    """Cache key: the video ID for YouTube URLs, the normalized query for searches"""
+    match = VIDEO_ID_PATTERN.search(url)
+    if match:
+        return f"yt:{match.group(1)}"
+    if url.startswith(('ytsearch:', 'scsearch:')):
+        prefix, _, query = url.partition(':')
+        return f"{prefix}:{' '.join(query.lower().split())}"
+    return url
+
+
+class FailureCache:
+    def __init__(self, store):
+        self.store = store
+        self.entries = {}  # key -> entry dict, or None for a known miss
+
+    def get(self, url):
+        """Return the cached failure for a URL or search query, if still fresh"""
+        key = failure_key(url)
+        if key not in self.entries:
+            if len(self.entries) >= MAX_CACHED_KEYS:
+                self.entries.clear()
+            self.entries[key] = self.store.load_failure(key)
+        entry = self.entries[key]
+        if entry and entry['expires_at'] < time.time():
+            self.forget(url)
+            return None
+        return entry
+
+    def record(self, url, failure, title=None, alt_url=None, alt_title=None, confirmed=True):
+        """Remember how a track failed and, if one worked, its substitute"""
+        key = failure_key(url)
+        if alt_url and alt_url != DOWNLOAD_FALLBACK and failure_key(alt_url) == key:
+            # A track can't stand in for itself; play_next would loop on it
+            logger.warning(f"Not caching {key} as its own substitute")
+            return
+        ttl = FAILURE_TTLS.get(failure, DEFAULT_FAILURE_TTL) if confirmed else UNCONFIRMED_FAILURE_TTL
+        entry = {
+            'failure': failure,
+            'title': title,
+            'alt_url': alt_url,
+            'alt_title': alt_title,
+            'expires_at': time.time() + ttl,
+        }
+        self.entries[key] = entry
+        self.store.save_failure(key, entry)
+        logger.info(f"Cached {failure} failure for {key}" + (f" -> {alt_url}" if alt_url else ""))
+
+    def forget(self, url):
+        key = failure_key(url)
+        self.entries[key] = None
+        self.store.save_failure(key, None)